@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+"""
+Sprawdzanie styczności wierzchołków linii z punktami infrastruktury na czystych współrzędnych.
+
+Punkty infrastruktury trafiają do siatki komórek o boku równym tolerancji, z identyfikatorem
+(nazwa warstwy, fid), więc obiekty różnych warstw o tym samym fid się nie mieszają. Wierzchołek
+jest styczny, gdy w kwadracie ±tolerancja wokół niego leży punkt infrastruktury - wystarczy
+sprawdzić komórkę wierzchołka i jej ośmiu sąsiadów.
+"""
+
+import math
+from collections import defaultdict
+
+TOLERANCE = 0.1
+
+
+class PointCells:
+    """Grid of points keyed by integer cell coordinates."""
+
+    def __init__(self, tolerance=TOLERANCE):
+        self.tolerance = tolerance
+        self.cells = defaultdict(list)
+
+    def __len__(self):
+        return sum(len(points) for points in self.cells.values())
+
+    def add(self, point_id, x, y):
+        self.cells[(math.floor(x / self.tolerance), math.floor(y / self.tolerance))].append((x, y, point_id))
+
+    def add_parts(self, point_id, parts):
+        for part in parts:
+            for x, y in part:
+                self.add(point_id, x, y)
+
+    def near(self, x, y):
+        """Returns the id of a point within ±tolerance of (x, y) on both axes, or None."""
+        tolerance = self.tolerance
+        cx, cy = math.floor(x / tolerance), math.floor(y / tolerance)
+        for i in (cx - 1, cx, cx + 1):
+            for j in (cy - 1, cy, cy + 1):
+                for px, py, point_id in self.cells.get((i, j), ()):
+                    if abs(px - x) <= tolerance and abs(py - y) <= tolerance:
+                        return point_id
+        return None
+
+
+def unconnected_vertices(parts, cells):
+    """Returns the (x, y) vertices of the line parts with no point of `cells` nearby; each repeated vertex is checked once."""
+    result = []
+    checked = {}
+    for part in parts:
+        for x, y in part:
+            connected = checked.get((x, y))
+            if connected is None:
+                connected = checked[(x, y)] = cells.near(x, y) is not None
+            if not connected:
+                result.append((x, y))
+    return result
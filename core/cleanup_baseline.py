@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+"""
+Pamięć podręczna wyników sprawdzeń czyszczenia (klucze duplikatów, powody błędnych geometrii)
+dla każdej warstwy, aktualizowana na podstawie zatwierdzonych edycji warstwy.
+
+Powtórne sprawdzenie tego samego zakresu przelicza tylko obiekty dodane lub zmienione od
+poprzedniego sprawdzenia. Zapisy wykonywane bezpośrednio przez dostawcę danych (bez sygnałów
+warstwy) należy zgłosić przez `invalidate`.
+"""
+
+from collections import OrderedDict
+
+from qgis.core import QgsFeatureRequest
+
+from .geometry_hash import geometry_key
+
+_baselines = {}
+
+
+def baseline_for(layer):
+    """Returns the baseline of a layer, creating it (and connecting to the layer's signals) on first use."""
+    baseline = _baselines.get(layer.id())
+    if baseline is None:
+        baseline = _baselines[layer.id()] = LayerBaseline(layer)
+        layer.willBeDeleted.connect(lambda layer_id=layer.id(): _baselines.pop(layer_id, None))
+    return baseline
+
+
+def invalidate(layer, fids=None):
+    """Marks features (or, without `fids`, the whole layer) as changed outside of the layer's edit buffer."""
+    baseline = _baselines.get(layer.id())
+    if baseline is None:
+        return
+    if fids is None:
+        baseline.reset()
+    else:
+        baseline.dirty.update(fids)
+
+
+def clear():
+    for baseline in _baselines.values():
+        baseline.reset()
+
+
+class LayerBaseline:
+    # Liczba zapamiętanych zakresów (zbiorów obiektów w zakresie) na warstwę
+    MAX_SCOPES = 8
+
+    def __init__(self, layer):
+        self.layer = layer
+        self.values = {}
+        self.scopes = OrderedDict()
+        self.dirty = set()
+        self.removed = set()
+        self.last_computed = 0
+        layer.committedFeaturesAdded.connect(lambda layer_id, features: self.dirty.update(f.id() for f in features))
+        layer.committedFeaturesRemoved.connect(lambda layer_id, fids: self.removed.update(fids))
+        layer.committedGeometriesChanges.connect(lambda layer_id, geometries: self.dirty.update(geometries.keys()))
+
+    def reset(self):
+        self.values.clear()
+        self.scopes.clear()
+        self.dirty.clear()
+        self.removed.clear()
+
+    def collect(self, scope_geom, test, test_name, columns):
+        """
+        Returns the sorted fids of features in the zakres (`test(geometry, scope_geom)`) and fills
+        self.values[name][fid] for every column `name: function(geometry)` and every returned fid.
+        Only features changed since the previous call (or never computed) are read and computed.
+        """
+        self.last_computed = 0
+        for name in columns:
+            self.values.setdefault(name, {})
+
+        scope_key = (geometry_key(scope_geom.asWkb()), test_name)
+        self._sync(columns)
+
+        if scope_key in self.scopes:
+            self.scopes.move_to_end(scope_key)
+            members = self.scopes[scope_key][2]
+            missing = [fid for fid in members if any(fid not in self.values[name] for name in columns)]
+            if missing:
+                request = QgsFeatureRequest().setFilterFids(missing).setNoAttributes()
+                for feature in self.layer.getFeatures(request):
+                    self._compute(feature.id(), feature.geometry(), columns)
+        else:
+            members = set()
+            request = QgsFeatureRequest().setFilterRect(scope_geom.boundingBox()).setNoAttributes()
+            for feature in self.layer.getFeatures(request):
+                geom = feature.geometry()
+                if not test(geom, scope_geom):
+                    continue
+                members.add(feature.id())
+                if any(feature.id() not in self.values[name] for name in columns):
+                    self._compute(feature.id(), geom, columns)
+            self.scopes[scope_key] = (scope_geom, test, members)
+            if len(self.scopes) > self.MAX_SCOPES:
+                self.scopes.popitem(last=False)
+        return sorted(members)
+
+    def _sync(self, columns):
+        removed, self.removed = self.removed, set()
+        dirty, self.dirty = self.dirty - removed, set()
+        for fid in removed | dirty:
+            for values in self.values.values():
+                values.pop(fid, None)
+        for _, _, members in self.scopes.values():
+            members.difference_update(removed)
+        if not dirty:
+            return
+
+        # Zmienione obiekty są czytane jeden raz: ponowny test zakresów i przeliczenie kolumn
+        found = set()
+        for feature in self.layer.getFeatures(QgsFeatureRequest().setFilterFids(list(dirty)).setNoAttributes()):
+            geom = feature.geometry()
+            found.add(feature.id())
+            for scope_geom, test, members in self.scopes.values():
+                if test(geom, scope_geom):
+                    members.add(feature.id())
+                else:
+                    members.discard(feature.id())
+            self._compute(feature.id(), geom, columns)
+        for _, _, members in self.scopes.values():
+            members.difference_update(dirty - found)
+
+    def _compute(self, fid, geom, columns):
+        self.last_computed += 1
+        for name, function in columns.items():
+            self.values[name][fid] = function(geom)
@@ -0,0 +1,294 @@
+# -*- coding: utf-8 -*-
+"""
+Reguły czyszczenia warstwy uruchamiane w jednym przebiegu.
+
+`run_pipeline` czyta warstwę jeden raz i przekazuje kolejne partie (fid, geometria) do wszystkich
+reguł. Każda reguła zbiera własne wyniki (`Finding`), a potok mierzy czas spędzony w każdej z nich.
+"""
+
+import abc
+import time
+from collections import defaultdict, namedtuple
+
+from qgis.core import QgsFeatureRequest, QgsSpatialIndex, QgsRectangle, QgsWkbTypes
+
+from .geometry_hash import geometry_key, normalized_geometry, wkb_parts
+from .near_duplicates import UnionFind, signature, signatures_match, within_hausdorff
+
+BATCH_SIZE = 1000
+DUPLICATE_PRECISION = 8
+CROSS_CABLE_TOLERANCE = 0.0001
+
+# `group` to numer grupy w obrębie reguły (dla reguł wyszukujących duplikaty), w pozostałych None
+Finding = namedtuple("Finding", ["fid", "reason", "group"])
+RuleResult = namedtuple("RuleResult", ["rule", "findings", "seconds"])
+PipelineResult = namedtuple("PipelineResult", ["searched", "read_seconds", "rule_results"])
+
+
+def is_cross_cable(geom):
+    """True for a two-vertex line whose endpoints coincide (a cable drawn as a cross-connection marker)."""
+    if geom.type() != QgsWkbTypes.LineGeometry or geom.isEmpty():
+        return False
+    vertices = [point for part in wkb_parts(geom.asWkb()) for point in part]
+    if len(vertices) != 2:
+        return False
+    (x1, y1), (x2, y2) = vertices
+    return (x2 - x1) ** 2 + (y2 - y1) ** 2 < CROSS_CABLE_TOLERANCE ** 2
+
+
+def run_pipeline(layer, rules, request, accept=None, context=None, on_batch=None, batch_size=BATCH_SIZE):
+    """
+    Reads `layer` once with `request` and feeds every rule with batches of (fid, geometry).
+    `accept(geometry)` filters features (e.g. by zakres), `on_batch(searched)` is called after each batch.
+    """
+    context = context or {}
+    timings = [0.0] * len(rules)
+    for i, rule in enumerate(rules):
+        start = time.perf_counter()
+        rule.start(layer, context)
+        timings[i] += time.perf_counter() - start
+
+    searched = 0
+    read_seconds = 0.0
+    batch = []
+    read_start = time.perf_counter()
+    for feature in layer.getFeatures(request):
+        geom = feature.geometry()
+        if accept is not None and not accept(geom):
+            continue
+        batch.append((feature.id(), geom))
+        if len(batch) >= batch_size:
+            read_seconds += time.perf_counter() - read_start
+            _dispatch(rules, batch, timings)
+            searched += len(batch)
+            batch = []
+            if on_batch is not None:
+                on_batch(searched)
+            read_start = time.perf_counter()
+    read_seconds += time.perf_counter() - read_start
+    if batch:
+        _dispatch(rules, batch, timings)
+        searched += len(batch)
+
+    rule_results = []
+    for i, rule in enumerate(rules):
+        start = time.perf_counter()
+        findings = rule.finish()
+        timings[i] += time.perf_counter() - start
+        rule_results.append(RuleResult(rule, findings, timings[i]))
+    return PipelineResult(searched, read_seconds, rule_results)
+
+
+def _dispatch(rules, batch, timings):
+    for i, rule in enumerate(rules):
+        start = time.perf_counter()
+        rule.consume(batch)
+        timings[i] += time.perf_counter() - start
+
+
+def confirm_exact_groups(candidate_groups, wkb_of, check_reversed, precision=DUPLICATE_PRECISION):
+    """
+    Splits groups of fids sharing a geometry key by their full normalized coordinates.
+    `wkb_of(fid)` returns the WKB of a feature or None if it is gone. Returns groups of 2+ fids.
+    """
+    groups = []
+    for fids in candidate_groups:
+        confirmed = defaultdict(list)
+        for fid in fids:
+            wkb = wkb_of(fid)
+            if wkb is not None:
+                confirmed[normalized_geometry(wkb, precision, check_reversed)].append(fid)
+        groups.extend(group for group in confirmed.values() if len(group) > 1)
+    return groups
+
+
+class NearDuplicateIndex:
+    """Collects geometries and groups those within `tolerance` of each other (signature, then bounded Hausdorff test)."""
+
+    def __init__(self, tolerance, check_reversed=False):
+        self.tolerance = tolerance
+        self.check_reversed = check_reversed
+        self.shapes = {}
+        self.index = QgsSpatialIndex()
+        self.compared = 0
+        self.confirmed = 0
+
+    def add(self, fid, geom):
+        if not geom or geom.isEmpty() or not geom.isGeosValid():
+            return
+        parts = [part for part in wkb_parts(geom.asWkb()) if part]
+        if not parts:
+            return
+        bbox = geom.boundingBox()
+        self.shapes[fid] = (parts, signature(parts), bbox)
+        self.index.addFeature(fid, bbox)
+
+    def groups(self):
+        """Returns groups of fids, each and all of them in the order the features were added."""
+        union_find = UnionFind()
+        for fid, (parts, feature_signature, bbox) in self.shapes.items():
+            search_rect = QgsRectangle(bbox)
+            search_rect.grow(self.tolerance)
+            for other_fid in self.index.intersects(search_rect):
+                if other_fid <= fid:
+                    continue
+                other_parts, other_signature, _ = self.shapes[other_fid]
+                if not signatures_match(feature_signature, other_signature, self.tolerance, self.check_reversed):
+                    continue
+                self.compared += 1
+                if within_hausdorff(parts, other_parts, self.tolerance):
+                    self.confirmed += 1
+                    union_find.union(fid, other_fid)
+
+        scan_order = {fid: i for i, fid in enumerate(self.shapes)}
+        return sorted((sorted(group, key=scan_order.get) for group in union_find.groups()), key=lambda group: scan_order[group[0]])
+
+
+class CleanupRule(abc.ABC):
+    """Base class of a rule: start() once per run, consume() for every batch, finish() returns the findings."""
+    name = ""
+
+    def start(self, layer, context):
+        self.layer = layer
+        self.context = context
+
+    @abc.abstractmethod
+    def consume(self, batch):
+        """Processes one batch of (fid, geometry)."""
+
+    def finish(self):
+        return []
+
+
+class FeatureRule(CleanupRule):
+    """Rule that judges each feature on its own; subclasses implement check(geom) returning a reason or None."""
+
+    def start(self, layer, context):
+        super().start(layer, context)
+        self.findings = []
+        self.skip_cross_cables = layer.name() in context.get("cable_layers", [])
+
+    def consume(self, batch):
+        for fid, geom in batch:
+            reason = self.check(geom)
+            if reason:
+                self.findings.append(Finding(fid, reason, None))
+
+    def finish(self):
+        return self.findings
+
+    @abc.abstractmethod
+    def check(self, geom):
+        """Returns the reason the feature is reported, or None."""
+
+
+class InvalidGeometryRule(FeatureRule):
+    name = "Niepoprawne geometrie"
+
+    def check(self, geom):
+        if geom is None or geom.isNull():
+            return "Geometria typu None/Null"
+        if geom.isEmpty() or (self.skip_cross_cables and is_cross_cable(geom)):
+            return None
+        if not geom.isGeosValid():
+            return "Niepoprawna geometria (błąd GEOS)"
+        if QgsWkbTypes.flatType(geom.wkbType()) == QgsWkbTypes.Point:
+            point = geom.asPoint()
+            if point.x() == 0 and point.y() == 0:
+                return "Punkt o współrzędnych (0,0)"
+        return None
+
+
+class EmptyGeometryRule(FeatureRule):
+    name = "Puste geometrie i linie o zerowej długości"
+
+    def check(self, geom):
+        if geom is None or geom.isNull():
+            return None
+        if geom.isEmpty():
+            return "Pusta geometria (isEmpty)"
+        if geom.type() == QgsWkbTypes.LineGeometry and geom.length() == 0 and not (self.skip_cross_cables and is_cross_cable(geom)):
+            return "Linia o zerowej długości"
+        return None
+
+
+class DegenerateMultipartRule(FeatureRule):
+    name = "Zdegenerowane geometrie wieloczęściowe"
+
+    def check(self, geom):
+        if geom is None or geom.isNull() or geom.isEmpty() or not geom.isMultipart():
+            return None
+        geometry_type = geom.type()
+        for part in wkb_parts(geom.asWkb()):
+            if not part:
+                return "Pusta część geometrii wieloczęściowej"
+            if geometry_type == QgsWkbTypes.LineGeometry and (len(part) < 2 or len(set(part)) == 1):
+                return "Część linii o zerowej długości"
+            if geometry_type == QgsWkbTypes.PolygonGeometry and len(part) < 4:
+                return "Pierścień poligonu z mniej niż 4 wierzchołkami"
+        return None
+
+
+class UnclosedPolygonRule(FeatureRule):
+    name = "Niezamknięte poligony"
+
+    def check(self, geom):
+        if geom is None or geom.isNull() or geom.isEmpty() or geom.type() != QgsWkbTypes.PolygonGeometry:
+            return None
+        for ring in wkb_parts(geom.asWkb()):
+            if ring and ring[0] != ring[-1]:
+                return "Niezamknięty pierścień poligonu"
+        return None
+
+
+class ExactDuplicatesRule(CleanupRule):
+    name = "Duplikaty (identyczna geometria)"
+
+    def __init__(self, check_reversed=False):
+        self.check_reversed = check_reversed
+
+    def start(self, layer, context):
+        super().start(layer, context)
+        self.candidates = defaultdict(list)
+
+    def consume(self, batch):
+        for fid, geom in batch:
+            if geom and not geom.isEmpty() and geom.isGeosValid():
+                self.candidates[geometry_key(geom.asWkb(), DUPLICATE_PRECISION, self.check_reversed)].append(fid)
+
+    def finish(self):
+        # Potwierdzenie na pełnych współrzędnych tylko dla kluczy wspólnych dla kilku obiektów
+        candidate_groups = [fids for fids in self.candidates.values() if len(fids) > 1]
+        fids = [fid for group in candidate_groups for fid in group]
+        if not fids:
+            return []
+        request = QgsFeatureRequest().setFilterFids(fids).setNoAttributes()
+        geometries = {feature.id(): feature.geometry() for feature in self.layer.getFeatures(request)}
+
+        findings = []
+        groups = confirm_exact_groups(candidate_groups, lambda fid: geometries[fid].asWkb() if fid in geometries else None, self.check_reversed)
+        for group_number, group in enumerate(groups, 1):
+            findings.extend(Finding(fid, f"Identyczna geometria, nr {j} w grupie", group_number) for j, fid in enumerate(group, 1))
+        return findings
+
+
+class NearDuplicatesRule(CleanupRule):
+    name = "Duplikaty (geometria w tolerancji)"
+
+    def __init__(self, tolerance, check_reversed=False):
+        self.tolerance = tolerance
+        self.check_reversed = check_reversed
+
+    def start(self, layer, context):
+        super().start(layer, context)
+        self.near_index = NearDuplicateIndex(self.tolerance, self.check_reversed)
+
+    def consume(self, batch):
+        for fid, geom in batch:
+            self.near_index.add(fid, geom)
+
+    def finish(self):
+        findings = []
+        for group_number, group in enumerate(self.near_index.groups(), 1):
+            findings.extend(Finding(fid, f"Geometria różni się o nie więcej niż {self.tolerance:.3f} m, nr {j} w grupie", group_number) for j, fid in enumerate(group, 1))
+        return findings
@@ -0,0 +1,213 @@
+# -*- coding: utf-8 -*-
+"""
+Obiekty warstw w obrębie jednego zakresu, wczytywane jeden raz na uruchomienie.
+
+Każda warstwa jest czytana jednym zapytaniem ograniczonym do bbox zakresu, tylko z potrzebnymi
+atrybutami. Wartości są przechowywane kolumnami, a geometria (jako WKB) tylko dla warstw, które
+jej wymagają. Dla każdego obiektu zapamiętywane są dwa testy zakresu: przecięcie z zakresem
+oraz (dla linii) położenie wierzchołka końcowego wewnątrz zakresu. Kilka warstw można wczytać
+równolegle (`preload`) - każdy wątek czyta własne źródło obiektów warstwy.
+"""
+
+import os
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+
+from qgis.core import (
+    QgsProject,
+    QgsFeatureRequest,
+    QgsGeometry,
+    QgsPoint,
+    QgsWkbTypes,
+    QgsExpression,
+    QgsVectorLayerFeatureSource,
+)
+
+
+class LayerColumns:
+    """Column storage of the features of one layer."""
+
+    def __init__(self, layer, attributes, keep_geometry):
+        self.layer = layer
+        self.attributes = attributes
+        self.fids = array('q')
+        self.columns = {name: [] for name in attributes}
+        self.wkb = [] if keep_geometry else None
+        self.intersects = bytearray()
+        self.endpoint_in_scope = bytearray()
+
+    def __len__(self):
+        return len(self.fids)
+
+    def append(self, feature, geom, intersects=True, endpoint_in_scope=True):
+        self.fids.append(feature.id())
+        for name, column in self.columns.items():
+            column.append(feature.attribute(name))
+        if self.wkb is not None:
+            self.wkb.append(bytes(geom.asWkb()) if geom else b"")
+        self.intersects.append(intersects)
+        self.endpoint_in_scope.append(endpoint_in_scope)
+
+    def features(self, rows=None):
+        return [StoredFeature(self, row) for row in (range(len(self.fids)) if rows is None else rows)]
+
+
+class StoredFeature:
+    """Read-only view of one stored row with the QgsFeature methods used by the statistics."""
+    __slots__ = ("_store", "_row")
+
+    def __init__(self, store, row):
+        self._store = store
+        self._row = row
+
+    def id(self):
+        return self._store.fids[self._row]
+
+    def attribute(self, name):
+        column = self._store.columns.get(name)
+        return column[self._row] if column is not None else None
+
+    __getitem__ = attribute
+
+    def wkb(self):
+        return self._store.wkb[self._row] if self._store.wkb is not None else b""
+
+    def geometry(self):
+        geom = QgsGeometry()
+        data = self.wkb()
+        if data:
+            geom.fromWkb(data)
+        return geom
+
+
+class ScopeFeatureStore:
+    """
+    Lazily reads the layers listed in `layer_specs` ({layer name: (attributes, keep_geometry)})
+    within `scope_geom`. Every layer is read at most once per store.
+    """
+
+    def __init__(self, scope_geom, layer_specs, project=None):
+        self.scope_geom = scope_geom
+        self.layer_specs = layer_specs
+        self.project = project or QgsProject.instance()
+        self._layers = {}
+        self._matching = {}
+        self._engine = QgsGeometry.createGeometryEngine(scope_geom.constGet())
+        self._engine.prepareGeometry()
+
+    def _find_layer(self, layer_name):
+        layer_list = self.project.mapLayersByName(layer_name)
+        return layer_list[0] if layer_list else None
+
+    def _specs(self, layer, layer_name):
+        attributes, keep_geometry = self.layer_specs.get(layer_name, ([], False))
+        field_names = layer.fields().names()
+        return [name for name in attributes if name in field_names], keep_geometry
+
+    def _prepare(self, layer_name):
+        """Returns (LayerColumns, request, is line layer) for reading the layer, or None if it does not exist."""
+        layer = self._find_layer(layer_name)
+        if layer is None:
+            return None
+        attributes, keep_geometry = self._specs(layer, layer_name)
+        store = LayerColumns(layer, attributes, keep_geometry)
+        request = QgsFeatureRequest().setFilterRect(self.scope_geom.boundingBox()).setSubsetOfAttributes(attributes, layer.fields())
+        return store, request, layer.geometryType() == QgsWkbTypes.LineGeometry
+
+    def _fill(self, store, source, request, is_line_layer, engine):
+        for feature in source.getFeatures(request):
+            geom = feature.geometry()
+            if not geom or geom.isNull() or not engine.intersects(geom.constGet()):
+                continue
+            store.append(feature, geom, True, self._endpoint_in_scope(geom, engine) if is_line_layer else False)
+        return store
+
+    def layer(self, layer_name):
+        """Returns LayerColumns of the features intersecting the zakres, or None if the layer does not exist."""
+        if layer_name in self._layers:
+            return self._layers[layer_name]
+        prepared = self._prepare(layer_name)
+        if prepared is None:
+            self._layers[layer_name] = None
+            return None
+        store, request, is_line_layer = prepared
+        self._layers[layer_name] = self._fill(store, store.layer, request, is_line_layer, self._engine)
+        return store
+
+    def preload(self, layer_names, max_workers=None):
+        """
+        Reads the not yet loaded layers concurrently, one worker thread per layer. Every worker
+        iterates its own QgsVectorLayerFeatureSource (created here, on the calling thread) and
+        tests the zakres with its own geometry engine. Stores are registered in `layer_names` order.
+        """
+        jobs = []
+        for layer_name in layer_names:
+            if layer_name in self._layers or any(name == layer_name for name, _ in jobs):
+                continue
+            prepared = self._prepare(layer_name)
+            if prepared is None:
+                self._layers[layer_name] = None
+                continue
+            store, request, is_line_layer = prepared
+            # Źródło i kopia geometrii zakresu muszą powstać w wątku wywołującym
+            source = QgsVectorLayerFeatureSource(store.layer)
+            jobs.append((layer_name, (store, source, request, is_line_layer, QgsGeometry(self.scope_geom))))
+        if not jobs:
+            return
+
+        def read(job):
+            store, source, request, is_line_layer, scope_geom = job
+            engine = QgsGeometry.createGeometryEngine(scope_geom.constGet())
+            engine.prepareGeometry()
+            return self._fill(store, source, request, is_line_layer, engine)
+
+        with ThreadPoolExecutor(max_workers=max_workers or min(len(jobs), os.cpu_count() or 1)) as executor:
+            futures = [(layer_name, executor.submit(read, job)) for layer_name, job in jobs]
+            for layer_name, future in futures:
+                self._layers[layer_name] = future.result()
+
+    def features(self, layer_name, is_line=False, all_intersecting=False):
+        """Same selection as the former full-layer scan: intersecting features, for lines with the last vertex inside."""
+        store = self.layer(layer_name)
+        if store is None:
+            return None
+        if is_line and not all_intersecting:
+            return store.features(row for row, inside in enumerate(store.endpoint_in_scope) if inside)
+        return store.features()
+
+    def matching(self, layer_name, field_name, value):
+        """Features of the whole layer (not only the zakres) whose `field_name` equals `value`, without geometry."""
+        key = (layer_name, field_name, str(value))
+        if key in self._matching:
+            return self._matching[key]
+        layer = self._find_layer(layer_name)
+        if layer is None or field_name not in layer.fields().names():
+            self._matching[key] = None
+            return None
+
+        attributes, _ = self._specs(layer, layer_name)
+        store = LayerColumns(layer, attributes, False)
+        expression = f"{QgsExpression.quotedColumnRef(field_name)} = {QgsExpression.quotedValue(value)}"
+        request = QgsFeatureRequest().setFilterExpression(expression).setFlags(QgsFeatureRequest.NoGeometry)
+        request.setSubsetOfAttributes(attributes, layer.fields())
+        for feature in layer.getFeatures(request):
+            store.append(feature, None)
+        self._matching[key] = store.features()
+        return self._matching[key]
+
+    def _endpoint_in_scope(self, geom, engine):
+        # Typ płaski - jak ST_EndPoint w bazie, także dla linii Z/M
+        wkb_type = QgsWkbTypes.flatType(geom.wkbType())
+        last_vertex_point = None
+        try:
+            if wkb_type == QgsWkbTypes.LineString:
+                polyline = geom.asPolyline()
+                if polyline:
+                    last_vertex_point = polyline[-1]
+            elif wkb_type == QgsWkbTypes.MultiLineString:
+                multi_polyline = geom.asMultiPolyline()
+                if multi_polyline and multi_polyline[-1]:
+                    last_vertex_point = multi_polyline[-1][-1]
+        except IndexError:
+            return False
+        return bool(last_vertex_point) and engine.intersects(QgsPoint(last_vertex_point))
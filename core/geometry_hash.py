@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+"""
+Klucze geometrii liczone bezpośrednio z WKB (bez tworzenia obiektów QgsGeometry).
+
+Współrzędne X/Y są kwantyzowane do zadanej liczby miejsc po przecinku, a wynikowy
+ciąg (z typem geometrii i liczbą części) jest skracany do 128-bitowego klucza.
+"""
+
+import struct
+import hashlib
+
+LINESTRING = 2
+MULTILINESTRING = 5
+
+
+def geometry_key(wkb, precision=8, canonical=False):
+    """Returns the 16-byte key of a WKB geometry (see `normalized_geometry`)."""
+    return hashlib.blake2b(normalized_geometry(wkb, precision, canonical), digest_size=16).digest()
+
+
+def normalized_geometry(wkb, precision=8, canonical=False):
+    """
+    Returns the geometry as bytes of its base type and X/Y coordinates quantised to `precision` decimals.
+    With `canonical`, a LineString or single-part MultiLineString is ordered so that it starts at its
+    lexicographically smaller endpoint. Unsupported (curved) types are returned as the raw WKB.
+    """
+    data = bytes(wkb)
+    try:
+        node, _ = _read(data, 0, 10 ** precision)
+        if canonical:
+            _canonicalize(node)
+        out = []
+        _write(node, out)
+    except (ValueError, OverflowError, struct.error):
+        return data
+    return b"".join(out)
+
+
+def wkb_parts(wkb):
+    """Returns the X/Y coordinates of every point, line part or polygon ring of a WKB geometry as lists of (x, y)."""
+    parts = []
+    try:
+        _read_parts(bytes(wkb), 0, parts)
+    except (ValueError, struct.error):
+        return []
+    return parts
+
+
+def _read_header(data, offset):
+    endian = "<" if data[offset] == 1 else ">"
+    (wkb_type,) = struct.unpack_from(endian + "I", data, offset + 1)
+    offset += 5
+
+    # Flagi EWKB (Z/M/SRID) oraz kody ISO (1000/2000/3000)
+    has_z = bool(wkb_type & 0x80000000)
+    has_m = bool(wkb_type & 0x40000000)
+    if wkb_type & 0x20000000:
+        offset += 4
+    wkb_type &= 0x0FFFFFFF
+    base_type, dim_code = wkb_type % 1000, wkb_type // 1000
+    dims = 2 + (has_z or dim_code in (1, 3)) + (has_m or dim_code in (2, 3))
+    if base_type > 7:
+        raise ValueError(f"Nieobsługiwany typ geometrii WKB: {wkb_type}")
+    return endian, base_type, dims, offset
+
+
+def _read_parts(data, offset, parts):
+    endian, base_type, dims, offset = _read_header(data, offset)
+    if base_type in (1, 2):
+        count = 1
+        if base_type == 2:
+            (count,) = struct.unpack_from(endian + "I", data, offset)
+            offset += 4
+        values = struct.unpack_from(endian + "d" * (count * dims), data, offset)
+        parts.append(list(zip(values[0::dims], values[1::dims])))
+        return offset + 8 * dims * count
+    (count,) = struct.unpack_from(endian + "I", data, offset)
+    offset += 4
+    for _ in range(count):
+        if base_type == 3:
+            (ring_count,) = struct.unpack_from(endian + "I", data, offset)
+            values = struct.unpack_from(endian + "d" * (ring_count * dims), data, offset + 4)
+            parts.append(list(zip(values[0::dims], values[1::dims])))
+            offset += 4 + 8 * dims * ring_count
+        else:
+            offset = _read_parts(data, offset, parts)
+    return offset
+
+
+def _read(data, offset, scale):
+    endian, base_type, dims, offset = _read_header(data, offset)
+
+    if base_type == 1:
+        coords = struct.unpack_from(endian + "dd", data, offset)
+        return (base_type, [round(c * scale) for c in coords]), offset + 8 * dims
+    if base_type == 2:
+        return _read_sequence(data, offset, endian, dims, scale, base_type)
+    if base_type == 3:
+        (count,) = struct.unpack_from(endian + "I", data, offset)
+        offset += 4
+        rings = []
+        for _ in range(count):
+            ring, offset = _read_sequence(data, offset, endian, dims, scale, 2)
+            rings.append(ring)
+        return (base_type, rings), offset
+    if base_type in (4, 5, 6, 7):
+        (count,) = struct.unpack_from(endian + "I", data, offset)
+        offset += 4
+        parts = []
+        for _ in range(count):
+            part, offset = _read(data, offset, scale)
+            parts.append(part)
+        return (base_type, parts), offset
+    raise ValueError(f"Nieobsługiwany typ geometrii WKB: {base_type}")
+
+
+def _read_sequence(data, offset, endian, dims, scale, base_type):
+    (count,) = struct.unpack_from(endian + "I", data, offset)
+    offset += 4
+    values = struct.unpack_from(endian + "d" * (count * dims), data, offset)
+    if dims == 2:
+        coords = [round(v * scale) for v in values]
+    else:
+        coords = [round(v * scale) for pair in zip(values[0::dims], values[1::dims]) for v in pair]
+    return (base_type, coords), offset + 8 * dims * count
+
+
+def _canonicalize(node):
+    base_type, payload = node
+    if base_type == MULTILINESTRING and len(payload) == 1:
+        line = payload[0]
+    elif base_type == LINESTRING:
+        line = node
+    else:
+        return
+    coords = line[1]
+    if len(coords) >= 4 and (coords[0], coords[1]) > (coords[-2], coords[-1]):
+        reversed_coords = []
+        for i in range(len(coords) - 2, -1, -2):
+            reversed_coords.append(coords[i])
+            reversed_coords.append(coords[i + 1])
+        coords[:] = reversed_coords
+
+
+def _write(node, out):
+    base_type, payload = node
+    out.append(struct.pack("<B", base_type))
+    if base_type == 1:
+        out.append(struct.pack("<2q", *payload))
+    elif base_type == 2:
+        out.append(struct.pack(f"<I{len(payload)}q", len(payload) // 2, *payload))
+    else:
+        out.append(struct.pack("<I", len(payload)))
+        for child in payload:
+            _write(child, out)
@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+"""
+Wyszukiwanie powielonych wartości atrybutu identyfikatora w zakresie bez wczytywania obiektów.
+
+Zakres jest dzielony na siatkę komórek. Komórki w całości wewnątrz zakresu (łączone w pasy)
+są czytane bez testu zakresu - dla warstw punktowych nawet bez geometrii - a test na geometrii
+zakresu wykonywany jest tylko dla obiektów z komórek brzegowych. Pierwszy przebieg zapisuje
+jedynie 64-bitowe skróty wartości w kubełkach tablic `array('q')`; drugi zbiera wartości i fid
+wyłącznie dla skrótów występujących więcej niż raz i potwierdza je na rzeczywistych wartościach.
+Obiekt zwrócony przez dwa sąsiednie prostokąty jest liczony raz, bo grupy porównują zbiory fid.
+"""
+
+from array import array
+from collections import namedtuple, defaultdict
+
+from qgis.core import QgsFeatureRequest, QgsGeometry, QgsRectangle, QgsWkbTypes
+
+GRID_SIZE = 16
+BUCKET_BITS = 8
+
+# `has_features`: czy w zakresie jest jakikolwiek obiekt (obiekt na styku prostokątów jest zwracany kilkakrotnie,
+# więc liczba odczytów nie jest liczbą obiektów)
+IdCheckResult = namedtuple("IdCheckResult", ["unique_count", "missing_count", "duplicates", "has_features"])
+
+
+class HashCounter:
+    """Multiset of 64-bit hashes kept in 2^BUCKET_BITS arrays, so only one bucket is sorted at a time."""
+
+    def __init__(self):
+        self.buckets = [array('q') for _ in range(1 << BUCKET_BITS)]
+        self.mask = (1 << BUCKET_BITS) - 1
+
+    def add(self, value_hash):
+        self.buckets[value_hash & self.mask].append(value_hash)
+
+    def summary(self):
+        """Returns (number of distinct hashes, set of hashes seen more than once)."""
+        distinct = 0
+        repeated = set()
+        for i, bucket in enumerate(self.buckets):
+            previous = None
+            for value_hash in sorted(bucket):
+                if value_hash != previous:
+                    distinct += 1
+                    previous = value_hash
+                else:
+                    repeated.add(value_hash)
+            self.buckets[i] = array('q')
+        return distinct, repeated
+
+
+def _value_hash(value):
+    # hash() jest stały w obrębie jednego procesu, a tylko tyle jest potrzebne
+    return hash(value) & 0x7FFFFFFFFFFFFFFF
+
+
+def _scope_requests(layer, field_name, scope_geom, engine, grid_size):
+    """Yields (request, needs_scope_test) covering the zakres: interior strips and boundary cells."""
+    fields = layer.fields()
+    is_point_layer = layer.geometryType() == QgsWkbTypes.PointGeometry
+    if scope_geom is None:
+        request = QgsFeatureRequest().setFlags(QgsFeatureRequest.NoGeometry).setSubsetOfAttributes([field_name], fields)
+        yield request, False
+        return
+
+    bbox = scope_geom.boundingBox()
+    width = bbox.width() / grid_size or 1.0
+    height = bbox.height() / grid_size or 1.0
+    # Ostatnia krawędź to dokładne maksimum bbox, aby obiekty na brzegu zakresu trafiły do zapytania
+    x_edges = [bbox.xMinimum() + i * width for i in range(grid_size)] + [bbox.xMaximum()]
+    y_edges = [bbox.yMinimum() + i * height for i in range(grid_size)] + [bbox.yMaximum()]
+    for row in range(grid_size):
+        y_min, y_max = y_edges[row], y_edges[row + 1]
+        strip_start = None
+        for col in range(grid_size + 1):
+            inside = False
+            if col < grid_size:
+                cell = QgsRectangle(x_edges[col], y_min, x_edges[col + 1], y_max)
+                cell_geom = QgsGeometry.fromRect(cell)
+                inside = engine.contains(cell_geom.constGet())
+                if not inside and engine.intersects(cell_geom.constGet()):
+                    request = QgsFeatureRequest().setFilterRect(cell).setSubsetOfAttributes([field_name], fields)
+                    yield request, True
+            if inside and strip_start is None:
+                strip_start = col
+            elif not inside and strip_start is not None:
+                strip = QgsRectangle(x_edges[strip_start], y_min, x_edges[col], y_max)
+                request = QgsFeatureRequest().setFilterRect(strip).setSubsetOfAttributes([field_name], fields)
+                if is_point_layer:
+                    request.setFlags(QgsFeatureRequest.NoGeometry)
+                else:
+                    # Prostokąt otoczenia linii może zahaczać o pas, choć sama linia go omija
+                    request.setFlags(QgsFeatureRequest.ExactIntersect)
+                yield request, False
+                strip_start = None
+
+
+def find_duplicate_ids(layer, field_name, scope_geom=None, grid_size=GRID_SIZE):
+    """
+    Streams `field_name` of the features intersecting `scope_geom` (the whole layer if None).
+    Empty values are counted as missing. Returns IdCheckResult with duplicates as
+    [(value, sorted fids)], most frequent first.
+    """
+    engine = None
+    if scope_geom is not None:
+        engine = QgsGeometry.createGeometryEngine(scope_geom.constGet())
+        engine.prepareGeometry()
+
+    def stream():
+        for request, needs_scope_test in _scope_requests(layer, field_name, scope_geom, engine, grid_size):
+            for feature in layer.getFeatures(request):
+                if needs_scope_test:
+                    geom = feature.geometry()
+                    if not geom or geom.isNull() or not engine.intersects(geom.constGet()):
+                        continue
+                yield feature.id(), feature.attribute(field_name)
+
+    counter = HashCounter()
+    missing = set()
+    has_features = False
+    for fid, value in stream():
+        has_features = True
+        if value:
+            counter.add(_value_hash(value))
+        else:
+            missing.add(fid)
+    unique_count, repeated = counter.summary()
+
+    duplicates = []
+    if repeated:
+        # Drugi przebieg tylko dla skrótów występujących wielokrotnie
+        groups = defaultdict(set)
+        for fid, value in stream():
+            if value and _value_hash(value) in repeated:
+                groups[value].add(fid)
+        # Wartość powtórzona tylko przez obiekt zwrócony dwukrotnie (na styku prostokątów) nie jest duplikatem
+        duplicates = sorted(((value, sorted(fids)) for value, fids in groups.items() if len(fids) > 1), key=lambda item: -len(item[1]))
+    return IdCheckResult(unique_count, len(missing), duplicates, has_features)
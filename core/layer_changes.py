@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+"""
+Liczniki zmian warstw w bieżącej sesji QGIS.
+
+Warstwa dostaje nowy numer rewizji przy każdej modyfikacji bufora edycji i każdej zmianie danych
+warstwy (zatwierdzenie, wycofanie, przeładowanie). Numery pochodzą z jednego licznika procesu, więc
+warstwa usunięta i dodana ponownie z tym samym identyfikatorem nie powtórzy wcześniejszego numeru.
+Wraz z identyfikatorem sesji pozwala to stwierdzić, że warstwa nie zmieniła się od poprzedniego
+odczytu - bez ponownego czytania jej obiektów. Zapisy
+wykonywane bezpośrednio przez dostawcę danych (bez sygnałów warstwy) należy zgłosić przez `bump`.
+"""
+
+import itertools
+import uuid
+
+SESSION_ID = uuid.uuid4().hex
+
+_counter = itertools.count(1)
+_revisions = {}
+
+
+def watch(layer):
+    """Starts counting changes of a layer (once per layer)."""
+    if layer.id() in _revisions:
+        return
+    _revisions[layer.id()] = next(_counter)
+
+    def on_change(*args, layer_id=layer.id()):
+        _bump(layer_id)
+
+    layer.layerModified.connect(on_change)
+    layer.dataChanged.connect(on_change)
+    layer.subsetStringChanged.connect(on_change)
+    layer.willBeDeleted.connect(lambda layer_id=layer.id(): _revisions.pop(layer_id, None))
+
+
+def _bump(layer_id):
+    if layer_id in _revisions:
+        _revisions[layer_id] = next(_counter)
+
+
+def bump(layer):
+    """Records a change made outside of the layer's edit buffer (e.g. a write through its data provider), which emits no layer signal."""
+    _bump(layer.id())
+
+
+def revision(layer):
+    """Returns the current revision of a watched layer, or None if the layer is not watched."""
+    return _revisions.get(layer.id())
@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+"""
+Wyszukiwanie nakładających się odcinków linii bez operacji GEOS.
+
+Odcinki są grupowane w kubełkach kierunku (kąt prostej modulo pi, krok ANGLE_STEP) i przesunięcia
+(współrzędna prostopadła do osi kubełka, krok OFFSET_STEP). Odcinek trafia do wszystkich kubełków
+mieszczących się w tolerancji jego kierunku i położenia, więc dwa odcinki współliniowe z dokładnością
+do tolerancji 10^-PRECISION zawsze dzielą co najmniej jeden kubełek - także gdy jeden zaczyna się
+w połowie drugiego. W kubełku kandydaci są wyznaczani przejściem po przedziałach wzdłuż osi,
+a para jest przyjmowana, gdy wierzchołki krótszego odcinka leżą w tolerancji od prostej dłuższego.
+"""
+
+import math
+from collections import defaultdict
+
+PRECISION = 3
+ANGLE_STEP = 0.01
+OFFSET_STEP = 1.0
+
+# Krok dzielący pi bez reszty, aby kubełek ostatni sąsiadował z pierwszym
+_ANGLE_BUCKETS = round(math.pi / ANGLE_STEP)
+_BUCKET_ANGLE = math.pi / _ANGLE_BUCKETS
+
+
+def _segments(lines):
+    """Returns (keys, segments); a segment is (x1, y1, x2, y2, length, ordinal) relative to the first vertex."""
+    order = {}
+    segments = []
+    origin = None
+    for key, parts in lines:
+        ordinal = order.setdefault(key, len(order))
+        for part in parts:
+            if origin is None and part:
+                origin = part[0]
+            for (x1, y1), (x2, y2) in zip(part, part[1:]):
+                length = math.hypot(x2 - x1, y2 - y1)
+                if length > 0:
+                    # Współrzędne lokalne ograniczają błąd zaokrągleń przy dużych współrzędnych układu
+                    segments.append((x1 - origin[0], y1 - origin[1], x2 - origin[0], y2 - origin[1], length, ordinal))
+    return list(order), segments
+
+
+def _buckets(segment, tolerance):
+    """Yields (angle bucket, offset bucket) within the tolerance of the segment."""
+    x1, y1, x2, y2, length, _ = segment
+    angle = math.atan2(y2 - y1, x2 - x1) % math.pi
+    # Wierzchołki w tolerancji od prostej innego odcinka dopuszczają takie odchylenie kierunku
+    spread = math.asin(min(1.0, 2 * tolerance / length))
+    first, last = math.floor((angle - spread) / _BUCKET_ANGLE), math.floor((angle + spread) / _BUCKET_ANGLE)
+    for bucket in range(first, last + 1):
+        bucket %= _ANGLE_BUCKETS
+        axis = (bucket + 0.5) * _BUCKET_ANGLE
+        normal_x, normal_y = -math.sin(axis), math.cos(axis)
+        p1, p2 = x1 * normal_x + y1 * normal_y, x2 * normal_x + y2 * normal_y
+        low, high = min(p1, p2) - tolerance, max(p1, p2) + tolerance
+        for offset in range(math.floor(low / OFFSET_STEP), math.floor(high / OFFSET_STEP) + 1):
+            yield bucket, offset
+
+
+def _overlap_length(a, b, tolerance):
+    """Length of the collinear stretch shared by two segments, or 0."""
+    longer, shorter = (a, b) if a[4] >= b[4] else (b, a)
+    x1, y1, x2, y2, length, _ = longer
+    ux, uy = (x2 - x1) / length, (y2 - y1) / length
+    sx1, sy1, sx2, sy2 = shorter[:4]
+    if abs((sx1 - x1) * uy - (sy1 - y1) * ux) > tolerance or abs((sx2 - x1) * uy - (sy2 - y1) * ux) > tolerance:
+        return 0.0
+    t1, t2 = (sx1 - x1) * ux + (sy1 - y1) * uy, (sx2 - x1) * ux + (sy2 - y1) * uy
+    overlap = min(length, max(t1, t2)) - max(0.0, min(t1, t2))
+    # Odcinki stykające się końcami nie tworzą nakładki
+    return overlap if overlap > tolerance else 0.0
+
+
+def find_overlaps(lines, precision=PRECISION):
+    """
+    `lines` is an iterable of (key, parts), where parts are lists of (x, y), e.g. from `geometry_hash.wkb_parts`.
+    Returns {(key_a, key_b): overlap length} for every pair of different keys sharing a collinear
+    stretch (within 10^-precision) of positive length; within a pair, key_a is the one given first.
+    """
+    tolerance = 10 ** -precision
+    keys, segments = _segments(lines)
+
+    by_bucket = defaultdict(list)
+    for index, segment in enumerate(segments):
+        for bucket in _buckets(segment, tolerance):
+            by_bucket[bucket].append(index)
+
+    overlaps = defaultdict(float)
+    compared = set()
+    for (angle_bucket, _), indexes in by_bucket.items():
+        if len(indexes) < 2 or len({segments[i][5] for i in indexes}) < 2:
+            continue
+        axis = (angle_bucket + 0.5) * _BUCKET_ANGLE
+        axis_x, axis_y = math.cos(axis), math.sin(axis)
+        intervals = []
+        for i in indexes:
+            x1, y1, x2, y2 = segments[i][:4]
+            u1, u2 = x1 * axis_x + y1 * axis_y, x2 * axis_x + y2 * axis_y
+            intervals.append((min(u1, u2) - tolerance, max(u1, u2) + tolerance, i))
+        intervals.sort()
+
+        active = []
+        for start, end, i in intervals:
+            active = [item for item in active if item[0] >= start]
+            for _, j in active:
+                a, b = (i, j) if i < j else (j, i)
+                if segments[a][5] == segments[b][5] or (a, b) in compared:
+                    continue
+                compared.add((a, b))
+                length = _overlap_length(segments[a], segments[b], tolerance)
+                if length > 0:
+                    pair = tuple(sorted((segments[a][5], segments[b][5])))
+                    overlaps[pair] += length
+            active.append((end, i))
+
+    return {(keys[a], keys[b]): length for (a, b), length in overlaps.items()}
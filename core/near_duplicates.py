@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+"""
+Wyszukiwanie prawie identycznych obiektów (różniących się o nie więcej niż zadaną tolerancję).
+
+Obiekty są opisywane listą części (list współrzędnych (x, y)), np. z `geometry_hash.wkb_parts`.
+Para kandydatów przechodzi najpierw tani test sygnatury (końce i długość), a dopiero potem
+ograniczony test odległości Hausdorffa, przerywany przy pierwszym punkcie poza tolerancją.
+"""
+
+import math
+
+# Dopuszczalna względna różnica długości w teście sygnatury (ponad dwukrotność tolerancji)
+LENGTH_SLACK = 0.01
+
+
+class UnionFind:
+    """Disjoint sets of hashable items; `groups()` returns the sets with more than one member."""
+
+    def __init__(self):
+        self.parent = {}
+
+    def find(self, item):
+        root = self.parent.setdefault(item, item)
+        while self.parent[root] != root:
+            root = self.parent[root]
+        while item != root:
+            self.parent[item], item = root, self.parent[item]
+        return root
+
+    def union(self, a, b):
+        root_a, root_b = self.find(a), self.find(b)
+        if root_a != root_b:
+            self.parent[root_b] = root_a
+
+    def groups(self):
+        members = {}
+        for item in self.parent:
+            members.setdefault(self.find(item), []).append(item)
+        return [group for group in members.values() if len(group) > 1]
+
+
+def signature(parts):
+    """Returns (start, end, length) of a list of parts."""
+    length = 0.0
+    for part in parts:
+        for (x1, y1), (x2, y2) in zip(part, part[1:]):
+            length += math.hypot(x2 - x1, y2 - y1)
+    return parts[0][0], parts[-1][-1], length
+
+
+def signatures_match(sig_a, sig_b, tolerance, check_reversed=False):
+    (start_a, end_a, length_a), (start_b, end_b, length_b) = sig_a, sig_b
+    if abs(length_a - length_b) > 2 * tolerance + LENGTH_SLACK * max(length_a, length_b):
+        return False
+    if _close(start_a, start_b, tolerance) and _close(end_a, end_b, tolerance):
+        return True
+    return check_reversed and _close(start_a, end_b, tolerance) and _close(end_a, start_b, tolerance)
+
+
+def within_hausdorff(parts_a, parts_b, tolerance):
+    """
+    True if every vertex and segment midpoint of each geometry lies within `tolerance` of the other one.
+    Stops at the first sample point farther than `tolerance`.
+    """
+    tolerance_sq = tolerance * tolerance
+    for source, target in ((parts_a, parts_b), (parts_b, parts_a)):
+        for x, y in _sample_points(source):
+            if not _point_within(x, y, target, tolerance_sq):
+                return False
+    return True
+
+
+def _close(a, b, tolerance):
+    return (a[0] - b[0]) ** 2 + (a[1] - b[1]) ** 2 <= tolerance * tolerance
+
+
+def _sample_points(parts):
+    for part in parts:
+        yield part[0]
+        for (x1, y1), (x2, y2) in zip(part, part[1:]):
+            yield (x1 + x2) / 2, (y1 + y2) / 2
+            yield x2, y2
+
+
+def _point_within(px, py, parts, tolerance_sq):
+    for part in parts:
+        if len(part) == 1:
+            x, y = part[0]
+            if (px - x) ** 2 + (py - y) ** 2 <= tolerance_sq:
+                return True
+            continue
+        for (x1, y1), (x2, y2) in zip(part, part[1:]):
+            dx, dy = x2 - x1, y2 - y1
+            length_sq = dx * dx + dy * dy
+            t = 0.0 if length_sq == 0 else max(0.0, min(1.0, ((px - x1) * dx + (py - y1) * dy) / length_sq))
+            if (px - x1 - t * dx) ** 2 + (py - y1 - t * dy) ** 2 <= tolerance_sq:
+                return True
+    return False
@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+"""
+Zestawienie statystyk dla wszystkich zakresów zadania w jednym przebiegu.
+
+Zakresy trafiają do indeksu przestrzennego ładowanego hurtowo (STR), a każda warstwa jest
+czytana jeden raz w obrębie łącznego zasięgu zakresów. Obiekt liniowy należy do zakresu, w którym
+leży jego wierzchołek końcowy, pozostałe obiekty - do zakresów, które przecinają. Wyniki są
+sumowane w tabeli przestawnej: ścieżka grupy x zakres.
+"""
+
+from collections import defaultdict
+
+from qgis.core import QgsFeatureRequest, QgsGeometry, QgsPoint, QgsRectangle, QgsSpatialIndex
+
+from .geometry_hash import wkb_parts
+from .stats_aggregation import AGGREGATIONS, group_value
+
+# Grupowania warstw z zestawienia - te same co w statystyce pojedynczego zakresu
+MATRIX_GROUPINGS = {name: AGGREGATIONS[name] for name in ("kable", "trakt", "punkty_elastycznosci")}
+
+COUNT = "count"
+
+
+class ScopeAssigner:
+    """Assigns geometries to the named features of the zakres layer."""
+
+    def __init__(self, scope_layer, name_field="nazwa"):
+        self.geometries = {}
+        names = {}
+        request = QgsFeatureRequest().setSubsetOfAttributes([name_field], scope_layer.fields())
+        for feature in scope_layer.getFeatures(request):
+            name = feature.attribute(name_field)
+            geom = feature.geometry()
+            if name and geom and not geom.isEmpty():
+                names[feature.id()] = str(name)
+                self.geometries[feature.id()] = geom
+
+        # Kolumny w kolejności nazw, jak na liście zakresów
+        self.fids = sorted(names, key=names.get)
+        self.names = [names[fid] for fid in self.fids]
+        self.column = {fid: i for i, fid in enumerate(self.fids)}
+
+        self.extent = QgsRectangle()
+        self.extent.setMinimal()
+        for geom in self.geometries.values():
+            self.extent.combineExtentWith(geom.boundingBox())
+
+        # Konstruktor z iteratorem ładuje drzewo hurtowo (Sort-Tile-Recursive)
+        self.index = QgsSpatialIndex(scope_layer.getFeatures(QgsFeatureRequest().setFilterFids(self.fids).setNoAttributes()))
+        self._engines = {}
+
+    def __len__(self):
+        return len(self.fids)
+
+    def _engine(self, fid):
+        engine = self._engines.get(fid)
+        if engine is None:
+            engine = self._engines[fid] = QgsGeometry.createGeometryEngine(self.geometries[fid].constGet())
+            engine.prepareGeometry()
+        return engine
+
+    def assign(self, geom, is_line):
+        """Returns the column indexes of the zakresy the geometry belongs to."""
+        if not geom or geom.isNull() or geom.isEmpty():
+            return []
+        if is_line:
+            parts = [part for part in wkb_parts(geom.asWkb()) if part]
+            if not parts:
+                return []
+            x, y = parts[-1][-1]
+            target, rect = QgsPoint(x, y), QgsRectangle(x, y, x, y)
+        else:
+            target, rect = geom.constGet(), geom.boundingBox()
+        return sorted(self.column[fid] for fid in self.index.intersects(rect) if fid in self.column and self._engine(fid).intersects(target))
+
+
+class ScopeMatrix:
+    """Pivot of {layer name: {group path: {metric: [value per zakres]}}} with helpers for rendering."""
+
+    def __init__(self, scope_names):
+        self.scope_names = scope_names
+        self.tables = {}
+        self.metrics = {}
+        self.unassigned = defaultdict(int)
+
+    def add(self, layer_name, path, column, values):
+        table = self.tables.setdefault(layer_name, {})
+        cells = table.get(path)
+        if cells is None:
+            cells = table[path] = {metric: [0] * len(self.scope_names) for metric in self.metrics[layer_name]}
+        for metric, value in values.items():
+            cells[metric][column] += value
+
+    def rows(self, layer_name, metric):
+        """Yields (depth, path, values per zakres) in path order, with a subtotal row for every path prefix."""
+        table = self.tables.get(layer_name, {})
+        totals = {}
+        for path, cells in table.items():
+            for depth in range(1, len(path) + 1):
+                prefix = path[:depth]
+                row = totals.setdefault(prefix, [0] * len(self.scope_names))
+                for i, value in enumerate(cells[metric]):
+                    row[i] += value
+        for path in sorted(totals):
+            yield len(path) - 1, path, totals[path]
+
+
+def build_matrix(project, groupings=MATRIX_GROUPINGS, scope_layer_name="zakres_zadania"):
+    """Reads every grouped layer once and returns a ScopeMatrix, or None if there is no zakres layer."""
+    scope_layers = project.mapLayersByName(scope_layer_name)
+    if not scope_layers or "nazwa" not in scope_layers[0].fields().names():
+        return None
+    assigner = ScopeAssigner(scope_layers[0])
+    matrix = ScopeMatrix(assigner.names)
+    if not len(assigner):
+        return matrix
+
+    for layer_name, grouping in groupings.items():
+        layer_list = project.mapLayersByName(layer_name)
+        if not layer_list:
+            continue
+        layer = layer_list[0]
+        field_names = layer.fields().names()
+        sum_fields = [name for name in grouping.sum_fields if name in field_names]
+        matrix.metrics[layer_name] = [COUNT] + sum_fields
+
+        attributes = [name for name in grouping.group_fields if name in field_names] + sum_fields
+        request = QgsFeatureRequest().setFilterRect(assigner.extent).setSubsetOfAttributes(attributes, layer.fields())
+        for feature in layer.getFeatures(request):
+            columns = assigner.assign(feature.geometry(), grouping.end_point)
+            if not columns:
+                matrix.unassigned[layer_name] += 1
+                continue
+            path = tuple(group_value(feature.attribute(name) if name in field_names else None) for name in grouping.group_fields)
+            values = {COUNT: 1}
+            for name in sum_fields:
+                values[name] = feature.attribute(name) or 0
+            for column in columns:
+                matrix.add(layer_name, path, column, values)
+    return matrix
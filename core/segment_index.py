@@ -0,0 +1,116 @@
+from collections import namedtuple
+
+from qgis.core import (
+    QgsProject,
+    QgsGeometry,
+    QgsPointXY,
+    QgsRectangle,
+    QgsFeatureRequest,
+    QgsSpatialIndex,
+    QgsVectorLayer,
+    QgsCoordinateTransform
+)
+
+# Wynik dociągnięcia do segmentu. `before_vertex` to numer wierzchołka obiektu docelowego,
+# przed którym należy wstawić nowy wierzchołek (zgodnie z QgsVectorLayer.insertVertex).
+SegmentHit = namedtuple("SegmentHit", ["point", "distance", "layer", "fid", "before_vertex", "t"])
+
+
+def closest_point_on_segment(px, py, x1, y1, x2, y2):
+    """Returns (x, y, t) of the point on segment (x1, y1)-(x2, y2) closest to (px, py)."""
+    dx, dy = x2 - x1, y2 - y1
+    length_sq = dx * dx + dy * dy
+    if length_sq == 0:
+        return x1, y1, 0.0
+    t = ((px - x1) * dx + (py - y1) * dy) / length_sq
+    t = max(0.0, min(1.0, t))
+    return x1 + t * dx, y1 + t * dy, t
+
+
+class SegmentIndex:
+    """R-tree of line segments used for vertex-to-segment snapping."""
+
+    def __init__(self, target_crs, project=None):
+        self.project = project or QgsProject.instance()
+        self.target_crs = target_crs
+        self.index = QgsSpatialIndex()
+        self.segments = {}
+
+    def __len__(self):
+        return len(self.segments)
+
+    def add_layer(self, layer, area_geom):
+        """Adds every segment of `layer` features intersecting `area_geom` (given in target CRS)."""
+        if not isinstance(layer, QgsVectorLayer) or area_geom is None or area_geom.isEmpty():
+            return 0
+
+        transform_to_target = None
+        request_geom = QgsGeometry(area_geom)
+        if layer.crs() != self.target_crs:
+            transform_to_target = QgsCoordinateTransform(layer.crs(), self.target_crs, self.project)
+            request_geom.transform(QgsCoordinateTransform(self.target_crs, layer.crs(), self.project))
+
+        request = QgsFeatureRequest().setFilterRect(request_geom.boundingBox()).setNoAttributes()
+        added = 0
+        for feature in layer.getFeatures(request):
+            geom = QgsGeometry(feature.geometry())
+            if geom.isEmpty():
+                continue
+            if transform_to_target:
+                geom.transform(transform_to_target)
+            if not geom.intersects(area_geom):
+                continue
+
+            parts = geom.asMultiPolyline() if geom.isMultipart() else [geom.asPolyline()]
+            vertex_number = 0
+            for part in parts:
+                for i in range(1, len(part)):
+                    p1, p2 = part[i - 1], part[i]
+                    segment_id = len(self.segments)
+                    self.segments[segment_id] = (layer, feature.id(), vertex_number + i, p1.x(), p1.y(), p2.x(), p2.y())
+                    self.index.addFeature(segment_id, QgsRectangle(p1.x(), p1.y(), p2.x(), p2.y()))
+                    added += 1
+                vertex_number += len(part)
+        return added
+
+    def nearest(self, point, max_distance=None, exclude=None):
+        """
+        Returns the SegmentHit closest to `point`, or None.
+        `exclude` is a (layer_id, fid) pair whose own segments are ignored.
+        """
+        if not self.segments:
+            return None
+
+        px, py = point.x(), point.y()
+        if max_distance is None:
+            max_distance = self._nearest_bound(QgsPointXY(px, py), exclude)
+            if max_distance is None:
+                return None
+
+        search_rect = QgsRectangle(px - max_distance, py - max_distance, px + max_distance, py + max_distance)
+        best = None
+        for segment_id in self.index.intersects(search_rect):
+            layer, fid, before_vertex, x1, y1, x2, y2 = self.segments[segment_id]
+            if exclude and (layer.id(), fid) == exclude:
+                continue
+            x, y, t = closest_point_on_segment(px, py, x1, y1, x2, y2)
+            distance = ((px - x) ** 2 + (py - y) ** 2) ** 0.5
+            if distance <= max_distance and (best is None or distance < best.distance):
+                best = SegmentHit(QgsPointXY(x, y), distance, layer, fid, before_vertex, t)
+        return best
+
+    def _nearest_bound(self, point, exclude):
+        # Odległość do najbliższego (wg bbox) segmentu obcego obiektu jest górnym ograniczeniem
+        # odległości do najbliższego segmentu, więc wystarczy potem jedno zapytanie prostokątem.
+        neighbors = 8
+        while True:
+            candidate_ids = self.index.nearestNeighbor(point, neighbors)
+            for segment_id in candidate_ids:
+                layer, fid, _, x1, y1, x2, y2 = self.segments[segment_id]
+                if exclude and (layer.id(), fid) == exclude:
+                    continue
+                x, y, _ = closest_point_on_segment(point.x(), point.y(), x1, y1, x2, y2)
+                return ((point.x() - x) ** 2 + (point.y() - y) ** 2) ** 0.5
+            if len(candidate_ids) < neighbors:
+                return None
+            neighbors *= 8
@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+"""
+Wynik statystyki jako drzewo: sekcja -> tabela -> wiersze (ścieżka grupy i wartości metryk).
+
+Moduł nie zależy od qgis ani Qt. Widżet statystyki renderuje z drzewa HTML, a eksport zapisuje je
+strumieniowo (wiersz po wierszu) do JSON, CSV w formacie długim (jedna metryka w wierszu) oraz
+XLSX z arkuszem na każdą sekcję - bez udziału wyrenderowanego dokumentu.
+"""
+
+import csv
+import json
+from collections import namedtuple
+
+try:
+    import xlsxwriter
+except ImportError:
+    xlsxwriter = None
+
+# `path` to etykiety grup od najogólniejszej, `values` odpowiadają nagłówkom tabeli bez pierwszego.
+# `style`: None, "heading" (wyróżniona grupa), "ok", "warning", "error" (etykieta) lub "alert" (wartości).
+ReportRow = namedtuple("ReportRow", ["path", "values", "style", "unit"])
+ReportRow.__new__.__defaults__ = ((), None, None)
+
+CSV_HEADERS = ["Sekcja", "Tabela", "Grupa", "Metryka", "Wartość", "Jednostka"]
+PATH_SEPARATOR = " > "
+
+
+class ReportTable:
+    """Table of rows; `headers[0]` names the label column, the rest name the metrics."""
+
+    def __init__(self, title, headers=None, kind="table"):
+        self.title = title
+        self.headers = list(headers or [])
+        self.kind = kind
+        self.rows = []
+
+    def add(self, path, values=(), style=None, unit=None):
+        if not isinstance(path, (tuple, list)):
+            path = (path,)
+        self.rows.append(ReportRow(tuple(path), list(values), style, unit))
+
+    def metric_names(self):
+        return self.headers[1:]
+
+    def metrics(self, row):
+        """Returns (metric name, value) pairs of a row; rows of tables without headers have one unnamed metric."""
+        names = self.metric_names() or [""] * len(row.values)
+        return [(name, value) for name, value in zip(names, row.values) if value != ""]
+
+
+class ReportSection:
+    def __init__(self, key, title, icon=""):
+        self.key = key
+        self.title = title
+        self.icon = icon
+        self.tables = []
+
+    def table(self, title, headers=None, kind="table"):
+        table = ReportTable(title, headers, kind)
+        self.tables.append(table)
+        return table
+
+
+class StatisticsReport:
+    def __init__(self, scope_name=""):
+        self.scope_name = scope_name
+        self.sections = []
+
+    def section(self, key, title, icon=""):
+        section = ReportSection(key, title, icon)
+        self.sections.append(section)
+        return section
+
+    def is_empty(self):
+        return not any(table.rows for section in self.sections for table in section.tables)
+
+    def long_rows(self):
+        """Yields one (section, table, group path, metric, value, unit) tuple per metric value."""
+        for section in self.sections:
+            for table in section.tables:
+                for row in table.rows:
+                    for metric, value in table.metrics(row):
+                        yield section.title, table.title, PATH_SEPARATOR.join(str(label) for label in row.path), metric, value, row.unit or ""
+
+
+# --- Eksport ---
+
+def write_csv(report, file_path):
+    count = 0
+    with open(file_path, 'w', newline='', encoding='utf-8-sig') as csvfile:
+        writer = csv.writer(csvfile, delimiter=';')
+        writer.writerow(CSV_HEADERS)
+        for row in report.long_rows():
+            writer.writerow(row)
+            count += 1
+    return count
+
+
+def write_json(report, file_path):
+    """Writes the report row by row, so the whole document is never held as one string."""
+    count = 0
+    with open(file_path, 'w', encoding='utf-8') as out:
+        out.write('{"zakres": %s, "sekcje": [' % _json(report.scope_name))
+        for i, section in enumerate(report.sections):
+            out.write(("," if i else "") + '\n {"klucz": %s, "tytul": %s, "tabele": [' % (_json(section.key), _json(section.title)))
+            for j, table in enumerate(section.tables):
+                out.write(("," if j else "") + '\n  {"tytul": %s, "naglowki": %s, "wiersze": [' % (_json(table.title), _json(table.headers)))
+                for k, row in enumerate(table.rows):
+                    item = {"grupa": list(row.path), "metryki": dict(table.metrics(row))}
+                    if row.style:
+                        item["styl"] = row.style
+                    if row.unit:
+                        item["jednostka"] = row.unit
+                    out.write(("," if k else "") + "\n   " + _json(item))
+                    count += 1
+                out.write("]}")
+            out.write("]}")
+        out.write("]}\n")
+    return count
+
+
+def write_xlsx(report, file_path):
+    """One sheet per section with its tables one below another. Requires xlsxwriter."""
+    if xlsxwriter is None:
+        raise ImportError("xlsxwriter")
+    count = 0
+    # constant_memory zapisuje arkusz wiersz po wierszu
+    workbook = xlsxwriter.Workbook(file_path, {"constant_memory": True})
+    try:
+        bold = workbook.add_format({"bold": True})
+        used_names = set()
+        for section in report.sections:
+            sheet = workbook.add_worksheet(_sheet_name(section.title, used_names))
+            row_index = 0
+            for table in section.tables:
+                sheet.write_string(row_index, 0, table.title, bold)
+                row_index += 1
+                depth = max((len(row.path) for row in table.rows), default=1)
+                headers = [f"Poziom {level + 1}" for level in range(depth)] + (table.metric_names() or ["Wartość"]) + ["Jednostka"]
+                sheet.write_row(row_index, 0, headers, bold)
+                row_index += 1
+                for row in table.rows:
+                    labels = list(row.path) + [""] * (depth - len(row.path))
+                    sheet.write_row(row_index, 0, labels + [_cell(value) for value in row.values] + [row.unit or ""])
+                    row_index += 1
+                    count += 1
+                row_index += 1
+    finally:
+        workbook.close()
+    return count
+
+
+def _json(value):
+    return json.dumps(value, ensure_ascii=False, default=str)
+
+
+def _cell(value):
+    return value if isinstance(value, (int, float)) or value is None else str(value)
+
+
+def _sheet_name(title, used_names):
+    # Excel: do 31 znaków, bez []:*?/\ i nazwy unikalne w skoroszycie
+    name = "".join(" " if char in '[]:*?/\\' else char for char in title).strip()[:31] or "Arkusz"
+    candidate, number = name, 2
+    while candidate.lower() in used_names:
+        suffix = f" ({number})"
+        candidate = name[:31 - len(suffix)] + suffix
+        number += 1
+    used_names.add(candidate.lower())
+    return candidate
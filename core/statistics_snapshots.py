@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+"""
+Lokalna baza SQLite z wynikami kolejnych uruchomień statystyki.
+
+Każde uruchomienie zapisuje migawkę (projekt, zakres, czas, skrót stanu projektu) z sekcjami
+raportu w postaci JSON oraz wartościami liczbowymi metryk w formacie długim, z których
+liczone są różnice względem poprzedniej migawki. Sekcja zapisana z tym samym skrótem stanu jej
+warstw może zostać wczytana zamiast ponownego przeliczenia.
+"""
+
+import json
+import sqlite3
+import datetime
+from collections import namedtuple
+
+from .statistics_report import ReportSection, ReportRow
+
+# Liczba migawek przechowywanych dla jednej pary projekt/zakres
+MAX_SNAPSHOTS = 20
+
+Snapshot = namedtuple("Snapshot", ["id", "created", "state_hash"])
+MetricDelta = namedtuple("MetricDelta", ["section", "table", "group", "metric", "previous", "current"])
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS snapshots (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    project TEXT NOT NULL,
+    scope TEXT NOT NULL,
+    created TEXT NOT NULL,
+    state_hash TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS snapshots_project_scope ON snapshots (project, scope, id);
+CREATE TABLE IF NOT EXISTS sections (
+    snapshot_id INTEGER NOT NULL REFERENCES snapshots (id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    key TEXT NOT NULL,
+    state_hash TEXT NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS sections_snapshot ON sections (snapshot_id);
+CREATE TABLE IF NOT EXISTS metrics (
+    snapshot_id INTEGER NOT NULL REFERENCES snapshots (id) ON DELETE CASCADE,
+    section TEXT NOT NULL,
+    table_title TEXT NOT NULL,
+    group_path TEXT NOT NULL,
+    metric TEXT NOT NULL,
+    value REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS metrics_snapshot ON metrics (snapshot_id);
+"""
+
+
+class SnapshotStore:
+    def __init__(self, path):
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.execute("PRAGMA foreign_keys = ON")
+        self.connection.executescript(_SCHEMA)
+
+    def close(self):
+        self.connection.close()
+
+    def save(self, project, scope, state_hash, report, section_hashes):
+        """Stores the report; `section_hashes` maps section keys to the state hash of their layers. Returns the snapshot id."""
+        created = datetime.datetime.now().isoformat(timespec="seconds")
+        with self.connection:
+            cursor = self.connection.execute(
+                "INSERT INTO snapshots (project, scope, created, state_hash) VALUES (?, ?, ?, ?)",
+                (project, scope, created, state_hash),
+            )
+            snapshot_id = cursor.lastrowid
+            self.connection.executemany(
+                "INSERT INTO sections (snapshot_id, position, key, state_hash, data) VALUES (?, ?, ?, ?, ?)",
+                ((snapshot_id, i, section.key, section_hashes.get(section.key, ""), _dump_section(section))
+                 for i, section in enumerate(report.sections)),
+            )
+            self.connection.executemany(
+                "INSERT INTO metrics (snapshot_id, section, table_title, group_path, metric, value) VALUES (?, ?, ?, ?, ?, ?)",
+                ((snapshot_id, section, table, group, metric, value)
+                 for section, table, group, metric, value, _ in report.long_rows() if _is_number(value)),
+            )
+            self._prune(project, scope)
+        return snapshot_id
+
+    def _prune(self, project, scope):
+        self.connection.execute(
+            "DELETE FROM snapshots WHERE project = ? AND scope = ? AND id NOT IN "
+            "(SELECT id FROM snapshots WHERE project = ? AND scope = ? ORDER BY id DESC LIMIT ?)",
+            (project, scope, project, scope, MAX_SNAPSHOTS),
+        )
+
+    def latest(self, project, scope, before_id=None):
+        """Returns the newest Snapshot of the project/zakres (older than `before_id`, if given), or None."""
+        query = "SELECT id, created, state_hash FROM snapshots WHERE project = ? AND scope = ?"
+        params = [project, scope]
+        if before_id is not None:
+            query += " AND id < ?"
+            params.append(before_id)
+        row = self.connection.execute(query + " ORDER BY id DESC LIMIT 1", params).fetchone()
+        return Snapshot(*row) if row else None
+
+    def section_hashes(self, snapshot_id):
+        return dict(self.connection.execute("SELECT key, state_hash FROM sections WHERE snapshot_id = ?", (snapshot_id,)))
+
+    def load_section(self, snapshot_id, key):
+        row = self.connection.execute(
+            "SELECT data FROM sections WHERE snapshot_id = ? AND key = ? ORDER BY position LIMIT 1", (snapshot_id, key)
+        ).fetchone()
+        return _load_section(row[0]) if row else None
+
+    def metrics(self, snapshot_id):
+        rows = self.connection.execute(
+            "SELECT section, table_title, group_path, metric, value FROM metrics WHERE snapshot_id = ? ORDER BY rowid", (snapshot_id,)
+        )
+        return {(section, table, group, metric): value for section, table, group, metric, value in rows}
+
+    def compare(self, previous_id, current_id):
+        """Returns MetricDelta for every metric whose value differs (or exists in only one snapshot), in current report order."""
+        previous = self.metrics(previous_id)
+        current = self.metrics(current_id)
+        deltas = []
+        for key, value in current.items():
+            old = previous.get(key)
+            if old is None or abs(old - value) > 1e-9:
+                deltas.append(MetricDelta(*key, old, value))
+        deltas.extend(MetricDelta(*key, value, None) for key, value in previous.items() if key not in current)
+        return deltas
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _dump_section(section):
+    return json.dumps({
+        "key": section.key,
+        "title": section.title,
+        "icon": section.icon,
+        "tables": [
+            {"title": table.title, "headers": table.headers, "kind": table.kind, "rows": [list(row) for row in table.rows]}
+            for table in section.tables
+        ],
+    }, ensure_ascii=False, default=str)
+
+
+def _load_section(data):
+    item = json.loads(data)
+    section = ReportSection(item["key"], item["title"], item["icon"])
+    for table_item in item["tables"]:
+        table = section.table(table_item["title"], table_item["headers"], table_item["kind"])
+        table.rows = [ReportRow(tuple(path), values, style, unit) for path, values, style, unit in table_item["rows"]]
+    return section
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+"""
+Definicje agregacji statystyki (liczba obiektów i sumy pól w grupach) i ich wykonanie w Pythonie.
+
+Moduł nie zależy od qgis. Wynik ma postać {(wartości grupujące): [liczba, suma pola 1, ...]},
+zarówno dla obiektów (`aggregate_features`), jak i dla wierszy zapytania `GROUP BY` wykonanego
+w bazie danych warstwy (`group_by_sql`, `merge_group_rows`), więc obie ścieżki dają porównywalne wyniki.
+Zestawienie wszystkich zakresów (`scope_matrix`) korzysta z tych samych definicji.
+"""
+
+from collections import namedtuple
+
+# `end_point`: obiekt należy do zakresu, gdy leży w nim jego wierzchołek końcowy (obiekty liniowe)
+Aggregation = namedtuple("Aggregation", ["group_fields", "sum_fields", "end_point"])
+
+AGGREGATIONS = {
+    "kable": Aggregation(("segment", "rodzaj", "poj"), ("dl_tras", "dl_inst"), True),
+    "trakt": Aggregation(("trakt",), ("dl_tras", "dl_inst"), True),
+    "lista_pa": Aggregation(("Rodzaj pun",), ("Licz_lokal", "Licz_przed", "Licz_SED"), False),
+    "punkty_elastycznosci": Aggregation(("typ", "status", "rodzaj"), ("l_spl",), False),
+}
+
+
+def group_value(value):
+    return str(value) if value else "BRAK"
+
+
+def quote_identifier(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+def group_by_sql(table, field_names, aggregation, predicate):
+    """
+    The `GROUP BY` query of an aggregation over `table` (already quoted) filtered by `predicate`.
+    Fields missing from `field_names` are grouped as NULL and summed as 0, as `attribute()` returns None for them.
+    """
+    group_columns = [quote_identifier(name) if name in field_names else "NULL" for name in aggregation.group_fields]
+    sum_columns = [f"SUM(COALESCE({quote_identifier(name)}, 0))" if name in field_names else "0" for name in aggregation.sum_fields]
+    positions = ", ".join(str(i) for i in range(1, len(group_columns) + 1))
+    return f"SELECT {', '.join(group_columns + ['COUNT(*)'] + sum_columns)} FROM {table} WHERE {predicate} GROUP BY {positions}"
+
+
+def _sum_value(value):
+    return value or 0
+
+
+def _add(result, group, count, sums):
+    row = result.get(group)
+    if row is None:
+        result[group] = [count] + list(sums)
+        return
+    row[0] += count
+    for i, value in enumerate(sums, 1):
+        row[i] += value
+
+
+def aggregate_features(features, aggregation):
+    """Python path over features already selected by the zakres rule."""
+    result = {}
+    for f in features:
+        group = tuple(group_value(f.attribute(name)) for name in aggregation.group_fields)
+        _add(result, group, 1, [_sum_value(f.attribute(name)) for name in aggregation.sum_fields])
+    return result
+
+
+def merge_group_rows(rows, group_size):
+    """
+    Database path: rows of (group values..., count, sums...) as returned by the `GROUP BY` query.
+    Groups differing only by an empty value or NULL merge into "BRAK", as in the Python path.
+    """
+    result = {}
+    for row in rows:
+        group = tuple(group_value(value) for value in row[:group_size])
+        _add(result, group, int(row[group_size]), [_sum_value(value) for value in row[group_size + 1:]])
+    return result
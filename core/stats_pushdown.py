@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+"""
+Agregacje statystyki (liczba obiektów i sumy pól w grupach) wykonywane w bazie danych warstwy.
+
+Dla warstw GeoPackage i PostGIS zapytanie `GROUP BY` z predykatem przestrzennym względem
+geometrii zakresu wykonywane jest przez połączenie dostawcy danych. Dla pozostałych źródeł
+(shapefile, warstwy tymczasowe), warstw z niezapisanymi edycjami lub gdy zapytanie się nie
+powiedzie, ta sama agregacja (`stats_aggregation`) jest liczona w Pythonie na obiektach w zakresie.
+"""
+
+from collections import namedtuple
+
+from qgis.core import QgsProviderRegistry, QgsDataSourceUri
+
+from .stats_aggregation import group_by_sql, merge_group_rows, quote_identifier
+
+# Nazwy w cudzysłowach; `spatial_index` to (tabela R-tree, kolumna klucza) tabeli GeoPackage lub None
+DatabaseSource = namedtuple("DatabaseSource", ["connection", "table", "geometry_column", "dialect", "spatial_index"])
+
+
+def _quote_literal(value):
+    return "'" + value.replace("'", "''") + "'"
+
+
+def _is_gpkg(provider):
+    return provider.name() == "ogr" and provider.storageType() == "GPKG"
+
+
+def can_push_down(layer):
+    """
+    Whether aggregations of the layer run in its database: a GeoPackage table or a PostGIS table
+    without a SQL query in its source, with no unsaved edits (the database holds only saved features).
+    """
+    if layer is None or (layer.isEditable() and layer.isModified()):
+        return False
+    provider = layer.dataProvider()
+    if _is_gpkg(provider):
+        return True
+    if provider.name() == "postgres":
+        uri = QgsDataSourceUri(layer.source())
+        return bool(uri.geometryColumn()) and not uri.sql()
+    return False
+
+
+def _database_source(layer):
+    """Returns DatabaseSource of a layer accepted by `can_push_down`, or None if its table cannot be resolved."""
+    provider = layer.dataProvider()
+    registry = QgsProviderRegistry.instance()
+    if _is_gpkg(provider):
+        parts = registry.decodeUri("ogr", layer.source())
+        table_name = parts.get("layerName")
+        if not table_name:
+            return None
+        connection = registry.providerMetadata("ogr").createConnection(parts["path"], {})
+        rows = connection.executeSql(
+            f"SELECT column_name FROM gpkg_geometry_columns WHERE table_name = {_quote_literal(table_name)}"
+        )
+        if not rows:
+            return None
+        geometry_name = rows[0][0]
+        return DatabaseSource(
+            connection, quote_identifier(table_name), quote_identifier(geometry_name), "gpkg",
+            _gpkg_spatial_index(connection, table_name, geometry_name),
+        )
+    uri = QgsDataSourceUri(layer.source())
+    table = f"{quote_identifier(uri.schema())}.{quote_identifier(uri.table())}" if uri.schema() else quote_identifier(uri.table())
+    connection = registry.providerMetadata("postgres").createConnection(layer.source(), {})
+    return DatabaseSource(connection, table, quote_identifier(uri.geometryColumn()), "postgres", None)
+
+
+def _gpkg_spatial_index(connection, table_name, geometry_name):
+    """Returns (R-tree table, primary key column) of a GeoPackage table with a spatial index, otherwise None."""
+    rtree_name = f"rtree_{table_name}_{geometry_name}"
+    if not connection.executeSql(f"SELECT name FROM sqlite_master WHERE type = 'table' AND name = {_quote_literal(rtree_name)}"):
+        return None
+    rows = connection.executeSql(f"SELECT name FROM pragma_table_info({_quote_literal(table_name)}) WHERE pk = 1")
+    if not rows:
+        return None
+    return quote_identifier(rtree_name), quote_identifier(rows[0][0])
+
+
+def aggregation_sql(layer, scope_geom, aggregation, source):
+    table, geometry_column, dialect = source.table, source.geometry_column, source.dialect
+
+    # Wierzchołek końcowy ostatniej części - jak w ścieżce Pythona (LineString i MultiLineString)
+    target = geometry_column
+    if aggregation.end_point:
+        target = f"ST_EndPoint(ST_GeometryN({geometry_column}, ST_NumGeometries({geometry_column})))"
+    wkt = _quote_literal(scope_geom.asWkt())
+    if dialect == "postgres":
+        scope = f"ST_GeomFromText({wkt}, {layer.crs().postgisSrid()})"
+        predicate = f"{geometry_column} && {scope} AND ST_Intersects({target}, {scope})"
+    else:
+        scope = f"SetSRID(ST_GeomFromText({wkt}), ST_SRID({geometry_column}))"
+        predicate = f"ST_Intersects({target}, {scope}) = 1"
+        if source.spatial_index:
+            # Wstępny wybór po R-tree: bez niego SpatiaLite sprawdza predykat dla każdego wiersza tabeli
+            rtree, key_column = source.spatial_index
+            bbox = scope_geom.boundingBox()
+            predicate = (
+                f"{key_column} IN (SELECT id FROM {rtree} WHERE maxx >= {bbox.xMinimum()!r} AND minx <= {bbox.xMaximum()!r}"
+                f" AND maxy >= {bbox.yMinimum()!r} AND miny <= {bbox.yMaximum()!r}) AND {predicate}"
+            )
+    if layer.subsetString():
+        predicate += f" AND ({layer.subsetString()})"
+
+    return group_by_sql(table, layer.fields().names(), aggregation, predicate)
+
+
+def aggregate_in_database(layer, scope_geom, aggregation):
+    """
+    Database path. Returns the aggregation and the SQL used, or (None, None) if the layer is not
+    a GeoPackage/PostGIS table or has unsaved edits (the database holds only saved features).
+    Errors of the query are raised to the caller.
+    """
+    if not can_push_down(layer):
+        return None, None
+    source = _database_source(layer)
+    if source is None:
+        return None, None
+    sql = aggregation_sql(layer, scope_geom, aggregation, source)
+    return merge_group_rows(source.connection.executeSql(sql), len(aggregation.group_fields)), sql
@@ -0,0 +1,383 @@
+# -*- coding: utf-8 -*-
+"""
+Sprawdzanie styczności wierzchołków na czystych współrzędnych.
+
+Moduł celowo nie importuje qgis ani Qt, aby mógł być wczytany w procesach
+roboczych puli (`multiprocessing`, tryb 'spawn'). Geometrie trafiają tu jako
+WKB w układzie projektu, a zbiory punktów jako wspólny, tylko do odczytu indeks
+zapisany w pliku mapowanym do pamięci.
+"""
+
+import os
+import sys
+import math
+import mmap
+import struct
+import tempfile
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+
+PRECISION = 3
+ON_SEGMENT_TOLERANCE = 10 ** -3
+DOZIEMNY_TYPES = ["doziemny", "abonencki doziemny", "TOK ziemny"]
+GRUPA_ABONENCKA = ["abonencki napowietrzny", "abonencki doziemny", "abonencki planowany"]
+
+# Poniżej tej liczby obiektów koszt uruchomienia procesów przewyższa zysk
+POOL_MIN_FEATURES = 2000
+MAX_LINEAR_RINGS = 64
+
+_HEADER = struct.Struct("<qddddd")
+
+
+# --- WKB ---
+
+def wkb_vertices(data):
+    """Returns (is_point, [(x, y), ...]) with the vertices of all parts of a Point/LineString/Multi* WKB."""
+    vertices = []
+    _, is_point = _read_wkb(data, 0, vertices)
+    return is_point, vertices
+
+
+def _read_wkb(data, offset, vertices):
+    endian = "<" if data[offset] == 1 else ">"
+    (wkb_type,) = struct.unpack_from(endian + "I", data, offset + 1)
+    offset += 5
+
+    # Flagi EWKB (Z/M/SRID) oraz kody ISO (1000/2000/3000)
+    has_z = bool(wkb_type & 0x80000000)
+    has_m = bool(wkb_type & 0x40000000)
+    if wkb_type & 0x20000000:
+        offset += 4
+    wkb_type &= 0x0FFFFFFF
+    base_type, dim_code = wkb_type % 1000, wkb_type // 1000
+    has_z = has_z or dim_code in (1, 3)
+    has_m = has_m or dim_code in (2, 3)
+    dims = 2 + has_z + has_m
+
+    if base_type == 1:
+        x, y = struct.unpack_from(endian + "dd", data, offset)
+        if not (math.isnan(x) and math.isnan(y)):
+            vertices.append((x, y))
+        return offset + 8 * dims, True
+    if base_type == 2:
+        (count,) = struct.unpack_from(endian + "I", data, offset)
+        offset += 4
+        coords = struct.unpack_from(endian + "d" * (count * dims), data, offset)
+        vertices.extend(zip(coords[0::dims], coords[1::dims]))
+        return offset + 8 * dims * count, False
+    if base_type in (4, 5, 7):
+        (count,) = struct.unpack_from(endian + "I", data, offset)
+        offset += 4
+        is_point = base_type == 4
+        for _ in range(count):
+            offset, part_is_point = _read_wkb(data, offset, vertices)
+            is_point = is_point and part_is_point
+        return offset, is_point
+    raise ValueError(f"Nieobsługiwany typ geometrii WKB: {wkb_type}")
+
+
+# --- Indeks punktów ---
+
+def _cell_key(cx, cy):
+    return (cx << 32) | (cy & 0xFFFFFFFF)
+
+
+def build_point_index_blob(points, cell_size):
+    """Serializes a set of rounded (x, y) tuples into a grid index sorted by cell key."""
+    cell_size = float(cell_size)
+    entries = sorted(
+        (_cell_key(math.floor(x / cell_size), math.floor(y / cell_size)), x, y) for x, y in points
+    )
+    keys, xs, ys = array("q"), array("d"), array("d")
+    for key, x, y in entries:
+        keys.append(key)
+        xs.append(x)
+        ys.append(y)
+    if entries:
+        extent = (min(xs), min(ys), max(xs), max(ys))
+    else:
+        extent = (0.0, 0.0, 0.0, 0.0)
+    header = _HEADER.pack(len(entries), cell_size, *extent)
+    return header + keys.tobytes() + xs.tobytes() + ys.tobytes()
+
+
+class PointIndex:
+    """Read-only grid index over a blob from `build_point_index_blob` (bytes or a memory-mapped view)."""
+
+    def __init__(self, buffer, offset=0):
+        view = memoryview(buffer)
+        count, self.cell_size, *self.extent = _HEADER.unpack_from(view, offset)
+        start = offset + _HEADER.size
+        size = count * 8
+        self.keys = view[start:start + size].cast("q")
+        self.xs = view[start + size:start + 2 * size].cast("d")
+        self.ys = view[start + 2 * size:start + 3 * size].cast("d")
+        self.count = count
+        self.nbytes = _HEADER.size + 3 * size
+
+    def __len__(self):
+        return self.count
+
+    def _cell_range(self, cx, cy):
+        key = _cell_key(cx, cy)
+        return bisect_left(self.keys, key), bisect_right(self.keys, key)
+
+    def contains(self, x, y):
+        rx, ry = round(x, PRECISION), round(y, PRECISION)
+        lo, hi = self._cell_range(math.floor(rx / self.cell_size), math.floor(ry / self.cell_size))
+        for i in range(lo, hi):
+            if self.xs[i] == rx and self.ys[i] == ry:
+                return True
+        return False
+
+    def nearest(self, x, y, max_distance=None):
+        """Returns (x, y, distance) of the nearest point, or None if none lies within `max_distance`."""
+        if not self.count:
+            return None
+        cell = self.cell_size
+        cx, cy = math.floor(x / cell), math.floor(y / cell)
+        if max_distance is not None:
+            max_ring = int(math.ceil(max_distance / cell))
+        else:
+            minx, miny, maxx, maxy = self.extent
+            max_ring = int(max(abs(cx - math.floor(minx / cell)), abs(cx - math.floor(maxx / cell)),
+                               abs(cy - math.floor(miny / cell)), abs(cy - math.floor(maxy / cell))))
+        if max_ring > MAX_LINEAR_RINGS:
+            best = self._nearest_linear(x, y)
+        else:
+            best = self._nearest_rings(x, y, cx, cy, max_ring)
+
+        if best is None:
+            return None
+        best_d2, px, py = best
+        distance = math.sqrt(best_d2)
+        if max_distance is not None and distance > max_distance:
+            return None
+        return px, py, distance
+
+    def _nearest_rings(self, x, y, cx, cy, max_ring):
+        best = None
+        for ring in range(max_ring + 1):
+            for gx, gy in _ring_cells(cx, cy, ring):
+                lo, hi = self._cell_range(gx, gy)
+                for i in range(lo, hi):
+                    px, py = self.xs[i], self.ys[i]
+                    d2 = (px - x) ** 2 + (py - y) ** 2
+                    if best is None or d2 < best[0]:
+                        best = (d2, px, py)
+            # Każdy punkt z dalszych pierścieni jest oddalony o co najmniej ring * cell_size
+            if best is not None and best[0] <= (ring * self.cell_size) ** 2:
+                break
+        return best
+
+    def _nearest_linear(self, x, y):
+        best = None
+        for px, py in zip(self.xs, self.ys):
+            d2 = (px - x) ** 2 + (py - y) ** 2
+            if best is None or d2 < best[0]:
+                best = (d2, px, py)
+        return best
+
+
+def _ring_cells(cx, cy, ring):
+    if ring == 0:
+        yield cx, cy
+        return
+    for gx in range(cx - ring, cx + ring + 1):
+        yield gx, cy - ring
+        yield gx, cy + ring
+    for gy in range(cy - ring + 1, cy + ring):
+        yield cx - ring, gy
+        yield cx + ring, gy
+
+
+def build_indexes(point_sets, cell_size):
+    """Builds in-process PointIndex objects for a {name: set of (x, y)} mapping."""
+    return {name: PointIndex(build_point_index_blob(points, cell_size)) for name, points in point_sets.items()}
+
+
+# --- Sprawdzanie obiektu ---
+
+def check_feature(record, ctx, indexes, segment_lookup=None):
+    """
+    Checks the vertices of one feature. `record` is (fid, wkb, group_name).
+    Returns {'fid', 'coords', 'is_point', 'stats'}; `coords` holds the fixed vertices or None.
+    If segment snapping is enabled but no `segment_lookup` is available (process pool),
+    features that need it are returned as {'fid', 'deferred': True}.
+    """
+    fid, wkb, group_name = record
+    check_type = ctx['check_type']
+    auto_fix = ctx['auto_fix']
+    search_distance = ctx['max_distance'] if ctx['limit_distance'] else None
+
+    stats = defaultdict(int)
+    stats['processed_objects'] = 1
+    result = {'fid': fid, 'coords': None, 'is_point': False, 'stats': stats}
+
+    try:
+        is_point, vertices = wkb_vertices(wkb) if wkb else (False, [])
+    except (ValueError, struct.error):
+        is_point, vertices = False, []
+    result['is_point'] = is_point
+    if not vertices:
+        stats['skipped_other'] = 1
+        return result
+
+    stats['total_vertices'] = len(vertices)
+    last = len(vertices) - 1
+
+    indices = range(len(vertices))
+    if check_type in ['kable', 'trakty'] and group_name in DOZIEMNY_TYPES:
+        indices = [0, last] if last > 0 else [0]
+
+    infra, pa, pe = indexes['infra'], indexes['pa'], indexes['pe']
+    abonencki = check_type == 'kable' and group_name in GRUPA_ABONENCKA
+    if abonencki and auto_fix:
+        if pa.contains(*vertices[0]) and pe.contains(*vertices[-1]):
+            vertices.reverse()
+
+    for i in indices:
+        x, y = vertices[i]
+        target = infra
+        if abonencki:
+            if i == 0: target = pe
+            elif i == last: target = pa
+        elif check_type == 'pe':
+            target = indexes['infra_pa']
+
+        if target.contains(x, y):
+            if check_type == 'pe' and pa.contains(x, y):
+                stats['coincident_pa'] += 1
+            else:
+                stats['coincident'] += 1
+            continue
+
+        # Dociąganie do segmentów dotyczy tylko wierzchołków, które nie muszą trafić w PE/PA
+        use_segments = ctx['segments'] and target is infra
+        if use_segments and segment_lookup is None:
+            return {'fid': fid, 'deferred': True}
+
+        on_segment = segment_lookup(fid, x, y, ON_SEGMENT_TOLERANCE) if use_segments else None
+        if on_segment:
+            stats['coincident_segment'] += 1
+            stats.setdefault('segment_hits', []).append(on_segment[3])
+            continue
+
+        stats['non_coincident'] += 1
+        stats.setdefault('non_coincident_indices', []).append(i)
+        if abonencki:
+            if i == 0: stats.setdefault('missing_endpoints', []).append("PE")
+            if i == last: stats.setdefault('missing_endpoints', []).append("PA")
+
+        fix_distance = None
+        if auto_fix:
+            nearest = target.nearest(x, y, search_distance)
+            segment_hit = None
+            if use_segments and (nearest is None or search_distance is None):
+                segment_hit = segment_lookup(fid, x, y, search_distance)
+                # Bez limitu zasięgu wierzchołek infrastruktury ma pierwszeństwo tylko, jeśli jest bliżej niż segment
+                if nearest and segment_hit and nearest[2] <= segment_hit[2]:
+                    segment_hit = None
+                elif segment_hit:
+                    nearest = None
+            if nearest:
+                vertices[i] = (nearest[0], nearest[1])
+                fix_distance = nearest[2]
+                stats['fixed'] += 1
+                if check_type == 'pe' and pa.contains(nearest[0], nearest[1]):
+                    stats['fixed_pa'] += 1
+                else:
+                    stats['fixed_infra'] += 1
+            elif segment_hit:
+                vertices[i] = (segment_hit[0], segment_hit[1])
+                fix_distance = segment_hit[2]
+                stats['fixed'] += 1
+                stats['fixed_segment'] += 1
+                stats.setdefault('segment_hits', []).append(segment_hit[3])
+            else:
+                stats['skipped_fix'] += 1
+        stats.setdefault('findings', []).append((i, x, y, fix_distance))
+
+    if stats['fixed']:
+        result['coords'] = vertices
+    return result
+
+
+def check_records(records, ctx, indexes, segment_lookup=None):
+    return [check_feature(record, ctx, indexes, segment_lookup) for record in records]
+
+
+# --- Pula procesów ---
+
+_worker_state = {}
+
+
+def _init_worker(path, offsets, ctx):
+    with open(path, 'rb') as f:
+        shared = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    _worker_state['mmap'] = shared
+    _worker_state['indexes'] = {name: PointIndex(shared, offset) for name, offset in offsets.items()}
+    _worker_state['ctx'] = ctx
+
+
+def _check_chunk(records):
+    return check_records(records, _worker_state['ctx'], _worker_state['indexes'])
+
+
+def python_executable():
+    """Returns the Python interpreter for worker processes (QGIS itself is not one), or None."""
+    executable = sys.executable or ""
+    if os.path.basename(executable).lower().startswith("python"):
+        return executable
+    names = ["pythonw.exe", "python.exe"] if os.name == "nt" else ["python3", "python"]
+    for directory in [sys.exec_prefix, os.path.join(sys.exec_prefix, "bin")]:
+        for name in names:
+            candidate = os.path.join(directory, name)
+            if os.path.isfile(candidate):
+                return candidate
+    return None
+
+
+def write_shared_indexes(point_sets, cell_size):
+    """Writes all point indexes to one temporary file; returns (path, {name: offset})."""
+    offsets = {}
+    with tempfile.NamedTemporaryFile(prefix="fa_stycznosc_", suffix=".bin", delete=False) as f:
+        for name, points in point_sets.items():
+            offsets[name] = f.tell()
+            f.write(build_point_index_blob(points, cell_size))
+        path = f.name
+    return path, offsets
+
+
+def check_records_parallel(records, ctx, point_sets, cell_size, max_workers=None):
+    """
+    Checks records in a process pool sharing one memory-mapped point index.
+    Raises OSError/RuntimeError if the pool cannot be started; callers fall back to `check_records`.
+    """
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+
+    executable = python_executable()
+    if executable is None:
+        raise RuntimeError("Nie znaleziono interpretera Python dla procesów roboczych.")
+
+    max_workers = max_workers or os.cpu_count() or 1
+    chunk_size = max(200, int(math.ceil(len(records) / (max_workers * 4))))
+    chunks = [records[i:i + chunk_size] for i in range(0, len(records), chunk_size)]
+
+    mp_context = multiprocessing.get_context("spawn")
+    mp_context.set_executable(executable)
+    path, offsets = write_shared_indexes(point_sets, cell_size)
+    try:
+        with ProcessPoolExecutor(max_workers=max_workers, mp_context=mp_context,
+                                 initializer=_init_worker, initargs=(path, offsets, ctx)) as pool:
+            results = []
+            for chunk_results in pool.map(_check_chunk, chunks):
+                results.extend(chunk_results)
+        return results
+    finally:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
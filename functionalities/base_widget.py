@@ -1,15 +1,20 @@
 import datetime
-from qgis.PyQt.QtWidgets import QWidget, QTextEdit, QVBoxLayout, QApplication
+from qgis.PyQt.QtWidgets import QWidget, QTextEdit, QTextBrowser, QVBoxLayout, QApplication
 
 class FormattedOutputWidget(QWidget):
-    def __init__(self, parent=None):
+    def __init__(self, parent=None, links=False):
         super().__init__(parent)
         self.is_first_log = True
 
         # --- UI Setup ---
         layout = QVBoxLayout(self)
         layout.setContentsMargins(0, 0, 0, 0)
-        self.output_console = QTextEdit()
+        if links:
+            # Linki nie są otwierane - kliknięcie trafia do sygnału output_console.anchorClicked
+            self.output_console = QTextBrowser()
+            self.output_console.setOpenLinks(False)
+        else:
+            self.output_console = QTextEdit()
         self.output_console.setReadOnly(True)
         layout.addWidget(self.output_console)
 
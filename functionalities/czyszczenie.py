@@ -1,29 +1,44 @@
 import os
 import json
+import math
+import bisect
 from collections import defaultdict
 from io import StringIO
 
 from qgis.PyQt import uic
-from qgis.PyQt.QtCore import Qt
+from qgis.PyQt.QtCore import Qt, QVariant
 from qgis.PyQt.QtWidgets import (
     QWidget, QVBoxLayout, QMessageBox, QSplitter, QGroupBox, QHBoxLayout, 
     QLabel, QComboBox, QPushButton, QRadioButton, QSizePolicy, QSpacerItem, 
-    QTabWidget, QTableWidget, QTableWidgetItem, QHeaderView, QCheckBox
+    QTabWidget, QTableView, QHeaderView, QCheckBox, QDoubleSpinBox, QApplication,
+    QListWidget, QListWidgetItem, QProgressDialog
 )
 from qgis.core import (
     QgsProject,
     QgsVectorLayer,
     QgsFeatureRequest,
-    QgsSpatialIndex,
     QgsWkbTypes,
     QgsGeometry,
     QgsPoint,
-    QgsPointXY,
-    QgsCoordinateTransform
+    QgsRectangle,
+    QgsCoordinateTransform,
+    QgsVectorDataProvider,
+    QgsProviderRegistry,
+    QgsDataSourceUri,
+    NULL
 )
 
 from ..core.logger import logger
+from ..core.geometry_hash import geometry_key, normalized_geometry
+from ..core import cleanup_rules, cleanup_baseline, layer_changes
 from .base_widget import FormattedOutputWidget
+from .results_model import FeatureResultsModel, setup_results_view
+
+DUPLICATE_PRECISION = 8
+# Liczba obiektów usuwanych w jednej transakcji
+DELETE_CHUNK_SIZE = 1000
+# Grupy warstw z lista_grup_warstw.json, między którymi obiekty są często kopiowane
+CROSS_LAYER_GROUPS = [("CABLE_LAYERS", "Kable"), ("TRAKT_LAYERS", "Trakty")]
 
 # --- Helper Functions ---
 
@@ -35,54 +50,123 @@ def _to_excel_col(n):
         name = chr(65 + remainder) + name
     return name
 
-def _get_canonical_geometry(geom):
-    """Returns a canonical representation of a LineString or single-part MultiLineString geometry to make it direction-insensitive."""
-    
-    wkb_type = QgsWkbTypes.flatType(geom.wkbType())
-
-    if wkb_type == QgsWkbTypes.LineString:
-        points = geom.asPolyline()
-        if points and len(points) > 1:
-            if points[0].x() > points[-1].x() or (points[0].x() == points[-1].x() and points[0].y() > points[-1].y()):
-                return QgsGeometry.fromPolylineXY(points[::-1])
-        return geom
-
-    elif wkb_type == QgsWkbTypes.MultiLineString:
-        lines = geom.asMultiPolyline()
-        # Handle only single-part MultiLineStrings
-        if len(lines) == 1:
-            points = lines[0]
-            if points and len(points) > 1:
-                if points[0].x() > points[-1].x() or (points[0].x() == points[-1].x() and points[0].y() > points[-1].y()):
-                    return QgsGeometry.fromMultiPolylineXY([points[::-1]])
-        return geom
-
+def _is_in_scope(geom, scope_geom):
+    """Feature is in the zakres if it intersects it; lines additionally need their last vertex inside."""
+    if not geom or not scope_geom or not geom.intersects(scope_geom): return False
+    wkb_type = geom.wkbType()
+    if wkb_type in [QgsWkbTypes.LineString, QgsWkbTypes.MultiLineString]:
+        last_vertex_point = None
+        try:
+            if wkb_type == QgsWkbTypes.LineString:
+                polyline = geom.asPolyline()
+                if polyline:
+                    last_vertex_point = polyline[-1]
+            elif wkb_type == QgsWkbTypes.MultiLineString:
+                multi_polyline = geom.asMultiPolyline()
+                if multi_polyline and multi_polyline[-1]:
+                    last_vertex_point = multi_polyline[-1][-1]
+            
+            if last_vertex_point and not QgsGeometry.fromPointXY(last_vertex_point).intersects(scope_geom):
+                return False
+        except IndexError:
+            return False
+    return True
+
+def _delete_in_chunks(parent, layer, fids, output_widget):
+    """
+    Deletes features in chunks of DELETE_CHUNK_SIZE, each committed separately, with a cancellable progress dialog.
+    Returns (deleted fids, True if all were deleted).
+    """
+    progress = QProgressDialog(f"Usuwanie obiektów z warstwy '{layer.name()}'...", "Anuluj", 0, len(fids), parent)
+    progress.setWindowModality(Qt.WindowModal)
+    progress.setMinimumDuration(500)
+
+    deleted = []
+    try:
+        for start in range(0, len(fids), DELETE_CHUNK_SIZE):
+            if progress.wasCanceled():
+                output_widget.log_warning(f"Usuwanie przerwane przez użytkownika. Usunięto {len(deleted)} z {len(fids)} obiektów z warstwy '{layer.name()}'.")
+                return deleted, False
+            chunk = fids[start:start + DELETE_CHUNK_SIZE]
+            layer.startEditing()
+            if not layer.deleteFeatures(chunk) or not layer.commitChanges():
+                output_widget.log_error(f"Błąd usuwania obiektów z warstwy '{layer.name()}': {'; '.join(layer.commitErrors())}")
+                layer.rollBack()
+                return deleted, False
+            deleted.extend(chunk)
+            progress.setValue(len(deleted))
+    finally:
+        progress.close()
+    return deleted, True
+
+def _quote_identifier(name):
+    return '"' + name.replace('"', '""') + '"'
+
+def _format_value(value):
+    return "NULL" if value is None else str(value)
+
+def _repair_geometry(geom, layer_wkb_type, grid_size=None):
+    """
+    Repairs a geometry with makeValid (optionally after snapping it to a grid of `grid_size`).
+    Returns (geometry or None, status); the geometry has the type (single/multi, Z/M) required by the layer.
+    """
+    if not geom or geom.isNull() or geom.isEmpty():
+        return None, "Brak geometrii do naprawy"
+
+    repaired = QgsGeometry(geom)
+    if grid_size:
+        snapped = repaired.snappedToGrid(grid_size, grid_size)
+        if not snapped.isNull():
+            repaired = snapped
+    if not repaired.isGeosValid():
+        repaired = repaired.makeValid()
+
+    repaired = _coerce_to_layer_type(repaired, layer_wkb_type)
+    if repaired is None or repaired.isNull() or repaired.isEmpty():
+        return None, "Wynik naprawy nie jest geometrią typu wymaganego przez warstwę"
+    if not repaired.isGeosValid():
+        return None, "Geometria po naprawie nadal jest niepoprawna"
+    if repaired.type() == QgsWkbTypes.LineGeometry and repaired.length() == 0:
+        return None, "Geometria po naprawie ma zerową długość"
+    if repaired.type() == QgsWkbTypes.PolygonGeometry and repaired.area() == 0:
+        return None, "Geometria po naprawie ma zerową powierzchnię"
+    return repaired, "Naprawiono"
+
+def _coerce_to_layer_type(geom, layer_wkb_type):
+    if not geom or geom.isNull():
+        return None
+    target_type = QgsWkbTypes.geometryType(layer_wkb_type)
+
+    # makeValid może zwrócić kolekcję (np. linia + punkt) - zostają tylko części typu warstwy
+    if QgsWkbTypes.flatType(geom.wkbType()) == QgsWkbTypes.GeometryCollection:
+        parts = [part for part in geom.asGeometryCollection() if part.type() == target_type]
+        if not parts:
+            return None
+        geom = QgsGeometry.collectGeometry(parts)
+    if geom.type() != target_type:
+        return None
+
+    if QgsWkbTypes.isMultiType(layer_wkb_type):
+        if not geom.isMultipart():
+            geom.convertToMultiType()
+    elif geom.isMultipart():
+        # convertToSingleType zachowuje tylko pierwszą część, więc wynik wieloczęściowy jest odrzucany
+        if geom.constGet().numGeometries() != 1 or not geom.convertToSingleType():
+            return None
+
+    if QgsWkbTypes.hasZ(layer_wkb_type) and not geom.constGet().is3D():
+        geom.get().addZValue(0)
+    if QgsWkbTypes.hasM(layer_wkb_type) and not geom.constGet().isMeasure():
+        geom.get().addMValue(0)
     return geom
 
-def round_geometry_coords(geom, precision=8):
-    if geom.isNull() or geom.isEmpty():
-        return geom
-
-    wkb_type = QgsWkbTypes.flatType(geom.wkbType())
-
-    if wkb_type == QgsWkbTypes.Point:
-        p = geom.asPoint()
-        return QgsGeometry.fromPointXY(QgsPointXY(round(p.x(), precision), round(p.y(), precision)))
-
-    if wkb_type == QgsWkbTypes.LineString:
-        line = geom.asPolyline()
-        new_line = [QgsPointXY(round(p.x(), precision), round(p.y(), precision)) for p in line]
-        return QgsGeometry.fromPolylineXY(new_line)
-
-    if wkb_type == QgsWkbTypes.MultiLineString:
-        lines = geom.asMultiPolyline()
-        new_lines = []
-        for line in lines:
-            new_line = [QgsPointXY(round(p.x(), precision), round(p.y(), precision)) for p in line]
-            new_lines.append(new_line)
-        return QgsGeometry.fromMultiPolylineXY(new_lines)
-    
-    return geom
+def _measure_change(old_geom, new_geom):
+    """Length change for lines, area change for polygons, None for points."""
+    if new_geom.type() == QgsWkbTypes.LineGeometry:
+        return new_geom.length() - (old_geom.length() if old_geom and not old_geom.isNull() else 0)
+    if new_geom.type() == QgsWkbTypes.PolygonGeometry:
+        return new_geom.area() - (old_geom.area() if old_geom and not old_geom.isNull() else 0)
+    return None
 
 # --- Main Widget Container ---
 
@@ -99,9 +183,13 @@ class CzyszczenieWidget(QWidget):
 
         self.duplicates_widget = DuplicatesWidget(iface, self)
         self.invalid_geo_widget = InvalidGeometriesWidget(iface, self)
+        self.attribute_duplicates_widget = AttributeDuplicatesWidget(iface, self)
+        self.pipeline_widget = CleanupPipelineWidget(iface, self)
 
         self.tab_widget.addTab(self.duplicates_widget, "Usuń duble")
         self.tab_widget.addTab(self.invalid_geo_widget, "Usuń błędne geometrie")
+        self.tab_widget.addTab(self.attribute_duplicates_widget, "Duble atrybutów")
+        self.tab_widget.addTab(self.pipeline_widget, "Przegląd warstwy")
 
     def get_active_tab_widget(self):
         return self.tab_widget.currentWidget()
@@ -122,16 +210,104 @@ class CzyszczenieWidget(QWidget):
         if active_widget and hasattr(active_widget, 'refresh_data'):
             active_widget.refresh_data()
 
+# --- Shared Tab Helpers ---
+
+class _CleanupTabMixin:
+    """Zoom and combobox helpers shared by the tabs (results_table/results_model/results_proxy, zakres and layer comboboxes)."""
+
+    def _on_zoom_to_feature_clicked(self):
+        selected_rows = self.results_table.selectionModel().selectedRows()
+        if len(selected_rows) != 1:
+            self.output_widget.log_info("Proszę zaznaczyć dokładnie jeden obiekt na liście.")
+            return
+
+        layer, feature_id = self.results_model.row_member(self.results_proxy.source_rows(selected_rows)[0])
+        feature = layer.getFeature(feature_id)
+        if not feature.hasGeometry():
+            self.output_widget.log_error("Wybrany obiekt nie posiada geometrii, nie można go przybliżyć.")
+            return
+
+        geom = feature.geometry()
+        canvas = self.iface.mapCanvas()
+
+        canvas_crs = canvas.mapSettings().destinationCrs()
+        layer_crs = layer.crs()
+        if canvas_crs != layer_crs:
+            transform = QgsCoordinateTransform(layer_crs, canvas_crs, QgsProject.instance())
+            geom.transform(transform)
+
+        wkb_type = QgsWkbTypes.flatType(geom.wkbType())
+        if wkb_type == QgsWkbTypes.LineString or wkb_type == QgsWkbTypes.MultiLineString:
+            centroid = geom.interpolate(geom.length() / 2).asPoint()
+        else:
+            centroid = geom.centroid().asPoint()
+
+        canvas.setCenter(centroid)
+        canvas.zoomScale(250)
+        canvas.refresh()
+
+        self.output_widget.log_info(f"Przybliżono do obiektu o ID: {feature.id()} w warstwie '{layer.name()}'")
+
+    def _populate_zakres_combobox(self):
+        self.zakres_combo_box.clear()
+        zakres_layer_list = QgsProject.instance().mapLayersByName("zakres_zadania")
+        if not zakres_layer_list:
+            self.output_widget.log_error("Nie znaleziono warstwy 'zakres_zadania'.")
+            return
+
+        zakres_layer = zakres_layer_list[0]
+        if "nazwa" not in zakres_layer.fields().names():
+            self.output_widget.log_error("Warstwa 'zakres_zadania' nie posiada atrybutu 'nazwa'.")
+            return
+
+        try:
+            # Dodajemy tylko te zakresy, które mają nazwę
+            scopes = [(feature["nazwa"], feature.geometry()) for feature in zakres_layer.getFeatures() if feature["nazwa"]]
+        except Exception as e:
+            self.output_widget.log_error(f"Błąd podczas wczytywania zakresów: {e}")
+            return
+
+        scopes.sort(key=lambda x: x[0])
+        for name, geom in scopes:
+            self.zakres_combo_box.addItem(name, geom)
+
+    def _populate_layers_combobox(self):
+        self.layer_combobox.clear()
+
+        essential_layers_names = []
+        try:
+            json_path = os.path.join(os.path.dirname(__file__), '..', 'templates', 'lista_grup_warstw.json')
+            with open(json_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            essential_layers_names = data.get("PROJECT_ESSENTIAL_LAYERS", [])
+        except Exception as e:
+            self.output_widget.log_error(f"OSTRZEŻENIE: Nie udało się wczytać listy warstw podstawowych z pliku .json: {e}")
+
+        # Warstwy podstawowe alfabetycznie, a po zaznaczeniu "pokaż wszystkie" - pozostałe za separatorem
+        all_project_layers = [layer for layer in QgsProject.instance().mapLayers().values() if isinstance(layer, QgsVectorLayer)]
+        essential_project_layers = sorted((l for l in all_project_layers if l.name() in essential_layers_names), key=lambda l: l.name())
+        for layer in essential_project_layers:
+            self.layer_combobox.addItem(layer.name(), layer)
+
+        if self.show_all_layers_checkbox.isChecked():
+            other_project_layers = sorted((l for l in all_project_layers if l.name() not in essential_layers_names), key=lambda l: l.name())
+            if other_project_layers:
+                self.layer_combobox.insertSeparator(self.layer_combobox.count())
+                for layer in other_project_layers:
+                    self.layer_combobox.addItem(layer.name(), layer)
+
 # --- Duplicates Tab Widget ---
 
-class DuplicatesWidget(QWidget):
+class DuplicatesWidget(_CleanupTabMixin, QWidget):
     FUNCTIONALITY_NAME = "Czyszczenie / Usuń duble"
+    # Docelowa liczba obiektów w jednym kafelku przeszukiwania całej warstwy
+    SWEEP_TILE_FEATURES = 20000
 
     def __init__(self, iface, parent=None):
         super(DuplicatesWidget, self).__init__(parent)
         self.iface = iface
         self.logger = logger
-        self.feature_map = {}
+        self.result_group_count = 0
 
         self._setup_ui_dynamically()
         self._connect_signals()
@@ -153,6 +329,9 @@ class DuplicatesWidget(QWidget):
         self.refresh_button = QPushButton("Odśwież")
         scope_layout.addWidget(self.refresh_button)
         settings_layout.addLayout(scope_layout)
+        self.sweep_checkbox = QCheckBox("Przeszukaj całą warstwę, bez ograniczenia do zakresu (kafelkami, tylko identyczne geometrie)")
+        self.sweep_checkbox.setChecked(False)
+        settings_layout.addWidget(self.sweep_checkbox)
 
         layer_layout = QHBoxLayout()
         layer_layout.addWidget(QLabel("Wybierz warstwę do sprawdzenia:"))
@@ -164,6 +343,16 @@ class DuplicatesWidget(QWidget):
         layer_layout.addWidget(self.show_all_layers_checkbox)
         settings_layout.addLayout(layer_layout)
 
+        layer_group_layout = QHBoxLayout()
+        self.cross_layer_checkbox = QCheckBox("Szukaj duplikatów między warstwami z grupy:")
+        self.cross_layer_checkbox.setChecked(False)
+        layer_group_layout.addWidget(self.cross_layer_checkbox)
+        self.layer_group_combobox = QComboBox()
+        self.layer_group_combobox.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Fixed)
+        self.layer_group_combobox.setEnabled(False)
+        layer_group_layout.addWidget(self.layer_group_combobox)
+        settings_layout.addLayout(layer_group_layout)
+
         criteria_groupbox = QGroupBox("Uznaj za dubel, jeśli obiekty mają:")
         criteria_layout = QVBoxLayout(criteria_groupbox)
         self.radio_geom_only = QRadioButton("identyczną geometrię (bez względu na atrybuty)")
@@ -171,9 +360,23 @@ class DuplicatesWidget(QWidget):
         self.radio_geom_and_attributes = QRadioButton("identyczną geometrię ORAZ identyczne wartości atrybutów (z pominięciem pól 'id' i 'fid')")
         self.reversed_geom_checkbox = QCheckBox("Uznaj za dubel obiekty liniowe, nawet jeśli mają odwróconą kolejność wierzchołków (wolniejsze)")
         self.reversed_geom_checkbox.setChecked(False)
+        tolerance_layout = QHBoxLayout()
+        self.near_duplicates_checkbox = QCheckBox("Uznaj za dubel obiekty, których geometrie różnią się nie więcej niż o:")
+        self.near_duplicates_checkbox.setChecked(False)
+        self.tolerance_spinbox = QDoubleSpinBox()
+        self.tolerance_spinbox.setDecimals(3)
+        self.tolerance_spinbox.setRange(0.001, 10.0)
+        self.tolerance_spinbox.setSingleStep(0.01)
+        self.tolerance_spinbox.setValue(0.05)
+        self.tolerance_spinbox.setSuffix(" m")
+        self.tolerance_spinbox.setEnabled(False)
+        tolerance_layout.addWidget(self.near_duplicates_checkbox)
+        tolerance_layout.addWidget(self.tolerance_spinbox)
+        tolerance_layout.addStretch()
         criteria_layout.addWidget(self.radio_geom_only)
         criteria_layout.addWidget(self.radio_geom_and_attributes)
         criteria_layout.addWidget(self.reversed_geom_checkbox)
+        criteria_layout.addLayout(tolerance_layout)
         settings_layout.addWidget(criteria_groupbox)
 
         check_layout = QHBoxLayout()
@@ -184,8 +387,9 @@ class DuplicatesWidget(QWidget):
 
         self.results_groupbox = QGroupBox("Wyniki")
         results_layout = QVBoxLayout(self.results_groupbox)
-        self.results_table = QTableWidget()
-        self.results_table.setSortingEnabled(True)
+        self.results_table = QTableView()
+        self.results_model = FeatureResultsModel(self)
+        self.results_proxy = setup_results_view(self.results_table, self.results_model)
         results_layout.addWidget(self.results_table)
 
         results_actions_layout = QHBoxLayout()
@@ -219,19 +423,25 @@ class DuplicatesWidget(QWidget):
         self.delete_all_button.clicked.connect(self.run_delete_all_action)
         self.delete_selected_button.clicked.connect(self.run_delete_selected_action)
         self.zoom_to_feature_button.clicked.connect(self._on_zoom_to_feature_clicked)
-        self.results_table.itemSelectionChanged.connect(self._update_button_states)
+        self.results_table.selectionModel().selectionChanged.connect(self._update_button_states)
         self.layer_combobox.currentIndexChanged.connect(self._on_layer_changed)
         self.show_all_layers_checkbox.toggled.connect(self._populate_layers_combobox)
+        self.near_duplicates_checkbox.toggled.connect(self._update_mode_states)
+        self.sweep_checkbox.toggled.connect(self._update_mode_states)
+        self.cross_layer_checkbox.toggled.connect(self._update_mode_states)
 
     def refresh_data(self):
         self.output_widget.log_info("Odświeżanie list...")
+        cleanup_baseline.clear()
         self._populate_zakres_combobox()
         self._populate_layers_combobox()
+        self._populate_layer_groups_combobox()
         self.output_widget.log_info("Listy zostały zaktualizowane.")
 
     def _populate_initial_data(self):
         self._populate_zakres_combobox()
         self._populate_layers_combobox()
+        self._populate_layer_groups_combobox()
 
     def _setup_initial_state(self):
         self.delete_all_button.setEnabled(False)
@@ -243,14 +453,29 @@ class DuplicatesWidget(QWidget):
         self.delete_selected_button.setEnabled(selected_rows_count > 0)
         self.zoom_to_feature_button.setEnabled(selected_rows_count == 1)
 
+    def _update_mode_states(self):
+        cross_layer = self.cross_layer_checkbox.isChecked()
+        sweep = self.sweep_checkbox.isChecked() and not cross_layer
+        self.sweep_checkbox.setEnabled(not cross_layer)
+        self.layer_combobox.setEnabled(not cross_layer)
+        self.layer_group_combobox.setEnabled(cross_layer)
+        self.zakres_combo_box.setEnabled(not sweep)
+        self.near_duplicates_checkbox.setEnabled(not sweep and not cross_layer)
+        self.tolerance_spinbox.setEnabled(not sweep and not cross_layer and self.near_duplicates_checkbox.isChecked())
+
     def _on_layer_changed(self):
         self._setup_initial_state()
-        self.results_table.clearContents()
-        self.results_table.setRowCount(0)
-        self.feature_map.clear()
+        self.results_model.clear()
 
     def _is_valid_for_check(self):
-        if self.zakres_combo_box.count() == 0: self.output_widget.log_error("Brak dostępnych zakresów. Dodaj warstwę 'zakres_zadania'."); return False
+        cross_layer = self.cross_layer_checkbox.isChecked()
+        if self.zakres_combo_box.count() == 0 and (cross_layer or not self.sweep_checkbox.isChecked()): self.output_widget.log_error("Brak dostępnych zakresów. Dodaj warstwę 'zakres_zadania'."); return False
+        if cross_layer:
+            group_layers = self._get_group_layers()
+            if len(group_layers) < 2: self.output_widget.log_error("W projekcie brakuje co najmniej dwóch warstw z wybranej grupy."); return False
+            for layer in group_layers:
+                if layer.isEditable(): self.output_widget.log_error(f"Warstwa '{layer.name()}' jest w trybie edycji. Wyłącz tryb edycji, aby kontynuować."); return False
+            return True
         layer = self.layer_combobox.currentData()
         if not layer: self.output_widget.log_error("Nie wybrano warstwy do sprawdzenia."); return False
         if layer.isEditable(): self.output_widget.log_error(f"Warstwa '{layer.name()}' jest w trybie edycji. Wyłącz tryb edycji, aby kontynuować."); return False
@@ -259,61 +484,68 @@ class DuplicatesWidget(QWidget):
     def run_check_action(self):
         self.output_widget.clear_log()
         self._setup_initial_state()
-        self.results_table.setColumnCount(0); self.results_table.setRowCount(0)
-        self.feature_map.clear()
+        self.results_model.clear()
 
         if not self._is_valid_for_check(): return
 
+        cross_layer = self.cross_layer_checkbox.isChecked()
+        sweep = self.sweep_checkbox.isChecked() and not cross_layer
         self.output_widget.log_info("Rozpoczynam sprawdzanie duplikatów...")
-        self.output_widget.log_warning("UWAGA! Pamiętaj, że kabel i trakt w zakresie zadania jest zliczany, jeśli jego wierzchołek końcowy znajduje się wewnątrz zakresu. Dlatego upewnij się, że kierunek linii jest ustawiony prawidłowo.")
+        if not sweep: self.output_widget.log_warning("UWAGA! Pamiętaj, że kabel i trakt w zakresie zadania jest zliczany, jeśli jego wierzchołek końcowy znajduje się wewnątrz zakresu. Dlatego upewnij się, że kierunek linii jest ustawiony prawidłowo.")
 
         layer = self.layer_combobox.currentData()
         scope_geom = self.zakres_combo_box.currentData()
         compare_attributes = self.radio_geom_and_attributes.isChecked()
         check_reversed = self.reversed_geom_checkbox.isChecked()
+        near_duplicates = self.near_duplicates_checkbox.isChecked() and not sweep and not cross_layer
+        tolerance = self.tolerance_spinbox.value()
 
         try:
-            index = QgsSpatialIndex(layer.getFeatures())
-            intersecting_ids = index.intersects(scope_geom.boundingBox())
-            request = QgsFeatureRequest().setFilterFids(intersecting_ids)
-            features_in_scope = [f for f in layer.getFeatures(request) if self._is_in_scope(f.geometry(), scope_geom)]
-
-            total_searched = len(features_in_scope)
-            self.output_widget.log_info(f"Przeszukano {total_searched} obiektów w zakresie zadania.")
-
-            if not features_in_scope: self.output_widget.log_success("Nie znaleziono żadnych obiektów w podanym zakresie."); return
-
-            geometries = defaultdict(list)
-            for feature in features_in_scope:
-                geom = feature.geometry()
-                if geom and not geom.isEmpty() and geom.isGeosValid():
-                    rounded_geom = round_geometry_coords(geom)
-                    key_geom = _get_canonical_geometry(rounded_geom) if check_reversed else rounded_geom
-                    geometries[key_geom.asWkb()].append(feature)
-
-            duplicate_groups = []
+            if cross_layer:
+                group_layers = self._get_group_layers()
+                self.output_widget.log_info(f"Wyszukiwanie duplikatów między warstwami: {', '.join(l.name() for l in group_layers)}...")
+                batches = [self._find_cross_layer_duplicates(group_layers, scope_geom, check_reversed)]
+            elif sweep:
+                self.check_duplicates_button.setEnabled(False)
+                batches = self._sweep_exact_duplicates(layer, check_reversed)
+            elif near_duplicates:
+                self.output_widget.log_info(f"Wyszukiwanie obiektów różniących się o nie więcej niż {tolerance:.3f} m...")
+                batches = [self._find_near_duplicates(layer, scope_geom, tolerance, check_reversed)]
+            else:
+                batches = [self._find_exact_duplicates(layer, scope_geom, check_reversed)]
+
+            # Grupy są dopisywane do tabeli wyników na bieżąco (w trybie kafelkowym po każdym kafelku)
+            total_searched = 0
+            num_duplicates = 0
             geometrically_identical_but_different_attrs = 0
-
-            for feature_list in geometries.values():
-                if len(feature_list) > 1:
-                    if not compare_attributes:
-                        duplicate_groups.append(feature_list)
-                    else:
-                        attr_groups = self._group_by_attributes(feature_list)
-                        if len(attr_groups) > 1:
-                            max_group_size = max(len(group) for group in attr_groups)
-                            geometrically_identical_but_different_attrs += (len(feature_list) - max_group_size)
-                        for group in attr_groups:
-                            if len(group) > 1: duplicate_groups.append(group)
-            
-            if not duplicate_groups: 
+            for searched, feature_groups in batches:
+                total_searched += searched
+                if not cross_layer:
+                    feature_groups = [[(layer, feature) for feature in group] for group in feature_groups]
+                duplicate_groups, different_attrs = self._split_by_attributes(feature_groups, compare_attributes)
+                if cross_layer:
+                    duplicate_groups = [group for group in duplicate_groups if len({l.id() for l, _ in group}) > 1]
+                geometrically_identical_but_different_attrs += different_attrs
+                if duplicate_groups:
+                    self._append_results(duplicate_groups, cross_layer)
+                    num_duplicates += sum(len(group) - 1 for group in duplicate_groups)
+                if sweep:
+                    QApplication.processEvents()
+
+            if cross_layer:
+                self.output_widget.log_info(f"Przeszukano {total_searched} obiektów w zakresie zadania we wszystkich warstwach grupy.")
+            elif sweep:
+                self.output_widget.log_info(f"Przeszukano {total_searched} obiektów w warstwie '{layer.name()}'.")
+            else:
+                self.output_widget.log_info(f"Przeszukano {total_searched} obiektów w zakresie zadania.")
+
+            if not total_searched: self.output_widget.log_success("Nie znaleziono żadnych obiektów w podanym zakresie."); return
+
+            if not num_duplicates: 
                 self.output_widget.log_success("Nie znaleziono żadnych duplikatów.")
                 if compare_attributes and geometrically_identical_but_different_attrs > 0: self.output_widget.log_info(f"Znaleziono {geometrically_identical_but_different_attrs} obiektów o tej samej geometrii, ale innych atrybutach.")
                 return
 
-            self._display_results(duplicate_groups, layer)
-
-            num_duplicates = sum(len(group) - 1 for group in duplicate_groups)
             self.output_widget.log_success(f"Znaleziono obiektów zdublowanych: {num_duplicates}")
             if compare_attributes and geometrically_identical_but_different_attrs > 0: self.output_widget.log_info(f"Znaleziono obiektów o tej samej geometrii, ale innych atrybutach: {geometrically_identical_but_different_attrs}")
 
@@ -325,89 +557,210 @@ class DuplicatesWidget(QWidget):
         except Exception as e:
             self.output_widget.log_error(f"Wystąpił nieoczekiwany błąd: {e}")
             self.logger.log_dev(self.FUNCTIONALITY_NAME, 0, "ERROR", str(e))
-
-    def _display_results(self, duplicate_groups, layer):
-        self.results_table.clear()
-        self.feature_map.clear()
-        fields = layer.fields()
-        field_names = fields.names()
-
-        headers = ["Grupa", "Nr w grupie"] + field_names
-        self.results_table.setColumnCount(len(headers))
-        self.results_table.setHorizontalHeaderLabels(headers)
-
-        row = 0
-        for i, group in enumerate(duplicate_groups, 1):
-            for j, feature in enumerate(group, 1):
-                self.results_table.insertRow(row)
-                self.feature_map[row] = feature.id()
-
-                group_item = QTableWidgetItem(_to_excel_col(i)); group_item.setFlags(group_item.flags() & ~Qt.ItemIsEditable)
-                self.results_table.setItem(row, 0, group_item)
-
-                num_item = QTableWidgetItem(str(j)); num_item.setFlags(num_item.flags() & ~Qt.ItemIsEditable)
-                self.results_table.setItem(row, 1, num_item)
-
-                for k, field_name in enumerate(field_names):
-                    attr_val = str(feature[field_name] or "")
-                    attr_item = QTableWidgetItem(attr_val); attr_item.setFlags(attr_item.flags() & ~Qt.ItemIsEditable)
-                    self.results_table.setItem(row, 2 + k, attr_item)
-
-                row += 1
-        
-        self.results_table.resizeColumnsToContents()
-
-    def _on_zoom_to_feature_clicked(self):
-        selected_rows = self.results_table.selectionModel().selectedRows()
-        if len(selected_rows) != 1:
-            self.output_widget.log_info("Proszę zaznaczyć dokładnie jeden obiekt na liście.")
-            return
-
-        selected_row = selected_rows[0].row()
-        feature_id = self.feature_map.get(selected_row)
-
-        if feature_id is None:
-            self.output_widget.log_error("Nie można odnaleźć ID obiektu dla zaznaczonego wiersza.")
-            return
-
-        layer = self.layer_combobox.currentData()
-        if not layer:
-            return
-
-        feature = layer.getFeature(feature_id)
-        if not feature.hasGeometry():
-            self.output_widget.log_error("Wybrany obiekt nie posiada geometrii, nie można go przybliżyć.")
+        finally:
+            self.check_duplicates_button.setEnabled(True)
+
+    def _find_exact_duplicates(self, layer, scope_geom, check_reversed):
+        def duplicate_key(geom):
+            if geom and not geom.isEmpty() and geom.isGeosValid():
+                return geometry_key(geom.asWkb(), DUPLICATE_PRECISION, check_reversed)
+            return None
+
+        # Pierwszy przebieg: tylko 128-bitowe klucze geometrii i fid. Klucze z poprzednich
+        # sprawdzeń są przechowywane, więc liczone są tylko dla obiektów zmienionych od tego czasu.
+        key_column = f"duplicate_key:{int(check_reversed)}"
+        baseline = cleanup_baseline.baseline_for(layer)
+        members = baseline.collect(scope_geom, _is_in_scope, "in_scope", {key_column: duplicate_key})
+        self.logger.log_dev(self.FUNCTIONALITY_NAME, 0, "INFO", f"Baseline: {baseline.last_computed} features hashed, {len(members) - baseline.last_computed} reused.")
+
+        keys = baseline.values[key_column]
+        candidates = defaultdict(list)
+        for fid in members:
+            if keys.get(fid) is not None:
+                candidates[keys[fid]].append(fid)
+
+        return len(members), self._confirm_exact_duplicates(layer, candidates, check_reversed)
+
+    def _sweep_exact_duplicates(self, layer, check_reversed):
+        """Yields (searched, feature_groups) for consecutive tiles of the whole layer extent."""
+        # Nieaktualny zasięg warstwy pominąłby obiekty leżące poza nim
+        layer.updateExtents()
+        extent = layer.extent()
+        tiles_per_side = max(1, math.ceil(math.sqrt(max(layer.featureCount(), 0) / self.SWEEP_TILE_FEATURES)))
+        tile_width = extent.width() / tiles_per_side
+        tile_height = extent.height() / tiles_per_side
+        # Te same krawędzie wyznaczają prostokąty zapytań i kafelek właściciela obiektu
+        x_edges = [extent.xMinimum() + i * tile_width for i in range(tiles_per_side)] + [extent.xMaximum()]
+        y_edges = [extent.yMinimum() + i * tile_height for i in range(tiles_per_side)] + [extent.yMaximum()]
+        self.output_widget.log_info(f"Przeszukiwanie warstwy w {tiles_per_side * tiles_per_side} kafelkach...")
+
+        def owner_tile(bbox):
+            col = bisect.bisect_right(x_edges, bbox.xMinimum(), 0, tiles_per_side) - 1
+            row = bisect.bisect_right(y_edges, bbox.yMinimum(), 0, tiles_per_side) - 1
+            return max(col, 0), max(row, 0)
+
+        for row in range(tiles_per_side):
+            for col in range(tiles_per_side):
+                tile = QgsRectangle(x_edges[col], y_edges[row], x_edges[col + 1], y_edges[row + 1])
+                request = QgsFeatureRequest().setFilterRect(tile).setNoAttributes()
+
+                # Obiekt na granicy kafelków należy do kafelka z lewym dolnym narożnikiem jego bbox.
+                # Identyczne geometrie mają identyczne bbox, więc zawsze trafiają do tego samego kafelka.
+                searched = 0
+                candidates = defaultdict(list)
+                for feature in layer.getFeatures(request):
+                    geom = feature.geometry()
+                    if not geom or geom.isEmpty() or owner_tile(geom.boundingBox()) != (col, row):
+                        continue
+                    searched += 1
+                    if geom.isGeosValid():
+                        candidates[geometry_key(geom.asWkb(), DUPLICATE_PRECISION, check_reversed)].append(feature.id())
+                yield searched, self._confirm_exact_duplicates(layer, candidates, check_reversed)
+
+    def _confirm_exact_duplicates(self, layer, candidates, check_reversed):
+        # Pełne współrzędne są odczytywane ponownie tylko dla kluczy wspólnych dla kilku obiektów
+        candidate_groups = [fids for fids in candidates.values() if len(fids) > 1]
+        features = self._fetch_features(layer, candidate_groups)
+
+        groups = cleanup_rules.confirm_exact_groups(
+            candidate_groups, lambda fid: features[fid].geometry().asWkb() if fid in features else None, check_reversed, DUPLICATE_PRECISION
+        )
+        return [[features[fid] for fid in group] for group in groups]
+
+    def _find_near_duplicates(self, layer, scope_geom, tolerance, check_reversed):
+        request = QgsFeatureRequest().setFilterRect(scope_geom.boundingBox()).setNoAttributes()
+
+        total_searched = 0
+        near_index = cleanup_rules.NearDuplicateIndex(tolerance, check_reversed)
+        for feature in layer.getFeatures(request):
+            geom = feature.geometry()
+            if not _is_in_scope(geom, scope_geom):
+                continue
+            total_searched += 1
+            near_index.add(feature.id(), geom)
+
+        candidate_groups = near_index.groups()
+        self.logger.log_dev(self.FUNCTIONALITY_NAME, 0, "INFO", f"Near duplicates: {near_index.compared} pairs compared, {near_index.confirmed} confirmed.")
+        features = self._fetch_features(layer, candidate_groups)
+        feature_groups = [[features[fid] for fid in fids if fid in features] for fids in candidate_groups]
+        return total_searched, [group for group in feature_groups if len(group) > 1]
+
+    def _find_cross_layer_duplicates(self, layers, scope_geom, check_reversed):
+        # Jeden wspólny indeks kluczy dla wszystkich warstw; każda warstwa jest czytana jeden raz
+        reference_crs = layers[0].crs()
+        total_searched = 0
+        candidates = defaultdict(list)
+        for layer in layers:
+            transformer = None
+            layer_scope = scope_geom
+            if layer.crs() != reference_crs:
+                transformer = QgsCoordinateTransform(layer.crs(), reference_crs, QgsProject.instance())
+                layer_scope = QgsGeometry(scope_geom)
+                layer_scope.transform(QgsCoordinateTransform(reference_crs, layer.crs(), QgsProject.instance()))
+
+            request = QgsFeatureRequest().setFilterRect(layer_scope.boundingBox()).setNoAttributes()
+            for feature in layer.getFeatures(request):
+                geom = feature.geometry()
+                if not _is_in_scope(geom, layer_scope):
+                    continue
+                total_searched += 1
+                if geom and not geom.isEmpty() and geom.isGeosValid():
+                    if transformer:
+                        geom = QgsGeometry(geom)
+                        geom.transform(transformer)
+                    candidates[geometry_key(geom.asWkb(), DUPLICATE_PRECISION, check_reversed)].append((layer, feature.id()))
+
+        # Tylko grupy obejmujące więcej niż jedną warstwę
+        candidate_groups = [members for members in candidates.values() if len({l.id() for l, _ in members}) > 1]
+        features = {}
+        for layer in layers:
+            fids = [fid for members in candidate_groups for l, fid in members if l.id() == layer.id()]
+            if fids:
+                features.update({(layer.id(), f.id()): f for f in layer.getFeatures(QgsFeatureRequest().setFilterFids(fids))})
+
+        feature_groups = []
+        for members in candidate_groups:
+            geometries = defaultdict(list)
+            for layer, fid in members:
+                feature = features.get((layer.id(), fid))
+                if feature is None:
+                    continue
+                geom = QgsGeometry(feature.geometry())
+                if layer.crs() != reference_crs:
+                    geom.transform(QgsCoordinateTransform(layer.crs(), reference_crs, QgsProject.instance()))
+                geometries[normalized_geometry(geom.asWkb(), DUPLICATE_PRECISION, check_reversed)].append((layer, feature))
+            feature_groups.extend(group for group in geometries.values() if len({l.id() for l, _ in group}) > 1)
+        return total_searched, feature_groups
+
+    def _get_group_layers(self):
+        layers = []
+        for layer_name in self.layer_group_combobox.currentData() or []:
+            layers.extend(l for l in QgsProject.instance().mapLayersByName(layer_name) if isinstance(l, QgsVectorLayer))
+        return layers
+
+    def _populate_layer_groups_combobox(self):
+        self.layer_group_combobox.clear()
+        try:
+            json_path = os.path.join(os.path.dirname(__file__), '..', 'templates', 'lista_grup_warstw.json')
+            with open(json_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except Exception as e:
+            self.output_widget.log_error(f"OSTRZEŻENIE: Nie udało się wczytać grup warstw z pliku .json: {e}")
             return
-
-        geom = feature.geometry()
-        canvas = self.iface.mapCanvas()
-
-        canvas_crs = canvas.mapSettings().destinationCrs()
-        layer_crs = layer.crs()
-        if canvas_crs != layer_crs:
-            transform = QgsCoordinateTransform(layer_crs, canvas_crs, QgsProject.instance())
-            geom.transform(transform)
-
-        wkb_type = QgsWkbTypes.flatType(geom.wkbType())
-        if wkb_type == QgsWkbTypes.LineString or wkb_type == QgsWkbTypes.MultiLineString:
-            centroid = geom.interpolate(geom.length() / 2).asPoint()
-        else:
-            centroid = geom.centroid().asPoint()
-        
-        canvas.setCenter(centroid)
-        canvas.zoomScale(250)
-        canvas.refresh()
-
-        self.output_widget.log_info(f"Przybliżono do obiektu o ID: {feature.id()}")
+        for group_key, label in CROSS_LAYER_GROUPS:
+            layer_names = data.get(group_key, [])
+            if layer_names:
+                self.layer_group_combobox.addItem(f"{label} ({', '.join(layer_names)})", layer_names)
+
+    def _fetch_features(self, layer, fid_groups):
+        fids = [fid for group in fid_groups for fid in group]
+        if not fids:
+            return {}
+        return {feature.id(): feature for feature in layer.getFeatures(QgsFeatureRequest().setFilterFids(fids))}
+
+    def _split_by_attributes(self, feature_groups, compare_attributes):
+        if not compare_attributes:
+            return feature_groups, 0
+
+        duplicate_groups = []
+        geometrically_identical_but_different_attrs = 0
+        for feature_list in feature_groups:
+            attr_groups = self._group_by_attributes(feature_list)
+            if len(attr_groups) > 1:
+                max_group_size = max(len(group) for group in attr_groups)
+                geometrically_identical_but_different_attrs += (len(feature_list) - max_group_size)
+            for group in attr_groups:
+                if len(group) > 1: duplicate_groups.append(group)
+        return duplicate_groups, geometrically_identical_but_different_attrs
+
+    def _append_results(self, duplicate_groups, cross_layer=False):
+        if self.results_model.columnCount() == 0:
+            self.result_group_count = 0
+            if cross_layer:
+                # Kolumny atrybutów to suma pól wszystkich warstw grupy, w kolejności ich występowania
+                field_names = []
+                for group_layer in self._get_group_layers():
+                    field_names.extend(n for n in group_layer.fields().names() if n not in field_names)
+                fixed_headers = ["Grupa", "Nr w grupie", "Warstwa"]
+            else:
+                field_names = duplicate_groups[0][0][0].fields().names()
+                fixed_headers = ["Grupa", "Nr w grupie"]
+            # Grupa jest przechowywana jako liczba (sortowanie), a wyświetlana jako A, B, ..., AA
+            self.results_model.set_columns(fixed_headers, field_names, {0: _to_excel_col})
+
+        members, fixed_rows = [], []
+        for i, group in enumerate(duplicate_groups, self.result_group_count + 1):
+            for j, (layer, feature) in enumerate(group, 1):
+                members.append((layer, feature.id()))
+                fixed_rows.append((i, j, layer.name()) if cross_layer else (i, j))
+        self.results_model.append_rows(members, fixed_rows)
+
+        self.result_group_count += len(duplicate_groups)
+        if self.result_group_count == len(duplicate_groups):
+            self.results_table.resizeColumnsToContents()
 
     def run_delete_all_action(self):
-        to_delete_ids = []
-        for row in range(self.results_table.rowCount()):
-            try:
-                if int(self.results_table.item(row, 1).text()) > 1:
-                    to_delete_ids.append(self.feature_map[row])
-            except (ValueError, AttributeError):
-                continue
+        to_delete_ids = [self.results_model.row_member(row) for row in range(self.results_model.rowCount()) if self.results_model.fixed_value(row, 1) > 1]
 
         if not to_delete_ids:
             self.output_widget.log_warning("Brak duplikatów (o numerze > 1) do usunięcia.")
@@ -415,12 +768,12 @@ class DuplicatesWidget(QWidget):
         self._delete_features(to_delete_ids, f"wszystkie {len(to_delete_ids)} znalezione duplikaty (pozostawiając nr 1 w każdej grupie)")
 
     def run_delete_selected_action(self):
-        selected_rows = {index.row() for index in self.results_table.selectedIndexes()}
+        selected_rows = self.results_proxy.source_rows(self.results_table.selectionModel().selectedRows())
         if not selected_rows:
             self.output_widget.log_warning("Nie zaznaczono żadnych obiektów w tabeli wyników.")
             return
 
-        selected_ids = [self.feature_map[row] for row in selected_rows]
+        selected_ids = [self.results_model.row_member(row) for row in selected_rows]
         self._delete_features(selected_ids, f"{len(selected_ids)} zaznaczone obiekty")
 
     def _delete_features(self, feature_ids, description):
@@ -433,134 +786,53 @@ class DuplicatesWidget(QWidget):
         reply = QMessageBox.warning(self, "Potwierdzenie usunięcia", warning_text, QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
         if reply == QMessageBox.No: self.output_widget.log_info("Operacja usuwania anulowana przez użytkownika."); return
 
-        layer = self.layer_combobox.currentData()
-        layer.startEditing()
-        layer.deleteFeatures(feature_ids)
-        layer.commitChanges()
-
-        self.output_widget.log_success(f"Pomyślnie usunięto {len(feature_ids)} obiektów.")
-        self.run_check_action()
-
-    def _populate_zakres_combobox(self):
-        self.zakres_combo_box.clear()
-        zakres_layer_list = QgsProject.instance().mapLayersByName("zakres_zadania")
-        if not zakres_layer_list:
-            self.output_widget.log_error("Nie znaleziono warstwy 'zakres_zadania'.")
-            return
-        
-        zakres_layer = zakres_layer_list[0]
-        
-        scopes = []
-        try:
-            # Upewnij się, że atrybut 'nazwa' istnieje
-            if "nazwa" not in zakres_layer.fields().names():
-                self.output_widget.log_error("Warstwa 'zakres_zadania' nie posiada atrybutu 'nazwa'.")
-                return
-
-            for feature in zakres_layer.getFeatures():
-                # Dodajemy tylko te zakresy, które mają nazwę
-                if feature["nazwa"]:
-                    scopes.append((feature["nazwa"], feature.geometry()))
-        except Exception as e:
-            self.output_widget.log_error(f"Błąd podczas wczytywania zakresów: {e}")
-            return
-
-        # Sortowanie listy zakresów alfabetycznie po nazwie
-        scopes.sort(key=lambda x: x[0])
-
-        # Dodanie posortowanych elementów do comboboxa
-        for name, geom in scopes:
-            self.zakres_combo_box.addItem(name, geom)
-
-    def _populate_layers_combobox(self):
-        self.layer_combobox.clear()
-
-        # Load essential layers list
-        essential_layers_names = []
-        try:
-            json_path = os.path.join(os.path.dirname(__file__), '..', 'templates', 'lista_grup_warstw.json')
-            with open(json_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-            essential_layers_names = data.get("PROJECT_ESSENTIAL_LAYERS", [])
-        except Exception as e:
-            self.output_widget.log_error(f"OSTRZEŻENIE: Nie udało się wczytać listy warstw podstawowych z pliku .json: {e}")
-
-        # Get all vector layers from the project
-        all_project_layers = [layer for layer in QgsProject.instance().mapLayers().values() if isinstance(layer, QgsVectorLayer)]
-
-        if not self.show_all_layers_checkbox.isChecked():
-            # Default view: Show only essential layers
-            essential_project_layers = [layer for layer in all_project_layers if layer.name() in essential_layers_names]
-            essential_project_layers.sort(key=lambda l: l.name())
-            
-            for layer in essential_project_layers:
-                self.layer_combobox.addItem(layer.name(), layer)
-        else:
-            # Expanded view: Show all layers
-            essential_project_layers = []
-            other_project_layers = []
-            
-            for layer in all_project_layers:
-                if layer.name() in essential_layers_names:
-                    essential_project_layers.append(layer)
-                else:
-                    other_project_layers.append(layer)
-
-            # Sort both lists alphabetically
-            essential_project_layers.sort(key=lambda l: l.name())
-            other_project_layers.sort(key=lambda l: l.name())
-
-            # Populate combobox
-            for layer in essential_project_layers:
-                self.layer_combobox.addItem(layer.name(), layer)
-            
-            if other_project_layers:
-                self.layer_combobox.insertSeparator(self.layer_combobox.count())
-                for layer in other_project_layers:
-                    self.layer_combobox.addItem(layer.name(), layer)
-
-    def _is_in_scope(self, geom, scope_geom):
-        if not geom or not scope_geom or not geom.intersects(scope_geom): return False
-        wkb_type = geom.wkbType()
-        if wkb_type in [QgsWkbTypes.LineString, QgsWkbTypes.MultiLineString]:
-            last_vertex_point = None
-            try:
-                if wkb_type == QgsWkbTypes.LineString:
-                    polyline = geom.asPolyline()
-                    if polyline:
-                        last_vertex_point = polyline[-1]
-                elif wkb_type == QgsWkbTypes.MultiLineString:
-                    multi_polyline = geom.asMultiPolyline()
-                    if multi_polyline and multi_polyline[-1]:
-                        last_vertex_point = multi_polyline[-1][-1]
-                
-                if last_vertex_point and not QgsGeometry.fromPointXY(last_vertex_point).intersects(scope_geom):
-                    return False
-            except IndexError:
-                return False
-        return True
+        # feature_ids to pary (warstwa, fid) - w trybie między warstwami obiekty mogą pochodzić z kilku warstw
+        layers, fids_by_layer = {}, defaultdict(list)
+        for layer, fid in feature_ids:
+            layers[layer.id()] = layer
+            fids_by_layer[layer.id()].append(fid)
+
+        # Tabela jest aktualizowana na miejscu - bez ponownego przeszukiwania zakresu
+        deleted_members = []
+        for layer_id, fids in fids_by_layer.items():
+            layer = layers[layer_id]
+            deleted, completed = _delete_in_chunks(self, layer, fids, self.output_widget)
+            deleted_members.extend((layer, fid) for fid in deleted)
+            if not completed:
+                break
+
+        self.results_model.remove_members(deleted_members)
+        if deleted_members:
+            self.output_widget.log_success(f"Pomyślnie usunięto {len(deleted_members)} obiektów.")
+        self.delete_all_button.setEnabled(any(self.results_model.fixed_value(row, 1) > 1 for row in range(self.results_model.rowCount())))
+        self._update_button_states()
 
-    def _group_by_attributes(self, features):
+    def _group_by_attributes(self, members):
         attr_groups = defaultdict(list)
         ignore_fields = {'id', 'fid'}
-        if not features: return []
-        fields_to_compare = [field.name() for field in features[0].fields() if field.name() not in ignore_fields]
-        for feature in features:
-            try: attr_values = tuple(feature[name] for name in fields_to_compare); attr_groups[attr_values].append(feature)
+        if not members: return []
+        # Obiekty z różnych warstw porównywane są tylko na wspólnych polach
+        common_fields = set.intersection(*(set(feature.fields().names()) for _, feature in members))
+        fields_to_compare = [field.name() for field in members[0][1].fields() if field.name() not in ignore_fields and field.name() in common_fields]
+        for layer, feature in members:
+            try: attr_values = tuple(feature[name] for name in fields_to_compare); attr_groups[attr_values].append((layer, feature))
             except KeyError: continue
         return list(attr_groups.values())
 
-# --- Invalid Geometries Tab Widget (Unchanged) ---
+# --- Invalid Geometries Tab Widget ---
 
-class InvalidGeometriesWidget(QWidget):
+class InvalidGeometriesWidget(_CleanupTabMixin, QWidget):
     FUNCTIONALITY_NAME = "Czyszczenie / Błędne geometrie"
+    # Liczba obiektów naprawianych między kolejnymi odświeżeniami interfejsu
+    REPAIR_BATCH_SIZE = 500
 
     def __init__(self, iface, parent=None):
         super(InvalidGeometriesWidget, self).__init__(parent)
         self.iface = iface
         self.logger = logger
-        self.feature_map = {}
         self.cable_layers = []
+        self.invalid_results = []
+        self.repairs = {}
 
         self._setup_ui_dynamically()
         self._load_layer_groups()
@@ -614,10 +886,32 @@ class InvalidGeometriesWidget(QWidget):
         check_layout.addWidget(self.check_button)
         settings_layout.addLayout(check_layout)
 
+        repair_groupbox = QGroupBox("Naprawa geometrii")
+        repair_layout = QHBoxLayout(repair_groupbox)
+        repair_layout.addWidget(QLabel("Metoda:"))
+        self.repair_method_combobox = QComboBox()
+        self.repair_method_combobox.addItem("makeValid", "make_valid")
+        self.repair_method_combobox.addItem("Przyciągnięcie do siatki, następnie makeValid", "snap")
+        repair_layout.addWidget(self.repair_method_combobox)
+        repair_layout.addWidget(QLabel("Oczko siatki:"))
+        self.grid_size_spinbox = QDoubleSpinBox()
+        self.grid_size_spinbox.setDecimals(3)
+        self.grid_size_spinbox.setRange(0.001, 1.0)
+        self.grid_size_spinbox.setSingleStep(0.001)
+        self.grid_size_spinbox.setValue(0.001)
+        self.grid_size_spinbox.setSuffix(" m")
+        self.grid_size_spinbox.setEnabled(False)
+        repair_layout.addWidget(self.grid_size_spinbox)
+        repair_layout.addStretch()
+        self.preview_repair_button = QPushButton("Podgląd naprawy")
+        repair_layout.addWidget(self.preview_repair_button)
+        settings_layout.addWidget(repair_groupbox)
+
         self.results_groupbox = QGroupBox("Wyniki")
         results_layout = QVBoxLayout(self.results_groupbox)
-        self.results_table = QTableWidget()
-        self.results_table.setSortingEnabled(True)
+        self.results_table = QTableView()
+        self.results_model = FeatureResultsModel(self)
+        self.results_proxy = setup_results_view(self.results_table, self.results_model)
         results_layout.addWidget(self.results_table)
 
         results_actions_layout = QHBoxLayout()
@@ -625,9 +919,12 @@ class InvalidGeometriesWidget(QWidget):
         self.zoom_to_feature_button = QPushButton("Przybliż do obiektu")
         self.delete_selected_button = QPushButton("Usuń zaznaczone")
         self.delete_all_button = QPushButton("Usuń wszystkie")
+        self.apply_repair_button = QPushButton("Zapisz naprawy")
+        self.apply_repair_button.setToolTip("Zapisuje naprawione geometrie zaznaczonych obiektów (lub wszystkich, jeśli nic nie zaznaczono)")
         results_actions_layout.addWidget(self.zoom_to_feature_button)
         results_actions_layout.addWidget(self.delete_selected_button)
         results_actions_layout.addWidget(self.delete_all_button)
+        results_actions_layout.addWidget(self.apply_repair_button)
         results_layout.addLayout(results_actions_layout)
 
         self.output_widget_placeholder = QWidget()
@@ -648,15 +945,19 @@ class InvalidGeometriesWidget(QWidget):
     def _connect_signals(self):
         self.refresh_button.clicked.connect(self.refresh_data)
         self.check_button.clicked.connect(self.run_check_action)
+        self.preview_repair_button.clicked.connect(self.run_repair_preview_action)
+        self.apply_repair_button.clicked.connect(self.run_apply_repair_action)
+        self.repair_method_combobox.currentIndexChanged.connect(lambda: self.grid_size_spinbox.setEnabled(self.repair_method_combobox.currentData() == "snap"))
         self.delete_all_button.clicked.connect(self.run_delete_all_action)
         self.delete_selected_button.clicked.connect(self.run_delete_selected_action)
         self.zoom_to_feature_button.clicked.connect(self._on_zoom_to_feature_clicked)
-        self.results_table.itemSelectionChanged.connect(self._update_button_states)
+        self.results_table.selectionModel().selectionChanged.connect(self._update_button_states)
         self.layer_combobox.currentIndexChanged.connect(self._on_layer_changed)
         self.show_all_layers_checkbox.toggled.connect(self._populate_layers_combobox)
 
     def refresh_data(self):
         self.output_widget.log_info("Odświeżanie list...")
+        cleanup_baseline.clear()
         self._load_layer_groups()
         self._populate_zakres_combobox()
         self._populate_layers_combobox()
@@ -670,6 +971,8 @@ class InvalidGeometriesWidget(QWidget):
         self.delete_all_button.setEnabled(False)
         self.delete_selected_button.setEnabled(False)
         self.zoom_to_feature_button.setEnabled(False)
+        self.preview_repair_button.setEnabled(False)
+        self.apply_repair_button.setEnabled(False)
 
     def _update_button_states(self):
         selected_rows_count = len(self.results_table.selectionModel().selectedRows())
@@ -678,15 +981,16 @@ class InvalidGeometriesWidget(QWidget):
 
     def _on_layer_changed(self):
         self._setup_initial_state()
-        self.results_table.clearContents()
-        self.results_table.setRowCount(0)
-        self.feature_map.clear()
+        self.results_model.clear()
+        self.invalid_results = []
+        self.repairs = {}
 
     def run_check_action(self):
         self.output_widget.clear_log()
         self._setup_initial_state()
-        self.results_table.setColumnCount(0); self.results_table.setRowCount(0)
-        self.feature_map.clear()
+        self.results_model.clear()
+        self.invalid_results = []
+        self.repairs = {}
 
         layer = self.layer_combobox.currentData()
         if not layer:
@@ -702,164 +1006,174 @@ class InvalidGeometriesWidget(QWidget):
         scope_geom = self.zakres_combo_box.currentData()
         self.output_widget.log_info(f"Rozpoczynam sprawdzanie geometrii w warstwie '{layer.name()}'...")
 
-        request = QgsFeatureRequest().setFilterRect(scope_geom.boundingBox())
-        
-        searched_count = 0
-        invalid_features = []
-        
-        for feature in layer.getFeatures(request):
-            if not feature.geometry().intersects(scope_geom):
-                continue
-            
-            searched_count += 1
-            geom = feature.geometry()
-            layer_name = layer.name()
-            reason = None
-
-            # Skip cross cables from invalid geometry check.
-            wkb_type = geom.wkbType()
-            is_line_geometry = wkb_type in [
-                QgsWkbTypes.LineString, QgsWkbTypes.MultiLineString,
-                QgsWkbTypes.LineStringZ, QgsWkbTypes.MultiLineStringZ,
-                QgsWkbTypes.LineStringM, QgsWkbTypes.MultiLineStringM,
-                QgsWkbTypes.LineStringZM, QgsWkbTypes.MultiLineStringZM
-            ]
-            
-            is_cross_cable = False
-            if layer_name in self.cable_layers and is_line_geometry and not geom.isEmpty():
-                try:
-                    all_vertices = []
-                    if geom.isMultipart():
-                        lines = geom.asMultiPolyline()
-                        for line in lines:
-                            all_vertices.extend(line)
-                    else:
-                        all_vertices = geom.asPolyline()
-
-                    if len(all_vertices) == 2:
-                        start_point, end_point = all_vertices
-                        if start_point.distance(end_point) < 0.0001:
-                            is_cross_cable = True
-                except Exception as e:
-                    # In case of geometry processing error, log it but don't crash.
-                    # Treat it as not a cross cable and let it be evaluated by the next checks.
-                    self.logger.log_dev(self.FUNCTIONALITY_NAME, feature.id(), "ERROR", f"Could not determine if feature {feature.id()} is a cross cable: {e}")
-
-            if is_cross_cable:
-                self.logger.log_dev(self.FUNCTIONALITY_NAME, feature.id(), "INFO", f"Skipping cross cable (ID: {feature.id()}) from invalid geometry check.")
-                continue
+        # Wyniki poprzednich sprawdzeń są przechowywane; przeliczane są tylko obiekty zmienione od tego czasu
+        is_cable_layer = layer.name() in self.cable_layers
+        reason_column = f"invalid_reason:{int(is_cable_layer)}"
+        baseline = cleanup_baseline.baseline_for(layer)
+        members = baseline.collect(scope_geom, lambda geom, scope: bool(geom) and geom.intersects(scope), "intersects",
+                                   {reason_column: lambda geom: self._invalid_reason(geom, is_cable_layer)})
+        self.logger.log_dev(self.FUNCTIONALITY_NAME, 0, "INFO", f"Baseline: {baseline.last_computed} features checked, {len(members) - baseline.last_computed} reused.")
 
-            if not geom or geom.isNull():
-                reason = "Geometria typu None/Null"
-            elif geom.isEmpty():
-                reason = "Pusta geometria (isEmpty)"
-            elif not geom.isGeosValid():
-                reason = "Niepoprawna geometria (błąd GEOS)"
-            elif geom.length() == 0: # This will now only catch non-cable zero-length geoms
-                reason = "Geometria o zerowej długości"
-            elif geom.wkbType() in [QgsWkbTypes.Point, QgsWkbTypes.PointZ, QgsWkbTypes.PointM, QgsWkbTypes.PointZM]:
-                if geom.asPoint() == QgsPoint(0, 0):
-                    reason = "Punkt o współrzędnych (0,0)"
-
-            if reason:
-                invalid_features.append((feature, reason))
+        searched_count = len(members)
+        reasons = baseline.values[reason_column]
+        invalid_features = [(fid, reasons[fid]) for fid in members if reasons.get(fid)]
 
         self.output_widget.log_info(f"Przeszukano obiektów w zakresie zadania: {searched_count}")
         if not invalid_features:
             self.output_widget.log_success("Nie znaleziono obiektów z błędną geometrią.")
             return
 
-        self._display_results(invalid_features, layer)
+        self.invalid_results = invalid_features
+        self._display_results(layer)
         self.output_widget.log_warning(f"Znaleziono {len(invalid_features)} obiektów z błędami geometrii.")
         self.delete_all_button.setEnabled(True)
+        self.preview_repair_button.setEnabled(True)
         self._update_button_states()
 
-    def _display_results(self, invalid_features, layer):
-        self.results_table.clear()
-        self.feature_map.clear()
-        
-        all_field_names = layer.fields().names()
-        
-        display_field_names = list(all_field_names)
-        headers = ["Powód"]
-        
+    def _invalid_reason(self, geom, is_cable_layer):
+        if not geom or geom.isNull():
+            return "Geometria typu None/Null"
+
+        # Skip cross cables from invalid geometry check.
+        wkb_type = geom.wkbType()
+        is_line_geometry = wkb_type in [
+            QgsWkbTypes.LineString, QgsWkbTypes.MultiLineString,
+            QgsWkbTypes.LineStringZ, QgsWkbTypes.MultiLineStringZ,
+            QgsWkbTypes.LineStringM, QgsWkbTypes.MultiLineStringM,
+            QgsWkbTypes.LineStringZM, QgsWkbTypes.MultiLineStringZM
+        ]
+
+        if is_cable_layer and is_line_geometry and not geom.isEmpty():
+            try:
+                all_vertices = []
+                if geom.isMultipart():
+                    lines = geom.asMultiPolyline()
+                    for line in lines:
+                        all_vertices.extend(line)
+                else:
+                    all_vertices = geom.asPolyline()
+
+                if len(all_vertices) == 2:
+                    start_point, end_point = all_vertices
+                    if start_point.distance(end_point) < 0.0001:
+                        return None
+            except Exception as e:
+                # In case of geometry processing error, log it but don't crash.
+                # Treat it as not a cross cable and let it be evaluated by the next checks.
+                self.logger.log_dev(self.FUNCTIONALITY_NAME, 0, "ERROR", f"Could not determine if feature is a cross cable: {e}")
+
+        if geom.isEmpty():
+            return "Pusta geometria (isEmpty)"
+        if not geom.isGeosValid():
+            return "Niepoprawna geometria (błąd GEOS)"
+        if geom.length() == 0: # This will now only catch non-cable zero-length geoms
+            return "Geometria o zerowej długości"
+        if geom.wkbType() in [QgsWkbTypes.Point, QgsWkbTypes.PointZ, QgsWkbTypes.PointM, QgsWkbTypes.PointZM]:
+            if geom.asPoint() == QgsPoint(0, 0):
+                return "Punkt o współrzędnych (0,0)"
+        return None
+
+    def _display_results(self, layer):
+        display_field_names = list(layer.fields().names())
         if 'id' in display_field_names:
             display_field_names.remove('id')
-            headers.append('id')
-            
-        headers.extend(display_field_names)
-
-        self.results_table.setColumnCount(len(headers))
-        self.results_table.setHorizontalHeaderLabels(headers)
-
-        for row, (feature, reason) in enumerate(invalid_features):
-            self.results_table.insertRow(row)
-            self.feature_map[row] = feature.id()
-
-            reason_item = QTableWidgetItem(reason)
-            reason_item.setFlags(reason_item.flags() & ~Qt.ItemIsEditable)
-            self.results_table.setItem(row, 0, reason_item)
-
-            for col_idx, field_name in enumerate(headers[1:], 1):
-                attr_val = str(feature[field_name] or "")
-                attr_item = QTableWidgetItem(attr_val)
-                attr_item.setFlags(attr_item.flags() & ~Qt.ItemIsEditable)
-                self.results_table.setItem(row, col_idx, attr_item)
-        
+            display_field_names.insert(0, 'id')
+
+        members = [(layer, fid) for fid, _ in self.invalid_results]
+        if self.repairs:
+            change_header = "Zmiana długości [m]" if layer.geometryType() == QgsWkbTypes.LineGeometry else "Zmiana powierzchni [m²]"
+            self.results_model.set_columns(["Powód", "Naprawa", change_header], display_field_names, {2: lambda value: f"{value:+.3f}"})
+            fixed_rows = []
+            for fid, reason in self.invalid_results:
+                _, status, change = self.repairs.get(fid, (None, "Nie sprawdzono", None))
+                fixed_rows.append((reason, status, change))
+        else:
+            self.results_model.set_columns(["Powód"], display_field_names)
+            fixed_rows = [(reason,) for _, reason in self.invalid_results]
+        self.results_model.append_rows(members, fixed_rows)
         self.results_table.resizeColumnsToContents()
 
-    def _on_zoom_to_feature_clicked(self):
-        selected_rows = self.results_table.selectionModel().selectedRows()
-        if len(selected_rows) != 1:
-            self.output_widget.log_info("Proszę zaznaczyć dokładnie jeden obiekt na liście.")
+    def run_repair_preview_action(self):
+        layer = self.layer_combobox.currentData()
+        if not layer or not self.invalid_results:
+            self.output_widget.log_warning("Brak obiektów do naprawy. Najpierw sprawdź geometrie.")
             return
 
-        selected_row = selected_rows[0].row()
-        feature_id = self.feature_map.get(selected_row)
+        grid_size = self.grid_size_spinbox.value() if self.repair_method_combobox.currentData() == "snap" else None
+        fids = [fid for fid, _ in self.invalid_results]
+        self.output_widget.log_info(f"Przygotowywanie naprawy {len(fids)} obiektów metodą: {self.repair_method_combobox.currentText()}...")
 
-        if feature_id is None:
-            self.output_widget.log_error("Nie można odnaleźć ID obiektu dla zaznaczonego wiersza.")
+        self.repairs = {}
+        self.preview_repair_button.setEnabled(False)
+        try:
+            # Obiekty są czytane i naprawiane partiami, z odświeżeniem interfejsu po każdej partii
+            for start in range(0, len(fids), self.REPAIR_BATCH_SIZE):
+                request = QgsFeatureRequest().setFilterFids(fids[start:start + self.REPAIR_BATCH_SIZE]).setNoAttributes()
+                for feature in layer.getFeatures(request):
+                    geom = feature.geometry()
+                    repaired, status = _repair_geometry(geom, layer.wkbType(), grid_size)
+                    self.repairs[feature.id()] = (repaired, status, _measure_change(geom, repaired) if repaired else None)
+                QApplication.processEvents()
+        except Exception as e:
+            self.output_widget.log_error(f"Wystąpił nieoczekiwany błąd podczas naprawy: {e}")
+            self.logger.log_dev(self.FUNCTIONALITY_NAME, 0, "ERROR", str(e))
+            self.repairs = {}
             return
+        finally:
+            self.preview_repair_button.setEnabled(True)
 
+        self._display_results(layer)
+        repaired_count = sum(1 for repaired, _, _ in self.repairs.values() if repaired)
+        self.output_widget.log_info(f"Naprawiono w podglądzie: {repaired_count} z {len(fids)} obiektów. Sprawdź kolumny 'Naprawa' i zmianę długości/powierzchni.")
+        if repaired_count < len(fids):
+            self.output_widget.log_warning(f"Obiekty, których nie udało się naprawić: {len(fids) - repaired_count}. Można je usunąć lub poprawić ręcznie.")
+        self.apply_repair_button.setEnabled(repaired_count > 0)
+
+    def run_apply_repair_action(self):
         layer = self.layer_combobox.currentData()
-        if not layer:
+        if not layer or not self.repairs:
+            self.output_widget.log_warning("Brak przygotowanych napraw. Najpierw użyj opcji 'Podgląd naprawy'.")
+            return
+        if layer.isEditable():
+            self.output_widget.log_error(f"Warstwa '{layer.name()}' jest w trybie edycji. Wyłącz tryb edycji, aby kontynuować.")
             return
 
-        feature = layer.getFeature(feature_id)
-        if not feature.hasGeometry():
-            self.output_widget.log_error("Wybrany obiekt nie posiada geometrii, nie można go przybliżyć.")
+        selected_rows = self.results_proxy.source_rows(self.results_table.selectionModel().selectedRows())
+        fids = [self.results_model.row_member(row)[1] for row in selected_rows] if selected_rows else [fid for fid, _ in self.invalid_results]
+        geometries = {fid: self.repairs[fid][0] for fid in fids if fid in self.repairs and self.repairs[fid][0] is not None}
+        if not geometries:
+            self.output_widget.log_warning("Żaden z wybranych obiektów nie ma poprawnej naprawy do zapisania.")
             return
 
-        geom = feature.geometry()
-        canvas = self.iface.mapCanvas()
+        description = "zaznaczonych" if selected_rows else "wszystkich naprawionych"
+        reply = QMessageBox.warning(self, "Potwierdzenie naprawy", f"Czy na pewno chcesz zapisać naprawione geometrie {description} obiektów ({len(geometries)})? Tej operacji nie można cofnąć.", QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
+        if reply == QMessageBox.No: self.output_widget.log_info("Zapis napraw anulowany przez użytkownika."); return
 
-        canvas_crs = canvas.mapSettings().destinationCrs()
-        layer_crs = layer.crs()
-        if canvas_crs != layer_crs:
-            transform = QgsCoordinateTransform(layer_crs, canvas_crs, QgsProject.instance())
-            geom.transform(transform)
+        provider = layer.dataProvider()
+        if not provider.capabilities() & QgsVectorDataProvider.ChangeGeometries:
+            self.output_widget.log_error(f"Warstwa '{layer.name()}' nie pozwala na zmianę geometrii. Naprawy nie zostały zapisane.")
+            return
+        # Jeden zbiorczy zapis wszystkich zaakceptowanych geometrii (bez sygnałów warstwy)
+        cleanup_baseline.invalidate(layer, list(geometries))
+        layer_changes.bump(layer)
+        if not provider.changeGeometryValues(geometries):
+            self.output_widget.log_error(f"Błąd zapisu geometrii do warstwy '{layer.name()}': {'; '.join(provider.errors())}")
+            return
+        layer.updateExtents()
+        layer.triggerRepaint()
 
-        wkb_type = QgsWkbTypes.flatType(geom.wkbType())
-        if wkb_type == QgsWkbTypes.LineString or wkb_type == QgsWkbTypes.MultiLineString:
-            centroid = geom.interpolate(geom.length() / 2).asPoint()
-        else:
-            centroid = geom.centroid().asPoint()
-        
-        canvas.setCenter(centroid)
-        canvas.zoomScale(250)
-        canvas.refresh()
-
-        self.output_widget.log_info(f"Przybliżono do obiektu o ID: {feature.id()}")
+        self.output_widget.log_success(f"Pomyślnie zapisano naprawione geometrie {len(geometries)} obiektów.")
+        self.run_check_action()
 
     def run_delete_all_action(self):
-        all_ids = list(self.feature_map.values())
+        all_ids = [fid for _, fid in self.results_model.members()]
         if not all_ids: self.output_widget.log_warning("Brak obiektów do usunięcia."); return
         self._delete_features(all_ids, f"wszystkie {len(all_ids)} znalezione obiekty")
 
     def run_delete_selected_action(self):
-        selected_rows = {index.row() for index in self.results_table.selectedIndexes()}
+        selected_rows = self.results_proxy.source_rows(self.results_table.selectionModel().selectedRows())
         if not selected_rows: self.output_widget.log_warning("Nie zaznaczono żadnych obiektów w tabeli wyników."); return
-        selected_ids = [self.feature_map[row] for row in selected_rows]
+        selected_ids = [self.results_model.row_member(row)[1] for row in selected_rows]
         self._delete_features(selected_ids, f"{len(selected_ids)} zaznaczone obiekty")
 
     def _delete_features(self, feature_ids, description):
@@ -868,88 +1182,515 @@ class InvalidGeometriesWidget(QWidget):
         reply = QMessageBox.warning(self, "Potwierdzenie usunięcia", f"Czy na pewno chcesz usunąć {description}? Tej operacji nie można cofnąć.", QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
         if reply == QMessageBox.No: self.output_widget.log_info("Operacja usuwania anulowana przez użytkownika."); return
 
+        # Tabela jest aktualizowana na miejscu - bez ponownego przeszukiwania zakresu
         layer = self.layer_combobox.currentData()
-        layer.startEditing()
-        layer.deleteFeatures(feature_ids)
-        layer.commitChanges()
+        deleted, _ = _delete_in_chunks(self, layer, list(feature_ids), self.output_widget)
+
+        deleted_ids = set(deleted)
+        self.invalid_results = [(fid, reason) for fid, reason in self.invalid_results if fid not in deleted_ids]
+        self.results_model.remove_members([(layer, fid) for fid in deleted])
+        if deleted:
+            self.output_widget.log_success(f"Pomyślnie usunięto {len(deleted)} obiektów.")
+        self.delete_all_button.setEnabled(bool(self.invalid_results))
+        self.preview_repair_button.setEnabled(bool(self.invalid_results))
+        self._update_button_states()
 
-        self.output_widget.log_success(f"Pomyślnie usunięto {len(feature_ids)} obiektów.")
-        self.run_check_action()
+# --- Attribute Duplicates Tab Widget ---
 
-    def _populate_zakres_combobox(self):
-        self.zakres_combo_box.clear()
-        zakres_layer_list = QgsProject.instance().mapLayersByName("zakres_zadania")
-        if not zakres_layer_list:
-            self.output_widget.log_error("Nie znaleziono warstwy 'zakres_zadania'.")
+class AttributeDuplicatesWidget(_CleanupTabMixin, QWidget):
+    FUNCTIONALITY_NAME = "Czyszczenie / Duble atrybutów"
+    # Liczba grup wypisywanych w oknie komunikatów (pełna lista jest w tabeli)
+    REPORTED_GROUPS = 10
+
+    def __init__(self, iface, parent=None):
+        super(AttributeDuplicatesWidget, self).__init__(parent)
+        self.iface = iface
+        self.logger = logger
+
+        self._setup_ui_dynamically()
+        self._connect_signals()
+        self._populate_layers_combobox()
+        self._setup_initial_state()
+
+    def _setup_ui_dynamically(self):
+        main_layout = QVBoxLayout(self)
+
+        self.settings_groupbox = QGroupBox("Ustawienia")
+        self.settings_groupbox.setSizePolicy(QSizePolicy.Preferred, QSizePolicy.Maximum)
+        settings_layout = QVBoxLayout(self.settings_groupbox)
+
+        layer_layout = QHBoxLayout()
+        layer_layout.addWidget(QLabel("Wybierz warstwę do sprawdzenia:"))
+        self.layer_combobox = QComboBox()
+        self.layer_combobox.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Fixed)
+        layer_layout.addWidget(self.layer_combobox)
+        self.refresh_button = QPushButton("Odśwież")
+        layer_layout.addWidget(self.refresh_button)
+        self.show_all_layers_checkbox = QCheckBox("Wyświetl na liście wszystkie istniejące warstwy")
+        self.show_all_layers_checkbox.setChecked(False)
+        layer_layout.addWidget(self.show_all_layers_checkbox)
+        settings_layout.addLayout(layer_layout)
+
+        settings_layout.addWidget(QLabel("Uznaj za dubel obiekty o identycznych wartościach w kolumnach:"))
+        self.fields_list = QListWidget()
+        self.fields_list.setMaximumHeight(120)
+        settings_layout.addWidget(self.fields_list)
+        self.skip_null_checkbox = QCheckBox("Pomiń obiekty z wartością NULL w którejkolwiek z wybranych kolumn")
+        self.skip_null_checkbox.setChecked(True)
+        settings_layout.addWidget(self.skip_null_checkbox)
+
+        check_layout = QHBoxLayout()
+        check_layout.addStretch()
+        self.check_button = QPushButton("Sprawdź duplikaty")
+        check_layout.addWidget(self.check_button)
+        settings_layout.addLayout(check_layout)
+
+        self.results_groupbox = QGroupBox("Wyniki")
+        results_layout = QVBoxLayout(self.results_groupbox)
+        self.results_table = QTableView()
+        self.results_model = FeatureResultsModel(self)
+        self.results_proxy = setup_results_view(self.results_table, self.results_model)
+        results_layout.addWidget(self.results_table)
+
+        results_actions_layout = QHBoxLayout()
+        results_actions_layout.addStretch()
+        self.zoom_to_feature_button = QPushButton("Przybliż do obiektu")
+        self.select_on_layer_button = QPushButton("Zaznacz na warstwie")
+        results_actions_layout.addWidget(self.zoom_to_feature_button)
+        results_actions_layout.addWidget(self.select_on_layer_button)
+        results_layout.addLayout(results_actions_layout)
+
+        self.output_widget_placeholder = QWidget()
+        self.output_widget = FormattedOutputWidget()
+        output_layout = QVBoxLayout(self.output_widget_placeholder)
+        output_layout.setContentsMargins(0, 0, 0, 0)
+        output_layout.addWidget(self.output_widget)
+        self.logger.set_user_message_widget(self.output_widget.output_console)
+
+        splitter = QSplitter(Qt.Vertical)
+        splitter.addWidget(self.results_groupbox)
+        splitter.addWidget(self.output_widget_placeholder)
+        splitter.setSizes([300, 150])
+
+        main_layout.addWidget(self.settings_groupbox)
+        main_layout.addWidget(splitter)
+
+    def _connect_signals(self):
+        self.refresh_button.clicked.connect(self.refresh_data)
+        self.check_button.clicked.connect(self.run_check_action)
+        self.zoom_to_feature_button.clicked.connect(self._on_zoom_to_feature_clicked)
+        self.select_on_layer_button.clicked.connect(self._on_select_on_layer_clicked)
+        self.results_table.selectionModel().selectionChanged.connect(self._update_button_states)
+        self.layer_combobox.currentIndexChanged.connect(self._on_layer_changed)
+        self.show_all_layers_checkbox.toggled.connect(self._populate_layers_combobox)
+
+    def refresh_data(self):
+        self.output_widget.log_info("Odświeżanie list...")
+        self._populate_layers_combobox()
+        self.output_widget.log_info("Listy zostały zaktualizowane.")
+
+    def _setup_initial_state(self):
+        self.zoom_to_feature_button.setEnabled(False)
+        self.select_on_layer_button.setEnabled(False)
+
+    def _update_button_states(self):
+        selected_rows_count = len(self.results_table.selectionModel().selectedRows())
+        self.select_on_layer_button.setEnabled(selected_rows_count > 0)
+        self.zoom_to_feature_button.setEnabled(selected_rows_count == 1)
+
+    def _on_layer_changed(self):
+        self._setup_initial_state()
+        self.results_model.clear()
+        self.fields_list.clear()
+        layer = self.layer_combobox.currentData()
+        if not layer:
             return
-        
-        zakres_layer = zakres_layer_list[0]
-        
-        scopes = []
+        for name in layer.fields().names():
+            item = QListWidgetItem(name)
+            item.setFlags(item.flags() | Qt.ItemIsUserCheckable)
+            item.setCheckState(Qt.Checked if name == 'id' else Qt.Unchecked)
+            self.fields_list.addItem(item)
+
+    def _selected_field_names(self):
+        items = (self.fields_list.item(i) for i in range(self.fields_list.count()))
+        return [item.text() for item in items if item.checkState() == Qt.Checked]
+
+    def run_check_action(self):
+        self.output_widget.clear_log()
+        self._setup_initial_state()
+        self.results_model.clear()
+
+        layer = self.layer_combobox.currentData()
+        if not layer: self.output_widget.log_error("Nie wybrano warstwy do sprawdzenia."); return
+        if layer.isEditable(): self.output_widget.log_error(f"Warstwa '{layer.name()}' jest w trybie edycji. Wyłącz tryb edycji, aby kontynuować."); return
+        field_names = self._selected_field_names()
+        if not field_names: self.output_widget.log_error("Nie wybrano żadnej kolumny do porównania."); return
+
+        skip_null = self.skip_null_checkbox.isChecked()
+        self.output_widget.log_info(f"Wyszukiwanie obiektów o identycznych wartościach w kolumnach: {', '.join(field_names)}...")
+
         try:
-            # Upewnij się, że atrybut 'nazwa' istnieje
-            if "nazwa" not in zakres_layer.fields().names():
-                self.output_widget.log_error("Warstwa 'zakres_zadania' nie posiada atrybutu 'nazwa'.")
-                return
+            groups = self._find_duplicates_sql(layer, field_names, skip_null)
+            if groups is None:
+                groups = self._find_duplicates(layer, field_names, skip_null)
+        except Exception as e:
+            self.output_widget.log_error(f"Wystąpił nieoczekiwany błąd: {e}")
+            self.logger.log_dev(self.FUNCTIONALITY_NAME, 0, "ERROR", str(e))
+            return
+
+        if not groups:
+            self.output_widget.log_success("Nie znaleziono obiektów o identycznych wartościach.")
+            return
+
+        groups.sort(key=lambda group: -len(group[1]))
+        self._display_results(layer, field_names, groups)
+
+        self.output_widget.log_warning(f"Znaleziono {len(groups)} grup zdublowanych wartości, obejmujących {sum(len(fids) for _, fids in groups)} obiektów.")
+        for values, fids in groups[:self.REPORTED_GROUPS]:
+            self.output_widget.log_info(f"{', '.join(_format_value(v) for v in values)}: {len(fids)} obiektów")
+        if len(groups) > self.REPORTED_GROUPS:
+            self.output_widget.log_info(f"... oraz {len(groups) - self.REPORTED_GROUPS} kolejnych grup (pełna lista w tabeli).")
+
+    def _find_duplicates(self, layer, field_names, skip_null):
+        """One pass over the selected columns (no geometry); returns [(values, fids)] of duplicated value tuples."""
+        fields = layer.fields()
+        indexes = [fields.indexOf(name) for name in field_names]
+
+        def read_values(feature):
+            attributes = feature.attributes()
+            return tuple(None if attributes[i] == NULL else attributes[i] for i in indexes)
+
+        request = QgsFeatureRequest().setFlags(QgsFeatureRequest.NoGeometry).setSubsetOfAttributes(field_names, fields)
 
-            for feature in zakres_layer.getFeatures():
-                # Dodajemy tylko te zakresy, które mają nazwę
-                if feature["nazwa"]:
-                    scopes.append((feature["nazwa"], feature.geometry()))
+        # Pierwszy przebieg przechowuje tylko skrót krotki wartości i fid pierwszego obiektu
+        first_fid = {}
+        candidates = defaultdict(list)
+        searched = 0
+        for feature in layer.getFeatures(request):
+            values = read_values(feature)
+            if skip_null and None in values:
+                continue
+            searched += 1
+            key = hash(values)
+            fid = first_fid.setdefault(key, feature.id())
+            if fid != feature.id():
+                if key not in candidates:
+                    candidates[key].append(fid)
+                candidates[key].append(feature.id())
+        self.output_widget.log_info(f"Przeszukano obiektów: {searched}")
+
+        # Potwierdzenie na pełnych wartościach (kolizje skrótów)
+        candidate_fids = [fid for fids in candidates.values() for fid in fids]
+        if not candidate_fids:
+            return []
+        groups = defaultdict(list)
+        for feature in layer.getFeatures(QgsFeatureRequest(request).setFilterFids(candidate_fids)):
+            groups[read_values(feature)].append(feature.id())
+        return [(values, fids) for values, fids in groups.items() if len(fids) > 1]
+
+    def _find_duplicates_sql(self, layer, field_names, skip_null):
+        """
+        Runs the grouping in the database for GeoPackage and PostGIS layers.
+        Returns None if the layer does not allow it (the caller then falls back to `_find_duplicates`).
+        """
+        provider = layer.dataProvider()
+        pk_indexes = provider.pkAttributeIndexes()
+        if len(pk_indexes) != 1:
+            return None
+        pk_field = layer.fields().at(pk_indexes[0])
+
+        try:
+            if provider.name() == "ogr" and provider.storageType() == "GPKG":
+                parts = QgsProviderRegistry.instance().decodeUri("ogr", layer.source())
+                table = _quote_identifier(parts.get("layerName") or "")
+                connection = QgsProviderRegistry.instance().providerMetadata("ogr").createConnection(parts["path"], {})
+                fid_list = f"group_concat({_quote_identifier(pk_field.name())})"
+            elif provider.name() == "postgres" and pk_field.type() == QVariant.Int:
+                # Tylko dla klucza int4 identyfikator obiektu w QGIS jest równy wartości klucza
+                uri = QgsDataSourceUri(layer.source())
+                table = f"{_quote_identifier(uri.schema())}.{_quote_identifier(uri.table())}" if uri.schema() else _quote_identifier(uri.table())
+                connection = QgsProviderRegistry.instance().providerMetadata("postgres").createConnection(layer.source(), {})
+                fid_list = f"string_agg(CAST({_quote_identifier(pk_field.name())} AS text), ',')"
+            else:
+                return None
+            if table == '""':
+                return None
+
+            columns = ", ".join(_quote_identifier(name) for name in field_names)
+            conditions = []
+            if layer.subsetString():
+                conditions.append(f"({layer.subsetString()})")
+            if skip_null:
+                conditions.extend(f"{_quote_identifier(name)} IS NOT NULL" for name in field_names)
+            where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+            sql = f"SELECT {columns}, {fid_list} FROM {table}{where} GROUP BY {columns} HAVING COUNT(*) > 1"
+            self.logger.log_dev(self.FUNCTIONALITY_NAME, 0, "INFO", f"SQL: {sql}")
+
+            rows = connection.executeSql(sql)
         except Exception as e:
-            self.output_widget.log_error(f"Błąd podczas wczytywania zakresów: {e}")
+            self.logger.log_dev(self.FUNCTIONALITY_NAME, 0, "INFO", f"Grouping in the database not available, falling back to Python: {e}")
+            return None
+
+        self.output_widget.log_info("Grupowanie wykonano w bazie danych warstwy.")
+        groups = []
+        for row in rows:
+            values = tuple(None if value == NULL else value for value in row[:len(field_names)])
+            groups.append((values, [int(fid) for fid in str(row[len(field_names)]).split(",")]))
+        return groups
+
+    def _display_results(self, layer, field_names, groups):
+        # Porównywane kolumny na początku, pozostałe w kolejności warstwy
+        display_field_names = list(field_names) + [name for name in layer.fields().names() if name not in field_names]
+        self.results_model.set_columns(["Grupa", "Liczba w grupie"], display_field_names, {0: _to_excel_col})
+
+        members, fixed_rows = [], []
+        for i, (_, fids) in enumerate(groups, 1):
+            for fid in fids:
+                members.append((layer, fid))
+                fixed_rows.append((i, len(fids)))
+        self.results_model.append_rows(members, fixed_rows)
+        self.results_table.resizeColumnsToContents()
+
+    def _on_select_on_layer_clicked(self):
+        selected_rows = self.results_proxy.source_rows(self.results_table.selectionModel().selectedRows())
+        if not selected_rows:
+            self.output_widget.log_warning("Nie zaznaczono żadnych obiektów w tabeli wyników.")
             return
+        layer = self.results_model.row_member(selected_rows[0])[0]
+        fids = [self.results_model.row_member(row)[1] for row in selected_rows]
+        layer.selectByIds(fids)
+        self.output_widget.log_info(f"Zaznaczono {len(fids)} obiektów na warstwie '{layer.name()}'.")
 
-        # Sortowanie listy zakresów alfabetycznie po nazwie
-        scopes.sort(key=lambda x: x[0])
+# --- Cleanup Pipeline Tab Widget ---
 
-        # Dodanie posortowanych elementów do comboboxa
-        for name, geom in scopes:
-            self.zakres_combo_box.addItem(name, geom)
+class CleanupPipelineWidget(_CleanupTabMixin, QWidget):
+    FUNCTIONALITY_NAME = "Czyszczenie / Przegląd warstwy"
 
-    def _populate_layers_combobox(self):
-        self.layer_combobox.clear()
+    def __init__(self, iface, parent=None):
+        super(CleanupPipelineWidget, self).__init__(parent)
+        self.iface = iface
+        self.logger = logger
+        self.cable_layers = []
 
-        # Load essential layers list
-        essential_layers_names = []
+        self._setup_ui_dynamically()
+        self._load_layer_groups()
+        self._connect_signals()
+        self._populate_zakres_combobox()
+        self._populate_layers_combobox()
+        self._setup_initial_state()
+
+    def _load_layer_groups(self):
+        json_path = os.path.join(os.path.dirname(__file__), '..', 'templates', 'lista_grup_warstw.json')
         try:
-            json_path = os.path.join(os.path.dirname(__file__), '..', 'templates', 'lista_grup_warstw.json')
             with open(json_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-            essential_layers_names = data.get("PROJECT_ESSENTIAL_LAYERS", [])
+                self.cable_layers = json.load(f).get('CABLE_LAYERS', [])
+        except (OSError, json.JSONDecodeError) as e:
+            self.cable_layers = []
+            self.output_widget.log_error(f"Nie udało się wczytać grup warstw z pliku .json: {e}")
+
+    def _setup_ui_dynamically(self):
+        main_layout = QVBoxLayout(self)
+
+        self.settings_groupbox = QGroupBox("Ustawienia")
+        self.settings_groupbox.setSizePolicy(QSizePolicy.Preferred, QSizePolicy.Maximum)
+        settings_layout = QVBoxLayout(self.settings_groupbox)
+
+        scope_layout = QHBoxLayout()
+        scope_layout.addWidget(QLabel("Wybierz zakres ograniczający:"))
+        self.zakres_combo_box = QComboBox()
+        self.zakres_combo_box.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Fixed)
+        scope_layout.addWidget(self.zakres_combo_box)
+        self.refresh_button = QPushButton("Odśwież")
+        scope_layout.addWidget(self.refresh_button)
+        settings_layout.addLayout(scope_layout)
+
+        layer_layout = QHBoxLayout()
+        layer_layout.addWidget(QLabel("Wybierz warstwę do sprawdzenia:"))
+        self.layer_combobox = QComboBox()
+        self.layer_combobox.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Fixed)
+        layer_layout.addWidget(self.layer_combobox)
+        self.show_all_layers_checkbox = QCheckBox("Wyświetl na liście wszystkie istniejące warstwy")
+        self.show_all_layers_checkbox.setChecked(False)
+        layer_layout.addWidget(self.show_all_layers_checkbox)
+        settings_layout.addLayout(layer_layout)
+
+        rules_groupbox = QGroupBox("Reguły (warstwa jest czytana jeden raz dla wszystkich zaznaczonych reguł)")
+        rules_layout = QVBoxLayout(rules_groupbox)
+        self.exact_duplicates_checkbox = QCheckBox(cleanup_rules.ExactDuplicatesRule.name)
+        self.exact_duplicates_checkbox.setChecked(True)
+        rules_layout.addWidget(self.exact_duplicates_checkbox)
+        tolerance_layout = QHBoxLayout()
+        self.near_duplicates_checkbox = QCheckBox(f"{cleanup_rules.NearDuplicatesRule.name}:")
+        self.tolerance_spinbox = QDoubleSpinBox()
+        self.tolerance_spinbox.setDecimals(3)
+        self.tolerance_spinbox.setRange(0.001, 10.0)
+        self.tolerance_spinbox.setSingleStep(0.01)
+        self.tolerance_spinbox.setValue(0.05)
+        self.tolerance_spinbox.setSuffix(" m")
+        tolerance_layout.addWidget(self.near_duplicates_checkbox)
+        tolerance_layout.addWidget(self.tolerance_spinbox)
+        tolerance_layout.addStretch()
+        rules_layout.addLayout(tolerance_layout)
+        self.reversed_geom_checkbox = QCheckBox("Uznaj za dubel obiekty liniowe o odwróconej kolejności wierzchołków")
+        rules_layout.addWidget(self.reversed_geom_checkbox)
+        self.feature_rule_checkboxes = []
+        for rule_class in (cleanup_rules.InvalidGeometryRule, cleanup_rules.EmptyGeometryRule,
+                           cleanup_rules.DegenerateMultipartRule, cleanup_rules.UnclosedPolygonRule):
+            checkbox = QCheckBox(rule_class.name)
+            checkbox.setChecked(True)
+            rules_layout.addWidget(checkbox)
+            self.feature_rule_checkboxes.append((checkbox, rule_class))
+        settings_layout.addWidget(rules_groupbox)
+
+        check_layout = QHBoxLayout()
+        check_layout.addStretch()
+        self.check_button = QPushButton("Uruchom przegląd")
+        check_layout.addWidget(self.check_button)
+        settings_layout.addLayout(check_layout)
+
+        self.results_groupbox = QGroupBox("Wyniki")
+        results_layout = QVBoxLayout(self.results_groupbox)
+        self.results_table = QTableView()
+        self.results_model = FeatureResultsModel(self)
+        self.results_proxy = setup_results_view(self.results_table, self.results_model)
+        results_layout.addWidget(self.results_table)
+
+        results_actions_layout = QHBoxLayout()
+        results_actions_layout.addStretch()
+        self.zoom_to_feature_button = QPushButton("Przybliż do obiektu")
+        self.delete_selected_button = QPushButton("Usuń zaznaczone")
+        results_actions_layout.addWidget(self.zoom_to_feature_button)
+        results_actions_layout.addWidget(self.delete_selected_button)
+        results_layout.addLayout(results_actions_layout)
+
+        self.output_widget_placeholder = QWidget()
+        self.output_widget = FormattedOutputWidget()
+        output_layout = QVBoxLayout(self.output_widget_placeholder)
+        output_layout.setContentsMargins(0, 0, 0, 0)
+        output_layout.addWidget(self.output_widget)
+        self.logger.set_user_message_widget(self.output_widget.output_console)
+
+        splitter = QSplitter(Qt.Vertical)
+        splitter.addWidget(self.results_groupbox)
+        splitter.addWidget(self.output_widget_placeholder)
+        splitter.setSizes([300, 150])
+
+        main_layout.addWidget(self.settings_groupbox)
+        main_layout.addWidget(splitter)
+
+    def _connect_signals(self):
+        self.refresh_button.clicked.connect(self.refresh_data)
+        self.check_button.clicked.connect(self.run_check_action)
+        self.zoom_to_feature_button.clicked.connect(self._on_zoom_to_feature_clicked)
+        self.delete_selected_button.clicked.connect(self.run_delete_selected_action)
+        self.results_table.selectionModel().selectionChanged.connect(self._update_button_states)
+        self.layer_combobox.currentIndexChanged.connect(self._on_layer_changed)
+        self.show_all_layers_checkbox.toggled.connect(self._populate_layers_combobox)
+
+    def refresh_data(self):
+        self.output_widget.log_info("Odświeżanie list...")
+        self._load_layer_groups()
+        self._populate_zakres_combobox()
+        self._populate_layers_combobox()
+        self.output_widget.log_info("Listy zostały zaktualizowane.")
+
+    def _setup_initial_state(self):
+        self.delete_selected_button.setEnabled(False)
+        self.zoom_to_feature_button.setEnabled(False)
+
+    def _update_button_states(self):
+        selected_rows_count = len(self.results_table.selectionModel().selectedRows())
+        self.delete_selected_button.setEnabled(selected_rows_count > 0)
+        self.zoom_to_feature_button.setEnabled(selected_rows_count == 1)
+
+    def _on_layer_changed(self):
+        self._setup_initial_state()
+        self.results_model.clear()
+
+    def _build_rules(self):
+        check_reversed = self.reversed_geom_checkbox.isChecked()
+        rules = []
+        if self.exact_duplicates_checkbox.isChecked():
+            rules.append(cleanup_rules.ExactDuplicatesRule(check_reversed))
+        if self.near_duplicates_checkbox.isChecked():
+            rules.append(cleanup_rules.NearDuplicatesRule(self.tolerance_spinbox.value(), check_reversed))
+        rules.extend(rule_class() for checkbox, rule_class in self.feature_rule_checkboxes if checkbox.isChecked())
+        return rules
+
+    def run_check_action(self):
+        self.output_widget.clear_log()
+        self._setup_initial_state()
+        self.results_model.clear()
+
+        layer = self.layer_combobox.currentData()
+        if not layer: self.output_widget.log_error("Nie wybrano warstwy do sprawdzenia."); return
+        if self.zakres_combo_box.count() == 0: self.output_widget.log_error("Brak dostępnych zakresów. Dodaj warstwę 'zakres_zadania'."); return
+        if layer.isEditable(): self.output_widget.log_error(f"Warstwa '{layer.name()}' jest w trybie edycji. Wyłącz tryb edycji, aby kontynuować."); return
+        rules = self._build_rules()
+        if not rules: self.output_widget.log_error("Nie zaznaczono żadnej reguły."); return
+
+        scope_geom = self.zakres_combo_box.currentData()
+        self.output_widget.log_info(f"Przegląd warstwy '{layer.name()}' ({len(rules)} reguł w jednym przebiegu)...")
+
+        self.check_button.setEnabled(False)
+        try:
+            request = QgsFeatureRequest().setFilterRect(scope_geom.boundingBox()).setNoAttributes()
+            result = cleanup_rules.run_pipeline(
+                layer, rules, request,
+                accept=lambda geom: _is_in_scope(geom, scope_geom),
+                context={"cable_layers": self.cable_layers},
+                on_batch=lambda searched: QApplication.processEvents()
+            )
         except Exception as e:
-            self.output_widget.log_error(f"OSTRZEŻENIE: Nie udało się wczytać listy warstw podstawowych z pliku .json: {e}")
+            self.output_widget.log_error(f"Wystąpił nieoczekiwany błąd: {e}")
+            self.logger.log_dev(self.FUNCTIONALITY_NAME, 0, "ERROR", str(e))
+            return
+        finally:
+            self.check_button.setEnabled(True)
+
+        self.output_widget.log_info(f"Przeszukano obiektów w zakresie zadania: {result.searched} (odczyt warstwy: {result.read_seconds:.2f} s)")
+        for rule_result in result.rule_results:
+            message = f"{rule_result.rule.name}: {len(rule_result.findings)} obiektów ({rule_result.seconds:.2f} s)"
+            if rule_result.findings:
+                self.output_widget.log_warning(message)
+            else:
+                self.output_widget.log_success(message)
+        self.logger.log_dev(self.FUNCTIONALITY_NAME, 0, "INFO", "; ".join(f"{r.rule.__class__.__name__}={r.seconds:.3f}s" for r in result.rule_results))
+
+        self._display_results(layer, result.rule_results)
+        self._update_button_states()
 
-        # Get all vector layers from the project
-        all_project_layers = [layer for layer in QgsProject.instance().mapLayers().values() if isinstance(layer, QgsVectorLayer)]
+    def _display_results(self, layer, rule_results):
+        self.results_model.set_columns(["Reguła", "Powód", "Grupa"], layer.fields().names(), {2: _to_excel_col})
+
+        # Numery grup duplikatów są kolejne w obrębie całego przeglądu
+        members, fixed_rows = [], []
+        group_offset = 0
+        for rule_result in rule_results:
+            max_group = 0
+            for finding in rule_result.findings:
+                group = None
+                if finding.group is not None:
+                    group = group_offset + finding.group
+                    max_group = max(max_group, finding.group)
+                members.append((layer, finding.fid))
+                fixed_rows.append((rule_result.rule.name, finding.reason, group))
+            group_offset += max_group
+        self.results_model.append_rows(members, fixed_rows)
+        self.results_table.resizeColumnsToContents()
 
-        if not self.show_all_layers_checkbox.isChecked():
-            # Default view: Show only essential layers
-            essential_project_layers = [layer for layer in all_project_layers if layer.name() in essential_layers_names]
-            essential_project_layers.sort(key=lambda l: l.name())
-            
-            for layer in essential_project_layers:
-                self.layer_combobox.addItem(layer.name(), layer)
-        else:
-            # Expanded view: Show all layers
-            essential_project_layers = []
-            other_project_layers = []
-            
-            for layer in all_project_layers:
-                if layer.name() in essential_layers_names:
-                    essential_project_layers.append(layer)
-                else:
-                    other_project_layers.append(layer)
+    def run_delete_selected_action(self):
+        selected_rows = self.results_proxy.source_rows(self.results_table.selectionModel().selectedRows())
+        if not selected_rows: self.output_widget.log_warning("Nie zaznaczono żadnych obiektów w tabeli wyników."); return
 
-            # Sort both lists alphabetically
-            essential_project_layers.sort(key=lambda l: l.name())
-            other_project_layers.sort(key=lambda l: l.name())
+        layer = self.results_model.row_member(selected_rows[0])[0]
+        # Ten sam obiekt może być zgłoszony przez kilka reguł
+        fids = list(dict.fromkeys(self.results_model.row_member(row)[1] for row in selected_rows))
+        reply = QMessageBox.warning(self, "Potwierdzenie usunięcia", f"Czy na pewno chcesz usunąć {len(fids)} zaznaczone obiekty? Tej operacji nie można cofnąć.", QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
+        if reply == QMessageBox.No: self.output_widget.log_info("Operacja usuwania anulowana przez użytkownika."); return
 
-            # Populate combobox
-            for layer in essential_project_layers:
-                self.layer_combobox.addItem(layer.name(), layer)
-            
-            if other_project_layers:
-                self.layer_combobox.insertSeparator(self.layer_combobox.count())
-                for layer in other_project_layers:
-                    self.layer_combobox.addItem(layer.name(), layer)
\ No newline at end of file
+        deleted, _ = _delete_in_chunks(self, layer, fids, self.output_widget)
+        self.results_model.remove_members([(layer, fid) for fid in deleted])
+        if deleted:
+            self.output_widget.log_success(f"Pomyślnie usunięto {len(deleted)} obiektów.")
+        self._update_button_states()
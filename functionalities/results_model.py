@@ -0,0 +1,258 @@
+from array import array
+from collections import OrderedDict
+
+from qgis.PyQt.QtCore import Qt, QAbstractTableModel, QModelIndex, QSortFilterProxyModel
+from qgis.core import QgsFeatureRequest, NULL
+
+
+def _display_value(value):
+    if value is None or value == NULL:
+        return ""
+    return str(value)
+
+
+class FeatureResultsModel(QAbstractTableModel):
+    """
+    Read-only table of features from one or more layers.
+
+    Rows are kept as column arrays: fid, layer slot and the values of the fixed leading columns
+    (e.g. "Grupa", "Powód"). Attribute values are not stored up front - they are read from the
+    layer in blocks of BLOCK_SIZE rows (without geometry) when the view first asks for them.
+    Sorting by an attribute column reads only that one attribute for all rows.
+    """
+    FID_ROLE = Qt.UserRole
+    SORT_ROLE = Qt.UserRole + 1
+    BLOCK_SIZE = 256
+    MAX_CACHED_BLOCKS = 64
+
+    def __init__(self, parent=None):
+        super(FeatureResultsModel, self).__init__(parent)
+        self.fixed_headers = []
+        self.field_names = []
+        self.formatters = {}
+        self.layers = []
+        self.fids = array('q')
+        self.layer_slots = array('H')
+        self.fixed_columns = []
+        self._cache = OrderedDict()
+        self._sort_keys = {}
+
+    # --- Building ---
+
+    def set_columns(self, fixed_headers, field_names, formatters=None):
+        """Clears the model and sets its columns. `formatters` maps a fixed column index to a display function."""
+        self.beginResetModel()
+        self.fixed_headers = list(fixed_headers)
+        self.field_names = list(field_names)
+        self.formatters = dict(formatters or {})
+        self.layers = []
+        self.fids = array('q')
+        self.layer_slots = array('H')
+        self.fixed_columns = [[] for _ in self.fixed_headers]
+        self._cache.clear()
+        self._sort_keys.clear()
+        self.endResetModel()
+
+    def clear(self):
+        self.set_columns([], [])
+
+    def append_rows(self, members, fixed_rows=None):
+        """Appends (layer, fid) pairs; `fixed_rows` holds the matching tuples of fixed column values."""
+        if not members:
+            return
+        first = len(self.fids)
+        self.beginInsertRows(QModelIndex(), first, first + len(members) - 1)
+        for i, (layer, fid) in enumerate(members):
+            self.fids.append(fid)
+            self.layer_slots.append(self._layer_slot(layer))
+            values = fixed_rows[i] if fixed_rows else ()
+            for col, column in enumerate(self.fixed_columns):
+                column.append(values[col] if col < len(values) else None)
+        # Ostatni, niepełny blok mógł zostać wczytany przed dopisaniem wierszy
+        self._cache.pop(first // self.BLOCK_SIZE, None)
+        self._sort_keys.clear()
+        self.endInsertRows()
+
+    def remove_members(self, members):
+        """Removes the rows of the given (layer, fid) pairs, keeping columns and sorting. Returns the number of removed rows."""
+        removed = {(layer.id(), fid) for layer, fid in members}
+        layer_ids = [layer.id() for layer in self.layers]
+        keep = [row for row, (slot, fid) in enumerate(zip(self.layer_slots, self.fids)) if (layer_ids[slot], fid) not in removed]
+        removed_count = len(self.fids) - len(keep)
+        if not removed_count:
+            return 0
+
+        self.beginResetModel()
+        self.fids = array('q', (self.fids[row] for row in keep))
+        self.layer_slots = array('H', (self.layer_slots[row] for row in keep))
+        self.fixed_columns = [[column[row] for row in keep] for column in self.fixed_columns]
+        self._cache.clear()
+        self._sort_keys.clear()
+        self.endResetModel()
+        return removed_count
+
+    def _layer_slot(self, layer):
+        for slot, known_layer in enumerate(self.layers):
+            if known_layer.id() == layer.id():
+                return slot
+        self.layers.append(layer)
+        return len(self.layers) - 1
+
+    # --- Access by source row ---
+
+    def row_member(self, row):
+        return self.layers[self.layer_slots[row]], self.fids[row]
+
+    def members(self):
+        return [(self.layers[slot], fid) for slot, fid in zip(self.layer_slots, self.fids)]
+
+    def fixed_value(self, row, col):
+        return self.fixed_columns[col][row]
+
+    def headers(self):
+        return self.fixed_headers + self.field_names
+
+    def row_values(self, row):
+        """Display values of a whole row, as shown in the table."""
+        return [self._display(row, col) for col in range(self.columnCount())]
+
+    # --- QAbstractTableModel ---
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.fids)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.fixed_headers) + len(self.field_names)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole:
+            return None
+        if orientation == Qt.Horizontal:
+            headers = self.headers()
+            return headers[section] if section < len(headers) else None
+        return str(section + 1)
+
+    def flags(self, index):
+        if not index.isValid():
+            return Qt.NoItemFlags
+        return Qt.ItemIsEnabled | Qt.ItemIsSelectable
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        row, col = index.row(), index.column()
+        if role == self.FID_ROLE:
+            return self.fids[row]
+        if role == Qt.DisplayRole:
+            return self._display(row, col)
+        if role == self.SORT_ROLE:
+            value = self._sort_value(row, col)
+            return "" if value is None or value == NULL else value
+        return None
+
+    def _display(self, row, col):
+        value = self._raw_value(row, col)
+        formatter = self.formatters.get(col)
+        if formatter is not None and value is not None:
+            return formatter(value)
+        return _display_value(value)
+
+    def _raw_value(self, row, col):
+        if col < len(self.fixed_headers):
+            return self.fixed_columns[col][row]
+        block = row // self.BLOCK_SIZE
+        values = self._cache.get(block)
+        if values is None:
+            values = self._fetch_block(block)
+        else:
+            self._cache.move_to_end(block)
+        return values[row - block * self.BLOCK_SIZE][col - len(self.fixed_headers)]
+
+    def _sort_value(self, row, col):
+        if col < len(self.fixed_headers):
+            return self.fixed_columns[col][row]
+        keys = self._sort_keys.get(col)
+        if keys is None:
+            keys = self._sort_keys[col] = self._fetch_column(self.field_names[col - len(self.fixed_headers)])
+        return keys[row]
+
+    def _fetch_column(self, field_name):
+        values = [None] * len(self.fids)
+        for slot, layer in enumerate(self.layers):
+            if field_name not in layer.fields().names():
+                continue
+            rows = {}
+            for row, (layer_slot, fid) in enumerate(zip(self.layer_slots, self.fids)):
+                if layer_slot == slot:
+                    rows.setdefault(fid, []).append(row)
+            request = QgsFeatureRequest().setFilterFids(list(rows))
+            request.setFlags(QgsFeatureRequest.NoGeometry)
+            request.setSubsetOfAttributes([field_name], layer.fields())
+            for feature in layer.getFeatures(request):
+                for row in rows.get(feature.id(), []):
+                    values[row] = feature[field_name]
+        return values
+
+    def _fetch_block(self, block):
+        start = block * self.BLOCK_SIZE
+        end = min(start + self.BLOCK_SIZE, len(self.fids))
+
+        # Jedno zapytanie (bez geometrii) na każdą warstwę występującą w bloku
+        rows_by_slot = {}
+        for row in range(start, end):
+            rows_by_slot.setdefault(self.layer_slots[row], []).append(row)
+
+        empty = [None] * len(self.field_names)
+        values = [empty] * (end - start)
+        for slot, rows in rows_by_slot.items():
+            layer = self.layers[slot]
+            layer_fields = layer.fields().names()
+            attributes = [name for name in self.field_names if name in layer_fields]
+            request = QgsFeatureRequest().setFilterFids([self.fids[row] for row in rows])
+            request.setFlags(QgsFeatureRequest.NoGeometry)
+            request.setSubsetOfAttributes(attributes, layer.fields())
+            features = {feature.id(): feature for feature in layer.getFeatures(request)}
+            for row in rows:
+                feature = features.get(self.fids[row])
+                if feature is not None:
+                    values[row - start] = [feature[name] if name in layer_fields else None for name in self.field_names]
+
+        self._cache[block] = values
+        if len(self._cache) > self.MAX_CACHED_BLOCKS:
+            self._cache.popitem(last=False)
+        return values
+
+
+class FeatureResultsProxyModel(QSortFilterProxyModel):
+    """Sorts a FeatureResultsModel by raw values (numbers numerically) instead of their display text."""
+
+    def __init__(self, source_model, parent=None):
+        super(FeatureResultsProxyModel, self).__init__(parent)
+        self.setSourceModel(source_model)
+        self.setSortRole(FeatureResultsModel.SORT_ROLE)
+
+    def source_rows(self, proxy_indexes):
+        """Maps selected view indexes to unique source rows, in view order."""
+        rows = []
+        seen = set()
+        for index in sorted(proxy_indexes, key=lambda i: i.row()):
+            row = self.mapToSource(index).row()
+            if row not in seen:
+                seen.add(row)
+                rows.append(row)
+        return rows
+
+    def ordered_source_rows(self):
+        """All source rows in the current (sorted) view order."""
+        return [self.mapToSource(self.index(row, 0)).row() for row in range(self.rowCount())]
+
+
+def setup_results_view(view, source_model):
+    """Attaches a sortable proxy over `source_model` to a QTableView and returns the proxy."""
+    proxy = FeatureResultsProxyModel(source_model, view)
+    view.setModel(proxy)
+    view.setSortingEnabled(True)
+    view.sortByColumn(-1, Qt.AscendingOrder)
+    view.setSelectionBehavior(view.SelectRows)
+    view.setEditTriggers(view.NoEditTriggers)
+    return proxy
@@ -1,30 +1,112 @@
 import os
+import sqlite3
+import hashlib
+import traceback
 from collections import defaultdict
 
 import csv
 from qgis.PyQt import uic
 from qgis.PyQt.QtWidgets import QWidget, QVBoxLayout, QApplication, QFileDialog
+from qgis.PyQt.QtGui import QTextCursor
 from qgis.core import (
+    QgsApplication,
     QgsProject,
     QgsVectorLayer,
     QgsFeature,
-    QgsGeometry,
-    QgsWkbTypes,
-    QgsSpatialIndex,
-    QgsPointXY
+    QgsPointXY,
+    NULL
 )
 
 from .base_widget import FormattedOutputWidget
 from ..core.logger import logger
+from ..core.feature_store import ScopeFeatureStore
+from ..core.geometry_hash import wkb_parts
+from ..core.line_overlaps import find_overlaps
+from ..core.adjacency import PointCells, unconnected_vertices
+from ..core.scope_matrix import build_matrix, MATRIX_GROUPINGS, COUNT
+from ..core.statistics_report import StatisticsReport, ReportSection, write_csv, write_json, write_xlsx, xlsxwriter
+from ..core.statistics_snapshots import SnapshotStore
+from ..core.geometry_hash import geometry_key
+from ..core import layer_changes
+from ..core.stats_aggregation import AGGREGATIONS, aggregate_features
+from ..core.stats_pushdown import aggregate_in_database, can_push_down
+from ..core.id_duplicates import find_duplicate_ids
 
 FORM_CLASS, _ = uic.loadUiType(os.path.join(
     os.path.dirname(__file__), '../ui/statystyka_widget.ui'))
 
+# Atrybuty (i czy potrzebna jest geometria) wczytywane dla każdej warstwy używanej w statystykach
+STATISTICS_LAYERS = {
+    "kable": (["id", "nazwa", "segment", "rodzaj", "poj", "dl_tras", "dl_inst", "MR"], True),
+    "trakt": (["id", "nazwa", "trakt", "dl_tras", "dl_inst", "MR"], True),
+    "lista_pa": (["Licz_lokal", "Licz_przed", "Licz_SED", "Rodzaj pun"], False),
+    "punkty_elastycznosci": (["id", "l_spl", "typ", "status", "rodzaj", "spl_i-rz", "spl_ii-rz", "spl_iii-rz"], True),
+    "obiekty_punktowe": (["id", "rodzaj", "status", "model"], True),
+    "obiekty_osłonowe": (["id", "rodzaj", "model", "dl_tras", "dl_inst"], False),
+    "nN_nn": (["X_wykorzystanie"], False),
+    "slupy_opl": (["X_wykorzystanie"], True),
+    "studnie_opl": (["X_wykorzystanie"], True),
+    "działki_raport": (["zgoda_dz", "wlasn_dz"], False),
+    "zakres_splitera": (["id"], False),
+}
+
+# Nagłówki metryk w zestawieniu wszystkich zakresów
+MATRIX_METRIC_TITLES = {
+    COUNT: "Ilość",
+    "dl_tras": "Dł. tras. [m]",
+    "dl_inst": "Dł. inst. [m]",
+    "l_spl": "Suma 'l_spl'",
+}
+
+# Kolory etykiet wierszy wyników wg stylu wiersza
+STYLE_COLORS = {"ok": "green", "warning": "orange", "error": "red"}
+
+EXPORT_WRITERS = {".csv": write_csv, ".json": write_json, ".xlsx": write_xlsx}
+
+# Długie tabele są pokazywane do tej liczby wierszy, reszta po kliknięciu linku "Pokaż pozostałe"
+RENDER_ROW_LIMIT = 50
+# Liczba wierszy wstawianych naraz przy rozwijaniu tabeli
+RENDER_CHUNK_SIZE = 500
+MORE_ROWS_HREF = "pokaz-wiecej:"
+
+# Warstwy, od których zależy wynik każdej sekcji - sekcja jest przeliczana tylko po zmianie którejś z nich
+SECTION_LAYERS = {
+    "dlugosci": ["kable", "trakt"],
+    "ilosci": ["lista_pa", "punkty_elastycznosci", "obiekty_punktowe", "obiekty_osłonowe", "nN_nn", "slupy_opl", "studnie_opl", "działki_raport"],
+    "nakladki": ["kable", "trakt"],
+    "stycznosci": ["kable", "trakt", "obiekty_punktowe", "punkty_elastycznosci", "studnie_opl", "slupy_opl"],
+    "id": ["kable", "trakt", "punkty_elastycznosci", "obiekty_punktowe", "obiekty_osłonowe", "zakres_splitera"],
+    "zakresy": ["zakres_zadania"] + list(MATRIX_GROUPINGS),
+}
+SNAPSHOT_DB_NAME = "statystyka_migawki.sqlite"
+ALL_SCOPES_NAME = "Wszystkie zakresy"
+
+
+def _number(value):
+    """Snapshot values are stored as REAL; whole numbers are shown without decimals."""
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+def _plain(value):
+    """Attribute value without QGIS NULL, for the typed report."""
+    return None if value is None or value == NULL else value
+
+
 class StatystykaWidget(QWidget, FORM_CLASS):
+    FUNCTIONALITY_NAME = "Statystyka"
+
     def __init__(self, iface, parent=None):
         super(StatystykaWidget, self).__init__(parent)
         self.iface = iface
         self.logger = logger
+        self.feature_store = None
+        self.report = None
+        self.collapsed_tables = {}
+        self.snapshot_store = None
+        self.last_snapshot_id = None
+        self._running = False
         self.setupUi(self)
         
         self._setup_widgets()
@@ -33,7 +115,7 @@ class StatystykaWidget(QWidget, FORM_CLASS):
         self.checkbox_full.setChecked(True)
 
     def _setup_widgets(self):
-        self.results_widget = FormattedOutputWidget()
+        self.results_widget = FormattedOutputWidget(links=True)
         results_layout = QVBoxLayout()
         results_layout.setContentsMargins(0, 0, 0, 0)
         results_layout.addWidget(self.results_widget)
@@ -51,24 +133,56 @@ class StatystykaWidget(QWidget, FORM_CLASS):
 
     def clear_active_output_widget(self):
         # This method is for the main dialog to clear both widgets
+        if self._running:
+            self.logs_widget.log_warning("Trwa generowanie statystyk. Poczekaj na jego zakończenie.")
+            return
         self.results_widget.clear_log()
         self.logs_widget.clear_log()
+        self.report = None
+        self.collapsed_tables.clear()
         self.logs_widget.log_info("Wyniki i logi zostały wyczyszczone.")
 
     def setup_connections(self):
         self.refresh_scope_button.clicked.connect(self.refresh_data)
         self.checkbox_full.stateChanged.connect(self._toggle_all_checkboxes)
+        self.checkbox_all_scopes.toggled.connect(self.scope_combobox.setDisabled)
+        self.results_widget.output_console.anchorClicked.connect(self._on_result_link_clicked)
         self.copy_button.clicked.connect(self.copy_results_to_clipboard)
-        self.export_csv_button.clicked.connect(self.export_results_to_csv)
+        self.compare_button.clicked.connect(self.compare_with_previous)
+        self.export_csv_button.clicked.connect(self.export_results)
         self.clear_results_button.clicked.connect(self.clear_results)
 
     def refresh_data(self):
         self._populate_scope_combobox()
 
+    def _set_running(self, running):
+        # processEvents() podczas renderowania obsługuje kliknięcia - przyciski działające na raporcie są wtedy nieaktywne
+        self._running = running
+        for button in (self.copy_button, self.compare_button, self.export_csv_button, self.clear_results_button):
+            button.setEnabled(not running)
+
     def run_main_action(self):
+        if self._running:
+            self.logs_widget.log_warning("Trwa generowanie statystyk. Poczekaj na jego zakończenie.")
+            return
+        self._set_running(True)
+        try:
+            self._generate_statistics()
+        finally:
+            self._set_running(False)
+
+    def _generate_statistics(self):
         self.logs_widget.clear_log()
         self.results_widget.clear_log()
         self.logs_widget.log_info("Uruchomiono generowanie statystyk...")
+        self.report = None
+        self.collapsed_tables.clear()
+
+        if self.checkbox_all_scopes.isChecked():
+            self.report = StatisticsReport(ALL_SCOPES_NAME)
+            self._run_sections([("zakresy", self._calculate_scope_matrix)], None)
+            self.logs_widget.log_success("Zakończono generowanie statystyk.")
+            return
 
         selected_scope_feature = self.scope_combobox.currentData()
         if not selected_scope_feature:
@@ -86,21 +200,138 @@ class StatystykaWidget(QWidget, FORM_CLASS):
         self.logs_widget.log_success("Walidacja pomyślna. Rozpoczynanie obliczeń...")
         self.logs_widget.log_info("<b>UWAGA!</b> Pamiętaj, że każdy obiekt liniowy (np. kabel, trakt) w zakresie zadania jest zliczany, jeśli jego wierzchołek końcowy znajduje się wewnątrz zakresu.")
 
-        if self.checkbox_lengths.isChecked():
-            self._calculate_lengths(selected_scope_feature)
-        if self.checkbox_quantities.isChecked():
-            self._calculate_quantities(selected_scope_feature)
-        if self.checkbox_overlaps.isChecked():
-            self._check_overlaps(selected_scope_feature)
-        if self.checkbox_adjacencies.isChecked():
-            self._check_adjacencies(selected_scope_feature)
-        if self.checkbox_ids.isChecked():
-            self._check_ids(selected_scope_feature)
+        self.report = StatisticsReport(self.scope_combobox.currentText())
+        # Każda warstwa jest czytana jeden raz, a wszystkie sekcje korzystają z tych samych danych
+        self.feature_store = ScopeFeatureStore(selected_scope_feature.geometry(), STATISTICS_LAYERS)
+        sections = [
+            ("dlugosci", self.checkbox_lengths, self._calculate_lengths),
+            ("ilosci", self.checkbox_quantities, self._calculate_quantities),
+            ("nakladki", self.checkbox_overlaps, self._check_overlaps),
+            ("stycznosci", self.checkbox_adjacencies, self._check_adjacencies),
+            ("id", self.checkbox_ids, self._check_ids),
+        ]
+        try:
+            self._run_sections(
+                [(key, lambda compute=compute: compute(selected_scope_feature)) for key, checkbox, compute in sections if checkbox.isChecked()],
+                selected_scope_feature,
+            )
+        finally:
+            self.feature_store = None
 
         self.logs_widget.log_success("Zakończono generowanie statystyk.")
 
+    # --- Migawki ---
+
+    def _project_key(self):
+        return QgsProject.instance().absoluteFilePath() or QgsProject.instance().title() or "(projekt niezapisany)"
+
+    def _open_snapshot_store(self):
+        if self.snapshot_store is None:
+            try:
+                directory = os.path.join(QgsApplication.qgisSettingsDirPath(), "FiberAssistant")
+                os.makedirs(directory, exist_ok=True)
+                self.snapshot_store = SnapshotStore(os.path.join(directory, SNAPSHOT_DB_NAME))
+            except (OSError, sqlite3.Error) as e:
+                self.logs_widget.log_warning(f"Nie udało się otworzyć bazy migawek statystyki: {e}")
+                self.logger.log_dev(self.FUNCTIONALITY_NAME, 0, "ERROR", f"Snapshot store: {e}\n{traceback.format_exc()}")
+        return self.snapshot_store
+
+    def _find_layer(self, layer_name):
+        layer_list = QgsProject.instance().mapLayersByName(layer_name)
+        return layer_list[0] if layer_list else None
+
+    def _section_state_hash(self, key, scope_feature):
+        """Hash of the session, the zakres and the change counters of the section's layers."""
+        parts = [layer_changes.SESSION_ID, key]
+        if scope_feature is not None:
+            parts.append(geometry_key(scope_feature.geometry().asWkb()).hex())
+            if 'MR' in scope_feature.fields().names():
+                parts.append(str(scope_feature.attribute('MR')))
+        for layer_name in SECTION_LAYERS[key]:
+            layer = self._find_layer(layer_name)
+            parts.append(f"{layer_name}:{layer.id()}:{layer_changes.revision(layer)}" if layer else f"{layer_name}:-")
+        return hashlib.sha1("|".join(parts).encode("utf-8")).hexdigest()
+
+    def _project_state_hash(self):
+        parts = []
+        for layer_name in sorted({name for names in SECTION_LAYERS.values() for name in names}):
+            layer = self._find_layer(layer_name)
+            if layer:
+                parts.append(f"{layer_name}:{layer.source()}:{layer.featureCount()}:{layer.extent().toString()}")
+        return hashlib.sha1("|".join(parts).encode("utf-8")).hexdigest()
+
+    def _run_sections(self, sections, scope_feature):
+        """
+        Runs (key, compute) sections. A section whose layers have not changed since the previous
+        snapshot of this zakres (in this session) is read from the snapshot instead of recomputed.
+        The finished report is saved as a new snapshot.
+        """
+        for layer_name in {name for key, _ in sections for name in SECTION_LAYERS[key]}:
+            layer = self._find_layer(layer_name)
+            if layer:
+                layer_changes.watch(layer)
+
+        store = self._open_snapshot_store()
+        project_key = self._project_key()
+        previous = previous_hashes = None
+        if store is not None:
+            try:
+                previous = store.latest(project_key, self.report.scope_name)
+                previous_hashes = store.section_hashes(previous.id) if previous else {}
+            except sqlite3.Error as e:
+                self.logger.log_dev(self.FUNCTIONALITY_NAME, 0, "ERROR", f"Snapshot lookup: {e}")
+
+        section_hashes = {}
+        for key, compute in sections:
+            section_hashes[key] = self._section_state_hash(key, scope_feature)
+            if previous_hashes and previous_hashes.get(key) == section_hashes[key]:
+                section = store.load_section(previous.id, key)
+                if section is not None:
+                    self.report.sections.append(section)
+                    self._render_section(section)
+                    self.logs_widget.log_info(f"Sekcja '{section.title}': warstwy bez zmian od {previous.created}, wczytano wyniki z migawki.")
+                    continue
+            compute()
+
+        if store is not None and self.report.sections:
+            try:
+                self.last_snapshot_id = store.save(project_key, self.report.scope_name, self._project_state_hash(), self.report, section_hashes)
+            except sqlite3.Error as e:
+                self.logs_widget.log_warning(f"Nie udało się zapisać migawki statystyki: {e}")
+
+    def compare_with_previous(self):
+        if self.report is None or self.last_snapshot_id is None:
+            self.logs_widget.log_warning("Brak wyników do porównania. Najpierw wygeneruj statystyki.")
+            return
+        store = self._open_snapshot_store()
+        if store is None:
+            return
+
+        previous = store.latest(self._project_key(), self.report.scope_name, before_id=self.last_snapshot_id)
+        if previous is None:
+            self.logs_widget.log_info(f"Brak wcześniejszej migawki dla zakresu '{self.report.scope_name}'.")
+            return
+
+        section = ReportSection("porownanie", f"PORÓWNANIE Z URUCHOMIENIEM {previous.created}", "&#128260;")
+        table = section.table(f"Zakres: {self.report.scope_name}", ["Tabela / grupa", "Metryka", "Poprzednio", "Teraz", "Zmiana"])
+        current_section = None
+        for delta in store.compare(previous.id, self.last_snapshot_id):
+            if delta.section != current_section:
+                current_section = delta.section
+                table.add(current_section, style="heading")
+            previous_value, current_value = _number(delta.previous), _number(delta.current)
+            change = current_value - previous_value if previous_value is not None and current_value is not None else None
+            label = f"{delta.table}: {delta.group}" if delta.group else delta.table
+            table.add((current_section, label), [delta.metric, previous_value, current_value, change], style="alert" if change is None else None)
+        if not table.rows:
+            table.add("Brak zmian względem poprzedniego uruchomienia.", style="ok")
+        self._render_section(section)
+        self.logs_widget.log_info(f"Porównano z migawką z {previous.created}.")
+
     def clear_results(self):
         self.results_widget.clear_log()
+        self.report = None
+        self.collapsed_tables.clear()
         self.logs_widget.log_info("Wyniki zostały wyczyszczone.")
 
     def _populate_scope_combobox(self):
@@ -141,55 +372,47 @@ class StatystykaWidget(QWidget, FORM_CLASS):
             cb.setChecked(is_checked)
             cb.setEnabled(not is_checked)
 
-    def _get_features_in_scope(self, layer_name, scope_geom, is_line=False, all_intersecting=False):
-        layer_list = QgsProject.instance().mapLayersByName(layer_name)
-        if not layer_list:
+    def _get_features_in_scope(self, layer_name, is_line=False, all_intersecting=False):
+        # Magazyn zakresu tworzy run_main_action - jeden na uruchomienie, wspólny dla wszystkich sekcji
+        features = self.feature_store.features(layer_name, is_line=is_line, all_intersecting=all_intersecting)
+        if features is None:
             self.logs_widget.log_warning(f"Nie znaleziono warstwy '{layer_name}'.")
             return []
-        
-        layer = layer_list[0]
-        features_in_scope = []
-        for feature in layer.getFeatures():
-            geom = feature.geometry()
-            if not geom or not geom.intersects(scope_geom):
-                continue
-
-            if all_intersecting:
-                 features_in_scope.append(feature)
-                 continue
-
-            if is_line:
-                wkb_type = geom.wkbType()
-                last_vertex_point = None
-                try:
-                    if wkb_type == QgsWkbTypes.LineString:
-                        polyline = geom.asPolyline()
-                        if polyline:
-                            last_vertex_point = polyline[-1]
-                    elif wkb_type == QgsWkbTypes.MultiLineString:
-                        multi_polyline = geom.asMultiPolyline()
-                        if multi_polyline and multi_polyline[-1]:
-                            last_vertex_point = multi_polyline[-1][-1]
-                    
-                    if last_vertex_point and QgsGeometry.fromPointXY(last_vertex_point).intersects(scope_geom):
-                        features_in_scope.append(feature)
-
-                except IndexError:
-                    continue
-            else:
-                features_in_scope.append(feature)
-        return features_in_scope
-
-    def _create_html_table(self, headers, rows, title=""):
+        return features
+
+    def _aggregate(self, layer_name, scope_geom):
+        """
+        Grouped counts and sums defined in AGGREGATIONS: {group values: [count, sum, ...]}.
+        Runs as one GROUP BY in the layer's database (GeoPackage/PostGIS), otherwise over the features in scope.
+        """
+        aggregation = AGGREGATIONS[layer_name]
+        layer = self._find_layer(layer_name)
+        if layer is None:
+            self.logs_widget.log_warning(f"Nie znaleziono warstwy '{layer_name}'.")
+            return {}
+
+        try:
+            result, sql = aggregate_in_database(layer, scope_geom, aggregation)
+        except Exception as e:
+            self.logger.log_dev(self.FUNCTIONALITY_NAME, 0, "INFO", f"Aggregation of '{layer_name}' in the database not available, falling back to Python: {e}")
+            result = None
+        if result is not None:
+            self.logger.log_dev(self.FUNCTIONALITY_NAME, 0, "INFO", f"SQL: {sql}")
+            self.logs_widget.log_info(f"Warstwa '{layer_name}': grupowanie wykonano w bazie danych warstwy.")
+            return result
+        return aggregate_features(self._get_features_in_scope(layer_name, is_line=aggregation.end_point), aggregation)
+
+    def _create_html_table(self, headers, rows, title="", continuation=False):
         html = ""
         if title:
             html += f"<h4>{title}</h4>"
         html += "<table border='1' style='border-collapse: collapse; width: 100%;'>"
         # Headers
-        html += "<tr>"
-        for header in headers:
-            html += f"<th style='padding: 5px; text-align: left;'>{header}</th>"
-        html += "</tr>"
+        if not continuation:
+            html += "<tr>"
+            for header in headers:
+                html += f"<th style='padding: 5px; text-align: left;'>{header}</th>"
+            html += "</tr>"
         # Rows
         for row in rows:
             html += "<tr>"
@@ -197,10 +420,120 @@ class StatystykaWidget(QWidget, FORM_CLASS):
                 html += f"<td style='padding: 5px;'>{cell}</td>"
             html += "</tr>"
         html += "</table>"
+        if continuation:
+            return html
         return f'<div style="background-color: #f7f7f9; border: 1px solid #e1e1e8; padding: 8px; border-radius: 4px; margin-top: 5px;">{html}</div>'
 
+    # --- Renderowanie drzewa wyników ---
+
+    def _format_cell(self, value, unit=None):
+        if value is None or value == "":
+            return ""
+        text = f"{value:.2f}" if isinstance(value, float) else str(value)
+        return f"{text} {unit}" if unit else text
+
+    def _render_table(self, table, rows=None, continuation=False):
+        if table.kind == "note":
+            lines = []
+            for row in table.rows:
+                line = row.path[-1]
+                if row.values:
+                    line += ": " + ", ".join(f"<b>{self._format_cell(value, row.unit)}</b>" for value in row.values)
+                lines.append(line)
+            return f"<div style='font-size: small; margin-left: 10px; margin-top: -5px; margin-bottom: 10px;'>INFO: {'<br>'.join(lines)}</div>"
+
+        html_rows = []
+        for row in (table.rows if rows is None else rows):
+            label = "&nbsp;&nbsp;&nbsp;&nbsp;" * (len(row.path) - 1) + str(row.path[-1])
+            cells = [self._format_cell(value, row.unit) for value in row.values]
+            if row.style == "heading":
+                label = f"<b>{label}</b>"
+                cells = [f"<b>{cell}</b>" if cell != "" else cell for cell in cells]
+            elif row.style in STYLE_COLORS:
+                label = f"<font color='{STYLE_COLORS[row.style]}'>{label}</font>"
+            elif row.style == "alert":
+                cells = [f"<font color='red'>{cell}</font>" for cell in cells]
+            html_rows.append([label] + (cells or [""]))
+        return self._create_html_table(table.headers, html_rows, title="" if continuation else table.title, continuation=continuation)
+
+    def _render_section(self, section):
+        """Appends the section table by table, long tables cut to RENDER_ROW_LIMIT rows, letting the UI repaint in between."""
+        console = self.results_widget.output_console
+        console.append(f'<h3><br>{section.icon} {section.title}</h3>')
+
+        long_tables = [table for table in section.tables if len(table.rows) > RENDER_ROW_LIMIT]
+        if long_tables:
+            summary = ", ".join(f"{table.title} ({len(table.rows)} wierszy)" for table in long_tables)
+            console.append(f"<div style='font-size: small;'>Długie tabele pokazano do {RENDER_ROW_LIMIT} pierwszych wierszy: {summary}</div>")
+
+        for table in section.tables:
+            if len(table.rows) <= RENDER_ROW_LIMIT:
+                console.append(self._render_table(table))
+            else:
+                key = f"{MORE_ROWS_HREF}{id(table)}"
+                self.collapsed_tables[key] = table
+                console.append(self._render_table(table, table.rows[:RENDER_ROW_LIMIT]))
+                console.append(f"<a href='{key}'>Pokaż pozostałe wiersze ({len(table.rows) - RENDER_ROW_LIMIT})</a>")
+            QApplication.processEvents()
+
+    def _on_result_link_clicked(self, url):
+        if self._running:
+            return
+        key = url.toString()
+        table = self.collapsed_tables.pop(key, None)
+        if table is None:
+            return
+        cursor = self._find_link(key)
+        if cursor is None:
+            return
+
+        # Link jest zastępowany pozostałymi wierszami, wstawianymi w porcjach jako kontynuacja tabeli (bez nagłówka i ramki)
+        cursor.removeSelectedText()
+        rest = table.rows[RENDER_ROW_LIMIT:]
+        self._set_running(True)
+        try:
+            for start in range(0, len(rest), RENDER_CHUNK_SIZE):
+                cursor.insertHtml(self._render_table(table, rest[start:start + RENDER_CHUNK_SIZE], continuation=True))
+                QApplication.processEvents()
+        finally:
+            self._set_running(False)
+
+    def _find_link(self, href):
+        """Returns a cursor selecting the text of the link `href` in the results, or None."""
+        document = self.results_widget.output_console.document()
+        block = document.lastBlock()
+        while block.isValid():
+            iterator = block.begin()
+            while not iterator.atEnd():
+                fragment = iterator.fragment()
+                if fragment.isValid() and fragment.charFormat().anchorHref() == href:
+                    cursor = QTextCursor(document)
+                    cursor.setPosition(fragment.position())
+                    cursor.setPosition(fragment.position() + fragment.length(), QTextCursor.KeepAnchor)
+                    return cursor
+                iterator += 1
+            block = block.previous()
+        return None
+
+    def _add_mr_note(self, section, layer_name, scope_geom, scope_mr):
+        features_in_scope_geom = self._get_features_in_scope(layer_name, all_intersecting=True)
+        unique_mr_in_scope = set()
+        for f in features_in_scope_geom:
+            mr_val = f.attribute('MR')
+            if mr_val:
+                unique_mr_in_scope.add(str(mr_val))
+
+        note = section.table(f"Warstwa: {layer_name} (diagnostyka MR)", kind="note")
+        note.add("Wartość 'MR' w zakresie zadania", [_plain(scope_mr)])
+        if unique_mr_in_scope:
+            note.add("Unikalne wartości 'MR' znalezione wewnątrz geometrii zakresu", [", ".join(sorted(unique_mr_in_scope))])
+        else:
+            note.add("Nie znaleziono żadnych obiektów z wartością 'MR' wewnątrz geometrii zakresu.")
+
+    # --- Sekcje ---
+
     def _calculate_lengths(self, scope_feature):
-        final_html_parts = ['<h3><br>&#128207; A) DŁUGOŚCI</h3>']
+        section = self.report.section("dlugosci", "A) DŁUGOŚCI", "&#128207;")
         scope_geom = scope_feature.geometry()
         scope_mr = scope_feature.attribute('MR') if 'MR' in scope_feature.fields().names() else None
 
@@ -212,23 +545,14 @@ class StatystykaWidget(QWidget, FORM_CLASS):
         else:
             cable_layer = cable_layer[0]
             
-            stats_basic = defaultdict(lambda: defaultdict(lambda: defaultdict(lambda: {'count': 0, 'dl_tras': 0, 'dl_inst': 0})))
-            stats_mr = defaultdict(lambda: defaultdict(lambda: defaultdict(lambda: {'count': 0, 'dl_tras': 0, 'dl_inst': 0})))
+            stats_basic = defaultdict(lambda: defaultdict(lambda: defaultdict(lambda: {'count': 0, 'dl_tras': 0.0, 'dl_inst': 0.0})))
+            stats_mr = defaultdict(lambda: defaultdict(lambda: defaultdict(lambda: {'count': 0, 'dl_tras': 0.0, 'dl_inst': 0.0})))
 
-            features_basic = self._get_features_in_scope(layer_name, scope_geom, is_line=True)
-            for f in features_basic:
-                segment = f.attribute('segment') or "BRAK"
-                rodzaj = f.attribute('rodzaj') or "BRAK"
-                poj = str(f.attribute('poj')) if f.attribute('poj') else "BRAK"
-                dl_tras = f.attribute('dl_tras') or 0
-                dl_inst = f.attribute('dl_inst') or 0
-                
-                stats_basic[segment][rodzaj][poj]['count'] += 1
-                stats_basic[segment][rodzaj][poj]['dl_tras'] += dl_tras
-                stats_basic[segment][rodzaj][poj]['dl_inst'] += dl_inst
+            for (segment, rodzaj, poj), (count, dl_tras, dl_inst) in self._aggregate(layer_name, scope_geom).items():
+                stats_basic[segment][rodzaj][poj] = {'count': count, 'dl_tras': float(dl_tras), 'dl_inst': float(dl_inst)}
 
             if scope_mr:
-                for f in cable_layer.getFeatures():
+                for f in self.feature_store.matching(layer_name, 'MR', scope_mr) or []:
                     if f.attribute('MR') and str(f.attribute('MR')) == str(scope_mr):
                         segment = f.attribute('segment') or "BRAK"
                         rodzaj = f.attribute('rodzaj') or "BRAK"
@@ -240,44 +564,27 @@ class StatystykaWidget(QWidget, FORM_CLASS):
                         stats_mr[segment][rodzaj][poj]['dl_tras'] += dl_tras
                         stats_mr[segment][rodzaj][poj]['dl_inst'] += dl_inst
 
-            def format_cable_report_rows(stats):
-                rows = []
+            def add_cable_rows(table, stats):
                 for segment, rodzaje in sorted(stats.items()):
                     seg_count = sum(d['count'] for r in rodzaje.values() for d in r.values())
                     seg_tras = sum(d['dl_tras'] for r in rodzaje.values() for d in r.values())
                     seg_inst = sum(d['dl_inst'] for r in rodzaje.values() for d in r.values())
-                    rows.append([f"<b>Segment '{segment}'</b>", f"<b>{seg_count}</b>", f"<b>{seg_tras:.2f}</b>", f"<b>{seg_inst:.2f}</b>"])
+                    segment_path = (f"Segment '{segment}'",)
+                    table.add(segment_path, [seg_count, seg_tras, seg_inst], style="heading")
                     for rodzaj, pojemnosci in sorted(rodzaje.items()):
                         rodz_count = sum(d['count'] for d in pojemnosci.values())
                         rodz_tras = sum(d['dl_tras'] for d in pojemnosci.values())
                         rodz_inst = sum(d['dl_inst'] for d in pojemnosci.values())
-                        rows.append([f"&nbsp;&nbsp;&nbsp;&nbsp;Rodzaj '{rodzaj}'", rodz_count, f"{rodz_tras:.2f}", f"{rodz_inst:.2f}"])
+                        rodzaj_path = segment_path + (f"Rodzaj '{rodzaj}'",)
+                        table.add(rodzaj_path, [rodz_count, rodz_tras, rodz_inst])
                         for poj, data in sorted(pojemnosci.items()):
-                            rows.append([f"&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;Pojemność '{poj}'", data['count'], f"{data['dl_tras']:.2f}", f"{data['dl_inst']:.2f}"])
-                return rows
+                            table.add(rodzaj_path + (f"Pojemność '{poj}'",), [data['count'], float(data['dl_tras']), float(data['dl_inst'])])
 
             headers = ["Typ", "Ilość", "Dł. tras. [m]", "Dł. inst. [m]"]
-            cable_rows = format_cable_report_rows(stats_basic)
-            final_html_parts.append(self._create_html_table(headers, cable_rows, title="Warstwa: kable (Metoda podstawowa)"))
+            add_cable_rows(section.table("Warstwa: kable (Metoda podstawowa)", headers), stats_basic)
             if scope_mr:
-                cable_rows_mr = format_cable_report_rows(stats_mr)
-                final_html_parts.append(self._create_html_table(headers, cable_rows_mr, title="Warstwa: kable (Metoda MR)"))
-                
-                features_in_scope_geom = self._get_features_in_scope(layer_name, scope_geom, all_intersecting=True)
-                unique_mr_in_scope = set()
-                for f in features_in_scope_geom:
-                    mr_val = f.attribute('MR')
-                    if mr_val:
-                        unique_mr_in_scope.add(str(mr_val))
-                
-                diagnostic_html = "<div style='font-size: small; margin-left: 10px; margin-top: -5px; margin-bottom: 10px;'>"
-                diagnostic_html += f"INFO: Wartość 'MR' w zakresie zadania: <b>{scope_mr}</b><br>"
-                if unique_mr_in_scope:
-                    diagnostic_html += f"Unikalne wartości 'MR' znalezione wewnątrz geometrii zakresu: <b>{', '.join(sorted(list(unique_mr_in_scope)))}</b>"
-                else:
-                    diagnostic_html += "Nie znaleziono żadnych obiektów z wartością 'MR' wewnątrz geometrii zakresu."
-                diagnostic_html += "</div>"
-                final_html_parts.append(diagnostic_html)
+                add_cable_rows(section.table("Warstwa: kable (Metoda MR)", headers), stats_mr)
+                self._add_mr_note(section, layer_name, scope_geom, scope_mr)
 
         # --- TRAKT ---
         layer_name = "trakt"
@@ -298,118 +605,84 @@ class StatystykaWidget(QWidget, FORM_CLASS):
             stats_basic = {}
             stats_mr = {}
 
-            features_basic = self._get_features_in_scope(layer_name, scope_geom, is_line=True)
-            for f in features_basic:
-                group = f.attribute('trakt') or "BRAK"
-                if group not in stats_basic:
-                    stats_basic[group] = {'count': 0, 'dl_tras': 0, 'dl_inst': 0}
-                stats_basic[group]['count'] += 1
-                if has_dl_tras:
-                    stats_basic[group]['dl_tras'] += f.attribute('dl_tras') or 0
-                if has_dl_inst:
-                    stats_basic[group]['dl_inst'] += f.attribute('dl_inst') or 0
+            for (group,), (count, dl_tras, dl_inst) in self._aggregate(layer_name, scope_geom).items():
+                stats_basic[group] = {'count': count, 'dl_tras': float(dl_tras) if has_dl_tras else 0.0, 'dl_inst': float(dl_inst) if has_dl_inst else 0.0}
 
             if scope_mr:
-                for f in trakt_layer.getFeatures():
+                for f in self.feature_store.matching(layer_name, 'MR', scope_mr) or []:
                     if f.attribute('MR') and str(f.attribute('MR')) == str(scope_mr):
                         group = f.attribute('trakt') or "BRAK"
                         if group not in stats_mr:
-                            stats_mr[group] = {'count': 0, 'dl_tras': 0, 'dl_inst': 0}
+                            stats_mr[group] = {'count': 0, 'dl_tras': 0.0, 'dl_inst': 0.0}
                         stats_mr[group]['count'] += 1
                         if has_dl_tras:
                             stats_mr[group]['dl_tras'] += f.attribute('dl_tras') or 0
                         if has_dl_inst:
                             stats_mr[group]['dl_inst'] += f.attribute('dl_inst') or 0
 
-            def format_trakt_report_rows(stats):
-                rows = []
+            def add_trakt_rows(table, stats):
                 total_count = sum(d['count'] for d in stats.values())
                 total_tras = sum(d['dl_tras'] for d in stats.values())
                 total_inst = sum(d['dl_inst'] for d in stats.values())
                 for group, data in sorted(stats.items()):
-                    rows.append([f"Grupa '{group}'", data['count'], f"{data['dl_tras']:.2f}", f"{data['dl_inst']:.2f}"])
-                rows.append([f"<b>Suma całkowita</b>", f"<b>{total_count}</b>", f"<b>{total_tras:.2f}</b>", f"<b>{total_inst:.2f}</b>"])
-                return rows
+                    table.add(f"Grupa '{group}'", [data['count'], float(data['dl_tras']), float(data['dl_inst'])])
+                table.add("Suma całkowita", [total_count, float(total_tras), float(total_inst)], style="heading")
 
             headers = ["Grupa", "Ilość", "Dł. tras. [m]", "Dł. inst. [m]"]
-            trakt_rows = format_trakt_report_rows(stats_basic)
-            final_html_parts.append(self._create_html_table(headers, trakt_rows, title="Warstwa: trakt (Metoda podstawowa)"))
+            add_trakt_rows(section.table("Warstwa: trakt (Metoda podstawowa)", headers), stats_basic)
             if scope_mr:
-                trakt_rows_mr = format_trakt_report_rows(stats_mr)
-                final_html_parts.append(self._create_html_table(headers, trakt_rows_mr, title="Warstwa: trakt (Metoda MR)"))
-
-                features_in_scope_geom = self._get_features_in_scope(layer_name, scope_geom, all_intersecting=True)
-                unique_mr_in_scope = set()
-                for f in features_in_scope_geom:
-                    mr_val = f.attribute('MR')
-                    if mr_val:
-                        unique_mr_in_scope.add(str(mr_val))
-                
-                diagnostic_html = "<div style='font-size: small; margin-left: 10px; margin-top: -5px; margin-bottom: 10px;'>"
-                diagnostic_html += f"INFO: Wartość 'MR' w zakresie zadania: <b>{scope_mr}</b><br>"
-                if unique_mr_in_scope:
-                    diagnostic_html += f"Unikalne wartości 'MR' znalezione wewnątrz geometrii zakresu: <b>{', '.join(sorted(list(unique_mr_in_scope)))}</b>"
-                else:
-                    diagnostic_html += "Nie znaleziono żadnych obiektów z wartością 'MR' wewnątrz geometrii zakresu."
-                diagnostic_html += "</div>"
-                final_html_parts.append(diagnostic_html)
+                add_trakt_rows(section.table("Warstwa: trakt (Metoda MR)", headers), stats_mr)
+                self._add_mr_note(section, layer_name, scope_geom, scope_mr)
 
-        self.results_widget.output_console.append("<br>".join(final_html_parts))
+        self._render_section(section)
 
     def _calculate_quantities(self, scope_feature):
-        final_html_parts = ['<h3><br>&#128200; B) ILOŚCI</h3>']
+        section = self.report.section("ilosci", "B) ILOŚCI", "&#128200;")
         scope_geom = scope_feature.geometry()
+        metric_headers = ["Metryka", "Wartość"]
 
-        # --- lista_pa ---
-        features = self._get_features_in_scope("lista_pa", scope_geom)
-        if features:
-            rows = []
-            total_count = len(features)
-            sum_lokal = sum(f.attribute('Licz_lokal') or 0 for f in features)
-            sum_przed = sum(f.attribute('Licz_przed') or 0 for f in features)
-            sum_sed = sum(f.attribute('Licz_SED') or 0 for f in features)
-            
-            rows.append(["Ilość obiektów w zakresie", total_count])
-            rows.append(["Suma 'Licz_lokal'", sum_lokal])
-            rows.append(["Suma 'Licz_przed'", sum_przed])
-            rows.append(["Suma 'Licz_SED'", sum_sed])
+        # Warstwy sekcji są niezależne - wczytywane równolegle, a wyniki dodawane poniżej w stałej kolejności
+        # (lista_pa z bazy danych nie wymaga wczytania obiektów)
+        layer_names = [name for name in SECTION_LAYERS["ilosci"] if not (name == "lista_pa" and can_push_down(self._find_layer(name)))]
+        self.feature_store.preload(layer_names)
 
-            stats_rodzaj = defaultdict(int)
-            for f in features:
-                rodzaj = f.attribute('Rodzaj pun') or "BRAK"
-                stats_rodzaj[rodzaj] += 1
-            
-            rows.append(["<b>Podział wg 'Rodzaj_pun':</b>", ""])
-            for rodzaj, count in sorted(stats_rodzaj.items()):
-                rows.append([f"&nbsp;&nbsp;&nbsp;&nbsp;'{rodzaj}'", f"{count} obiektów"])
-            
-            final_html_parts.append(self._create_html_table(["Metryka", "Wartość"], rows, title="Warstwa: lista_pa"))
+        # --- lista_pa ---
+        groups = self._aggregate("lista_pa", scope_geom)
+        if groups:
+            table = section.table("Warstwa: lista_pa", metric_headers)
+            table.add("Ilość obiektów w zakresie", [sum(row[0] for row in groups.values())])
+            table.add("Suma 'Licz_lokal'", [sum(row[1] for row in groups.values())])
+            table.add("Suma 'Licz_przed'", [sum(row[2] for row in groups.values())])
+            table.add("Suma 'Licz_SED'", [sum(row[3] for row in groups.values())])
+
+            heading = ("Podział wg 'Rodzaj_pun':",)
+            table.add(heading, style="heading")
+            for (rodzaj,), row in sorted(groups.items()):
+                table.add(heading + (f"'{rodzaj}'",), [row[0]], unit="obiektów")
 
         # --- punkty_elastycznosci ---
-        features = self._get_features_in_scope("punkty_elastycznosci", scope_geom)
-        if features:
-            rows = []
-            total_count = len(features)
-            sum_lspl = sum(f.attribute('l_spl') or 0 for f in features)
-            
-            rows.append(["Ilość obiektów w zakresie", total_count])
-            rows.append(["Suma 'l_spl'", sum_lspl])
+        groups = self._aggregate("punkty_elastycznosci", scope_geom)
+        if groups:
+            table = section.table("Warstwa: punkty_elastycznosci", metric_headers)
+            table.add("Ilość obiektów w zakresie", [sum(row[0] for row in groups.values())])
+            table.add("Suma 'l_spl'", [sum(row[1] for row in groups.values())])
 
             stats_group = defaultdict(lambda: defaultdict(lambda: defaultdict(int)))
-            for f in features:
-                typ = f.attribute('typ') or "BRAK"
-                status = f.attribute('status') or "BRAK"
-                rodzaj = f.attribute('rodzaj') or "BRAK"
-                stats_group[typ][status][rodzaj] += 1
+            for (typ, status, rodzaj), row in groups.items():
+                stats_group[typ][status][rodzaj] += row[0]
             
-            rows.append(["<b>Podział wg 'typ' -> 'status' -> 'rodzaj':</b>", ""])
+            table.add("Podział wg 'typ' -> 'status' -> 'rodzaj':", style="heading")
             for typ, statuses in sorted(stats_group.items()):
-                rows.append([f"<b>Typ '{typ}'</b>", ""])
+                typ_path = (f"Typ '{typ}'",)
+                table.add(typ_path, style="heading")
                 for status, rodzaje in sorted(statuses.items()):
-                    rows.append([f"&nbsp;&nbsp;&nbsp;&nbsp;Status '{status}'", ""])
+                    status_path = typ_path + (f"Status '{status}'",)
+                    table.add(status_path)
                     for rodzaj, count in sorted(rodzaje.items()):
-                        rows.append([f"&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;Rodzaj '{rodzaj}'", f"{count} obiektów"])
+                        table.add(status_path + (f"Rodzaj '{rodzaj}'",), [count], unit="obiektów")
 
+            # Walidacja sprawdza pojedyncze obiekty, więc zawsze korzysta z obiektów w zakresie
+            features = self._get_features_in_scope("punkty_elastycznosci")
             l_spl_errors = 0
             splitter_logic_errors = 0
             for f in features:
@@ -429,17 +702,15 @@ class StatystykaWidget(QWidget, FORM_CLASS):
                 elif non_brak_splitters == 3 and (l_spl is None or l_spl <= 2):
                      splitter_logic_errors += 1
 
-            rows.append(["<b>Walidacja:</b>", ""])
-            rows.append(["Ilość obiektów z 'l_spl' poza zakresem 0-3", f"<font color='red'>{l_spl_errors}</font>"])
-            rows.append(["Ilość obiektów z błędną logiką liczby spliterów", f"<font color='red'>{splitter_logic_errors}</font>"])
-
-            final_html_parts.append(self._create_html_table(["Metryka", "Wartość"], rows, title="Warstwa: punkty_elastycznosci"))
+            table.add("Walidacja:", style="heading")
+            table.add("Ilość obiektów z 'l_spl' poza zakresem 0-3", [l_spl_errors], style="alert")
+            table.add("Ilość obiektów z błędną logiką liczby spliterów", [splitter_logic_errors], style="alert")
 
         # --- obiekty_punktowe ---
-        features = self._get_features_in_scope("obiekty_punktowe", scope_geom)
+        features = self._get_features_in_scope("obiekty_punktowe")
         if features:
-            rows = []
-            rows.append([f"Ilość obiektów w zakresie: {len(features)}", ""])
+            table = section.table("Warstwa: obiekty_punktowe", metric_headers)
+            table.add("Ilość obiektów w zakresie", [len(features)])
             
             stats_group = defaultdict(lambda: defaultdict(lambda: defaultdict(int)))
             for f in features:
@@ -448,20 +719,21 @@ class StatystykaWidget(QWidget, FORM_CLASS):
                 model = f.attribute('model') or "BRAK"
                 stats_group[rodzaj][status][model] += 1
 
-            rows.append(["<b>Podział wg 'rodzaj' -> 'status' -> 'model':</b>", ""])
+            table.add("Podział wg 'rodzaj' -> 'status' -> 'model':", style="heading")
             for rodzaj, statuses in sorted(stats_group.items()):
-                rows.append([f"<b>Rodzaj '{rodzaj}'</b>", ""])
+                rodzaj_path = (f"Rodzaj '{rodzaj}'",)
+                table.add(rodzaj_path, style="heading")
                 for status, modele in sorted(statuses.items()):
-                    rows.append([f"&nbsp;&nbsp;&nbsp;&nbsp;Status '{status}'", ""])
+                    status_path = rodzaj_path + (f"Status '{status}'",)
+                    table.add(status_path)
                     for model, count in sorted(modele.items()):
-                        rows.append([f"&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;Model '{model}'", f"{count} obiektów"])
-            final_html_parts.append(self._create_html_table(["Metryka", "Wartość"], rows, title="Warstwa: obiekty_punktowe"))
+                        table.add(status_path + (f"Model '{model}'",), [count], unit="obiektów")
 
         # --- obiekty_osłonowe ---
-        features = self._get_features_in_scope("obiekty_osłonowe", scope_geom, is_line=True)
+        features = self._get_features_in_scope("obiekty_osłonowe", is_line=True)
         if features:
-            rows = []
-            stats_group = defaultdict(lambda: defaultdict(lambda: {'count': 0, 'dl_tras': 0, 'dl_inst': 0}))
+            table = section.table("Warstwa: obiekty_osłonowe", ["Typ", "Ilość", "Dł. tras. [m]", "Dł. inst. [m]"])
+            stats_group = defaultdict(lambda: defaultdict(lambda: {'count': 0, 'dl_tras': 0.0, 'dl_inst': 0.0}))
             for f in features:
                 rodzaj = f.attribute('rodzaj') or "BRAK"
                 model = f.attribute('model') or "BRAK"
@@ -469,32 +741,29 @@ class StatystykaWidget(QWidget, FORM_CLASS):
                 stats_group[rodzaj][model]['dl_tras'] += f.attribute('dl_tras') or 0
                 stats_group[rodzaj][model]['dl_inst'] += f.attribute('dl_inst') or 0
             
-            rows.append(["<b>Podział wg 'rodzaj' -> 'model':</b>", "", "", ""])
+            table.add("Podział wg 'rodzaj' -> 'model':", style="heading")
             for rodzaj, modele in sorted(stats_group.items()):
                 rodzaj_count = sum(d['count'] for d in modele.values())
                 rodzaj_tras = sum(d['dl_tras'] for d in modele.values())
                 rodzaj_inst = sum(d['dl_inst'] for d in modele.values())
-                rows.append([f"<b>Rodzaj '{rodzaj}'</b>", f"{rodzaj_count}", f"{rodzaj_tras:.2f}", f"{rodzaj_inst:.2f}"])
+                rodzaj_path = (f"Rodzaj '{rodzaj}'",)
+                table.add(rodzaj_path, [rodzaj_count, float(rodzaj_tras), float(rodzaj_inst)], style="heading")
                 for model, data in sorted(modele.items()):
-                    rows.append([f"&nbsp;&nbsp;&nbsp;&nbsp;Model '{model}'", data['count'], f"{data['dl_tras']:.2f}", f"{data['dl_inst']:.2f}"])
-            final_html_parts.append(self._create_html_table(["Typ", "Ilość", "Dł. tras. [m]", "Dł. inst. [m]"], rows, title="Warstwa: obiekty_osłonowe"))
+                    table.add(rodzaj_path + (f"Model '{model}'",), [data['count'], float(data['dl_tras']), float(data['dl_inst'])])
 
         # --- Warstwy z wykorzystaniem infrastruktury ---
         for layer_name in ["nN_nn", "slupy_opl", "studnie_opl"]:
-            features = self._get_features_in_scope(layer_name, scope_geom, all_intersecting=True)
+            features = self._get_features_in_scope(layer_name, all_intersecting=True)
             if features:
-                rows = []
-                total_count = len(features)
-                wykorzystane_count = sum(1 for f in features if f.attribute('X_wykorzystanie') == 'TAK')
-                rows.append(["Ilość obiektów w zakresie", total_count])
-                rows.append(["Ilość z 'X_wykorzystanie' = TAK", wykorzystane_count])
-                final_html_parts.append(self._create_html_table(["Metryka", "Wartość"], rows, title=f"Warstwa: {layer_name}"))
+                table = section.table(f"Warstwa: {layer_name}", metric_headers)
+                table.add("Ilość obiektów w zakresie", [len(features)])
+                table.add("Ilość z 'X_wykorzystanie' = TAK", [sum(1 for f in features if f.attribute('X_wykorzystanie') == 'TAK')])
 
         # --- dzialki_raport ---
-        features = self._get_features_in_scope("działki_raport", scope_geom)
+        features = self._get_features_in_scope("działki_raport")
         if features:
-            rows = []
-            rows.append([f"Ilość obiektów w zakresie: {len(features)}", ""])
+            table = section.table("Warstwa: działki_raport", metric_headers)
+            table.add("Ilość obiektów w zakresie", [len(features)])
 
             stats_group = defaultdict(lambda: defaultdict(int))
             for f in features:
@@ -502,18 +771,48 @@ class StatystykaWidget(QWidget, FORM_CLASS):
                 wlasnosc = f.attribute('wlasn_dz') or "BRAK"
                 stats_group[zgoda][wlasnosc] += 1
             
-            rows.append(["<b>Podział wg 'zgoda_dz' -> 'wlasn_dz':</b>", ""])
+            table.add("Podział wg 'zgoda_dz' -> 'wlasn_dz':", style="heading")
             for zgoda, wlasnosci in sorted(stats_group.items()):
-                rows.append([f"<b>Zgoda '{zgoda}'</b>", ""])
+                zgoda_path = (f"Zgoda '{zgoda}'",)
+                table.add(zgoda_path, style="heading")
                 for wlasnosc, count in sorted(wlasnosci.items()):
-                    rows.append([f"&nbsp;&nbsp;&nbsp;&nbsp;Własność '{wlasnosc}'", f"{count} obiektów"])
-            final_html_parts.append(self._create_html_table(["Metryka", "Wartość"], rows, title="Warstwa: działki_raport"))
+                    table.add(zgoda_path + (f"Własność '{wlasnosc}'",), [count], unit="obiektów")
         
-        self.results_widget.output_console.append("<br>".join(final_html_parts))
+        self._render_section(section)
+
+    def _calculate_scope_matrix(self):
+        self.logs_widget.log_info("<b>UWAGA!</b> Obiekt liniowy jest przypisywany do zakresu, w którym znajduje się jego wierzchołek końcowy.")
+        matrix = build_matrix(QgsProject.instance())
+        if matrix is None:
+            self.logs_widget.log_error("Nie znaleziono warstwy 'zakres_zadania' z atrybutem 'nazwa'. Przerwano operację.")
+            return
+        if not matrix.scope_names:
+            self.logs_widget.log_warning("Warstwa 'zakres_zadania' nie zawiera zakresów z nazwą.")
+            return
+
+        section = self.report.section("zakresy", f"ZESTAWIENIE ZAKRESÓW ({len(matrix.scope_names)})", "&#128202;")
+        for layer_name, grouping in MATRIX_GROUPINGS.items():
+            if layer_name not in matrix.metrics:
+                self.logs_widget.log_warning(f"Nie znaleziono warstwy '{layer_name}'.")
+                continue
+            group_title = " -> ".join(f"'{name}'" for name in grouping.group_fields)
+            for metric in matrix.metrics[layer_name]:
+                title = f"Warstwa: {layer_name} - {MATRIX_METRIC_TITLES.get(metric, metric)} (podział wg {group_title})"
+                table = section.table(title, ["Grupa"] + matrix.scope_names + ["Suma"])
+                for depth, path, values in matrix.rows(layer_name, metric):
+                    if metric != COUNT:
+                        values = [float(value) for value in values]
+                    style = "heading" if depth == 0 and len(grouping.group_fields) > 1 else None
+                    table.add(path, values + [sum(values)], style=style)
+                if not table.rows:
+                    table.add("Brak obiektów w zakresach.", [""] * (len(table.headers) - 1))
+            if matrix.unassigned[layer_name]:
+                self.logs_widget.log_info(f"Warstwa '{layer_name}': {matrix.unassigned[layer_name]} obiektów poza zakresami.")
+
+        self._render_section(section)
 
     def _check_overlaps(self, scope_feature):
-        final_html_parts = ['<h3><br>&#128230; C) NAKŁADKI</h3>']
-        scope_geom = scope_feature.geometry()
+        section = self.report.section("nakladki", "C) NAKŁADKI", "&#128230;")
         
         for layer_name in ["kable", "trakt"]:
             layer = QgsProject.instance().mapLayersByName(layer_name)
@@ -522,71 +821,38 @@ class StatystykaWidget(QWidget, FORM_CLASS):
                 continue
             layer = layer[0]
 
-            features = self._get_features_in_scope(layer_name, scope_geom, is_line=True, all_intersecting=True)
+            features = self._get_features_in_scope(layer_name, is_line=True, all_intersecting=True)
             if not features:
-                rows = [["Brak obiektów w zakresie.", ""]]
-                final_html_parts.append(self._create_html_table([], rows, title=f"Warstwa: {layer_name}"))
+                section.table(f"Warstwa: {layer_name}").add("Brak obiektów w zakresie.")
                 continue
 
-            index = QgsSpatialIndex()
-            feat_map = {}
-            for f in features:
-                index.addFeature(f)
-                feat_map[f.id()] = f
+            feat_map = {f.id(): f for f in features}
+            overlaps = find_overlaps((f.id(), wkb_parts(f.wkb())) for f in features)
+            overlapping_fids = {fid for pair in overlaps for fid in pair}
 
-            overlapping_fids = set()
-            
-            for feat1 in features:
-                candidate_ids = index.intersects(feat1.geometry().boundingBox())
-                for fid in candidate_ids:
-                    if feat1.id() >= fid:
-                        continue
-                    
-                    feat2 = feat_map.get(fid)
-                    if not feat2:
-                        continue
-
-                    intersection = feat1.geometry().intersection(feat2.geometry())
-                    if not intersection.isEmpty() and intersection.wkbType() in [QgsWkbTypes.LineString, QgsWkbTypes.MultiLineString]:
-                        overlapping_fids.add(feat1.id())
-                        overlapping_fids.add(feat2.id())
-
-            rows = []
-            if overlapping_fids:
-                headers = ["ID", "Nazwa", "Dł. tras. [m]"]
-                rows.append([f"<font color='red'>Znaleziono {len(overlapping_fids)} nakładających się obiektów:</font>", "", ""])
-                for fid in overlapping_fids:
-                    f = feat_map.get(fid)
-                    if f:
-                        dl_tras_val = f.attribute('dl_tras')
-                        try:
-                            dl_tras_formatted = f"{float(dl_tras_val):.2f}"
-                        except (TypeError, ValueError):
-                            dl_tras_formatted = "0.00"
-                        rows.append([f.attribute("id"), f.attribute("nazwa"), dl_tras_formatted])
-                final_html_parts.append(self._create_html_table(headers, rows, title=f"Warstwa: {layer_name}"))
+            if overlaps:
+                table = section.table(f"Warstwa: {layer_name}", ["ID", "Nazwa", "ID", "Nazwa", "Dł. nakładki [m]"])
+                table.add(f"Znaleziono {len(overlapping_fids)} nakładających się obiektów ({len(overlaps)} par):", ["", "", "", ""], style="error")
+                for (fid1, fid2), length in sorted(overlaps.items(), key=lambda item: -item[1]):
+                    f1, f2 = feat_map[fid1], feat_map[fid2]
+                    table.add(_plain(f1.attribute("id")), [_plain(f1.attribute("nazwa")), _plain(f2.attribute("id")), _plain(f2.attribute("nazwa")), length])
             else:
-                rows.append(["<font color='green'>Brak nakładających się obiektów.</font>", ""])
-                final_html_parts.append(self._create_html_table([], rows, title=f"Warstwa: {layer_name}"))
+                section.table(f"Warstwa: {layer_name}").add("Brak nakładających się obiektów.", style="ok")
         
-        self.results_widget.output_console.append("<br>".join(final_html_parts))
+        self._render_section(section)
 
     def _check_adjacencies(self, scope_feature):
-        final_html_parts = ['<h3><br>&#128279; D) STYCZNOŚCI</h3>']
-        scope_geom = scope_feature.geometry()
+        section = self.report.section("stycznosci", "D) STYCZNOŚCI", "&#128279;")
         infra_layers = ['obiekty_punktowe', 'punkty_elastycznosci', 'studnie_opl', 'slupy_opl']
         
-        infra_features = []
+        infra_cells = PointCells()
         for layer_name in infra_layers:
-            infra_features.extend(self._get_features_in_scope(layer_name, scope_geom, all_intersecting=True))
+            for f in self._get_features_in_scope(layer_name, all_intersecting=True):
+                infra_cells.add_parts((layer_name, f.id()), wkb_parts(f.wkb()))
 
-        if not infra_features:
+        if not len(infra_cells):
             self.logs_widget.log_warning("Brak warstw infrastruktury do sprawdzania styczności.")
             return
-            
-        infra_index = QgsSpatialIndex()
-        for f in infra_features:
-            infra_index.addFeature(f)
 
         for layer_name in ["kable", "trakt"]:
             layer = QgsProject.instance().mapLayersByName(layer_name)
@@ -595,101 +861,125 @@ class StatystykaWidget(QWidget, FORM_CLASS):
                 continue
             layer = layer[0]
 
-            features = self._get_features_in_scope(layer_name, scope_geom, is_line=True)
+            features = self._get_features_in_scope(layer_name, is_line=True)
             if not features:
-                rows = [["Brak obiektów w zakresie.", ""]]
-                final_html_parts.append(self._create_html_table([], rows, title=f"Warstwa: {layer_name}"))
+                section.table(f"Warstwa: {layer_name}").add("Brak obiektów w zakresie.")
                 continue
 
             unconnected_features = []
             for f in features:
-                geom = f.geometry()
-                is_connected = True
-                for vertex in geom.vertices():
-                    vertex_geom = QgsGeometry(vertex)
-                    # Use a small buffer for intersection check to handle precision issues
-                    if not infra_index.intersects(vertex_geom.buffer(0.1, 5).boundingBox()):
-                        is_connected = False
-                        break
-                if not is_connected:
-                    unconnected_features.append(f)
+                vertices = unconnected_vertices(wkb_parts(f.wkb()), infra_cells)
+                if vertices:
+                    unconnected_features.append((f, len(vertices)))
             
-            rows = []
             if unconnected_features:
-                headers = ["ID", "Nazwa", "Dł. tras. [m]"]
-                rows.append([f"<font color='red'>Znaleziono {len(unconnected_features)} obiektów z wierzchołkami bez styczności:</font>", "", ""])
-                for f in unconnected_features:
+                table = section.table(f"Warstwa: {layer_name}", ["ID", "Nazwa", "Dł. tras. [m]", "Wierzchołki bez styczności"])
+                table.add(f"Znaleziono {len(unconnected_features)} obiektów z wierzchołkami bez styczności:", ["", "", ""], style="error")
+                for f, vertex_count in unconnected_features:
                      dl_tras_val = f.attribute('dl_tras')
                      try:
-                         dl_tras_formatted = f"{float(dl_tras_val):.2f}"
+                         dl_tras = float(dl_tras_val)
                      except (TypeError, ValueError):
-                         dl_tras_formatted = "0.00"
-                     rows.append([f.attribute("id"), f.attribute("nazwa"), dl_tras_formatted])
-                final_html_parts.append(self._create_html_table(headers, rows, title=f"Warstwa: {layer_name}"))
+                         dl_tras = 0.0
+                     table.add(_plain(f.attribute("id")), [_plain(f.attribute("nazwa")), dl_tras, vertex_count])
             else:
-                rows.append(["<font color='green'>Wszystkie obiekty mają zachowaną styczność.</font>", ""])
-                final_html_parts.append(self._create_html_table([], rows, title=f"Warstwa: {layer_name}"))
+                section.table(f"Warstwa: {layer_name}").add("Wszystkie obiekty mają zachowaną styczność.", style="ok")
         
-        self.results_widget.output_console.append("<br>".join(final_html_parts))
+        self._render_section(section)
 
 
     def _check_ids(self, scope_feature):
-        final_html_parts = ['<h3><br>&#128273; E) ID</h3>']
+        section = self.report.section("id", "E) ID", "&#128273;")
         scope_geom = scope_feature.geometry()
         layers_to_check = ["kable", "trakt", "punkty_elastycznosci", "obiekty_punktowe", "obiekty_osłonowe", "zakres_splitera"]
 
         for layer_name in layers_to_check:
-            rows = []
             layer_list = QgsProject.instance().mapLayersByName(layer_name)
             if not layer_list:
-                rows.append([f"<font color='orange'>Nie znaleziono warstwy.</font>", ""])
-                final_html_parts.append(self._create_html_table([], rows, title=f"Warstwa: {layer_name}"))
+                section.table(f"Warstwa: {layer_name}").add("Nie znaleziono warstwy.", style="warning")
                 continue
 
             layer = layer_list[0]
             if 'id' not in layer.fields().names():
-                rows.append([f"<font color='orange'>Warstwa nie posiada atrybutu 'id'.</font>", ""])
-                final_html_parts.append(self._create_html_table([], rows, title=f"Warstwa: {layer_name}"))
+                section.table(f"Warstwa: {layer_name}").add("Warstwa nie posiada atrybutu 'id'.", style="warning")
                 continue
 
-            features = self._get_features_in_scope(layer_name, scope_geom, all_intersecting=True)
-            if not features:
-                rows.append(["Brak obiektów w zakresie.", ""])
-                final_html_parts.append(self._create_html_table([], rows, title=f"Warstwa: {layer_name}"))
+            # Strumień samego atrybutu 'id' - obiekty nie są wczytywane do magazynu zakresu
+            result = find_duplicate_ids(layer, 'id', scope_geom)
+            if not result.has_features:
+                section.table(f"Warstwa: {layer_name}").add("Brak obiektów w zakresie.")
                 continue
 
-            ids = defaultdict(list)
-            missing_id_count = 0
-            for f in features:
-                fid = f.attribute('id')
-                if fid:
-                    ids[fid].append(f.id())
-                else:
-                    missing_id_count += 1
-            
-            duplicates = {k: v for k, v in ids.items() if len(v) > 1}
+            missing_id_count = result.missing_count
+            duplicates = result.duplicates
 
-            rows.append(["Unikalne ID", len(ids)])
+            table = section.table(f"Warstwa: {layer_name}", ["Metryka", "Wartość", "Obiekty (fid)"])
+            table.add("Unikalne ID", [result.unique_count])
             if missing_id_count > 0:
-                rows.append([f"<font color='red'>Brakujące ID</font>", missing_id_count])
+                table.add("Brakujące ID", [missing_id_count], style="error")
             
             if duplicates:
-                rows.append([f"<font color='red'>Powielone ID ({len(duplicates)}):</font>", ""])
-                for dup_id, fids in duplicates.items():
-                    rows.append([f"&nbsp;&nbsp;&nbsp;&nbsp;ID '{dup_id}'", f"występuje {len(fids)} razy"])
+                heading = (f"Powielone ID ({len(duplicates)}):",)
+                table.add(heading, style="error")
+                for dup_id, fids in duplicates:
+                    table.add(heading + (f"ID '{dup_id}'",), [len(fids), ", ".join(str(fid) for fid in fids)])
             
             if missing_id_count == 0 and not duplicates:
-                 rows.append(["<font color='green'>Wszystkie obiekty posiadają unikalne ID.</font>", ""])
-
-            final_html_parts.append(self._create_html_table(["Metryka", "Wartość"], rows, title=f"Warstwa: {layer_name}"))
+                 table.add("Wszystkie obiekty posiadają unikalne ID.", style="ok")
         
-        self.results_widget.output_console.append("<br>".join(final_html_parts))
+        self._render_section(section)
+
+    # --- Kopiowanie i eksport ---
 
     def copy_results_to_clipboard(self):
-        QApplication.clipboard().setText(self.results_widget.get_text_for_copy())
+        if self.report is None or self.report.is_empty():
+            QApplication.clipboard().setText(self.results_widget.get_text_for_copy())
+            self.logs_widget.log_success("Wyniki skopiowano do schowka.")
+            return
+
+        # Wartości rozdzielone tabulatorami - po wklejeniu do arkusza trafiają do osobnych komórek
+        lines = []
+        for section in self.report.sections:
+            lines.append(section.title)
+            for table in section.tables:
+                lines.append(table.title)
+                if table.headers:
+                    lines.append("\t".join(table.headers))
+                for row in table.rows:
+                    label = "    " * (len(row.path) - 1) + str(row.path[-1])
+                    lines.append("\t".join([label] + [self._format_cell(value, row.unit) for value in row.values]))
+                lines.append("")
+        QApplication.clipboard().setText("\n".join(lines))
         self.logs_widget.log_success("Wyniki skopiowano do schowka.")
 
-    def export_results_to_csv(self):
-        self.logs_widget.log_info("Funkcjonalność eksportu do CSV jest w trakcie implementacji.")
-        # TODO: Implement export to CSV
-        pass
+    def export_results(self):
+        if self.report is None or self.report.is_empty():
+            self.logs_widget.log_warning("Brak wyników do wyeksportowania. Najpierw wygeneruj statystyki.")
+            return
+
+        file_path, selected_filter = QFileDialog.getSaveFileName(
+            self, "Eksportuj wyniki statystyki", "", "Plik CSV (*.csv);;Plik JSON (*.json);;Plik Excel (*.xlsx)"
+        )
+        if not file_path:
+            self.logs_widget.log_info("Operacja anulowana przez użytkownika.")
+            return
+
+        extension = os.path.splitext(file_path)[1].lower()
+        if extension not in EXPORT_WRITERS:
+            extension = ".json" if "json" in selected_filter else ".xlsx" if "xlsx" in selected_filter else ".csv"
+            file_path += extension
+
+        if extension == ".xlsx" and xlsxwriter is None:
+            self.logs_widget.log_error(
+                "Eksport do .xlsx wymaga biblioteki 'xlsxwriter', która nie jest zainstalowana.\n"
+                "Zainstaluj ją (użyj polecenia 'pip install xlsxwriter' w konsoli OSGeo4W) "
+                "lub użyj eksportu do .csv albo .json."
+            )
+            return
+
+        try:
+            count = EXPORT_WRITERS[extension](self.report, file_path)
+            self.logs_widget.log_success(f"Wyeksportowano {count} wierszy wyników do pliku: {file_path}")
+        except Exception as e:
+            self.logs_widget.log_error(f"Wystąpił nieoczekiwany błąd podczas eksportu: {e}")
+            self.logger.log_dev(self.FUNCTIONALITY_NAME, 0, "ERROR", f"Błąd eksportu statystyki: {e}\n{traceback.format_exc()}")
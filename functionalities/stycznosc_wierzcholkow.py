@@ -1,30 +1,37 @@
 import os
 import json
-import math
+import hashlib
 from collections import defaultdict
 
 from qgis.PyQt import uic
+from qgis.PyQt.QtCore import QVariant
 from qgis.PyQt.QtWidgets import QWidget, QCheckBox, QVBoxLayout
 from qgis.core import (
     QgsProject,
     QgsFeature,
+    QgsField,
     QgsFeatureRequest,
     QgsGeometry,
     QgsPointXY,
     QgsWkbTypes,
     QgsSpatialIndex,
     QgsVectorLayer,
+    QgsVectorDataProvider,
+    QgsRectangle,
     QgsCoordinateTransform
 )
 
 from .base_widget import FormattedOutputWidget
 from ..core.logger import logger
+from ..core.segment_index import SegmentIndex
+from ..core import vertex_check
 
 FORM_CLASS, _ = uic.loadUiType(os.path.join(
     os.path.dirname(__file__), '../ui/stycznosc_wierzcholkow_widget.ui'))
 
 class StycznoscWierzcholkowWidget(QWidget, FORM_CLASS):
     FUNCTIONALITY_NAME = "Styczność wierzchołków"
+    GEOMETRY_WRITE_CHUNK = 1000
 
     def __init__(self, iface, parent=None):
         super().__init__(parent)
@@ -42,6 +49,11 @@ class StycznoscWierzcholkowWidget(QWidget, FORM_CLASS):
         self.infra_checkboxes_pe = []
         self.trakty_group_checkboxes = {}
         self.pe_group_checkboxes = {}
+        self.trakt_layer_names = []
+
+        # Wyniki ostatniego sprawdzenia: (id warstwy, zakres, typ) -> obiekty z pełną stycznością
+        self.check_baselines = {}
+        self._tracked_layer_ids = set()
 
         self._setup_output_widget()
         self._populate_layer_lists()
@@ -82,6 +94,7 @@ class StycznoscWierzcholkowWidget(QWidget, FORM_CLASS):
         self.output_widget.log_info(f"Znaleziono {self.zakres_combo_box.count()} zakresów.")
 
     def _populate_layer_lists(self):
+        self._load_trakt_layer_names()
         self._populate_infra_layers(self.verticalLayout_infra_kable, self.infra_checkboxes_kable)
         self._populate_infra_layers(self.verticalLayout_infra_trakty, self.infra_checkboxes_trakty)
         self._populate_infra_layers(self.verticalLayout_infra_pe, self.infra_checkboxes_pe)
@@ -105,6 +118,16 @@ class StycznoscWierzcholkowWidget(QWidget, FORM_CLASS):
         except Exception as e:
             self.output_widget.log_error(f"Błąd podczas wczytywania warstw infrastruktury: {e}")
 
+    def _load_trakt_layer_names(self):
+        try:
+            json_path = os.path.join(os.path.dirname(__file__), '..', 'templates', 'lista_grup_warstw.json')
+            with open(json_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            self.trakt_layer_names = data.get("TRAKT_LAYERS", [])
+        except Exception as e:
+            self.trakt_layer_names = []
+            self.output_widget.log_error(f"Błąd podczas wczytywania warstw traktów: {e}")
+
     def _populate_groups(self, layer_name, field, checkbox_dict, layout):
         layer = self.project.mapLayersByName(layer_name)
         if not layer:
@@ -128,10 +151,12 @@ class StycznoscWierzcholkowWidget(QWidget, FORM_CLASS):
         # Kable tab
         self.checkBox_auto_fix_kable.toggled.connect(self._handle_auto_fix_kable_toggled)
         self.checkBox_disable_range_kable.toggled.connect(self._handle_disable_range_kable)
+        self.checkBox_snap_segment_kable.toggled.connect(self._handle_snap_segment_kable)
 
         # Trakty tab
         self.checkBox_auto_fix_trakty.toggled.connect(self._handle_auto_fix_trakty_toggled)
         self.checkBox_disable_range_trakty.toggled.connect(self._handle_disable_range_trakty)
+        self.checkBox_snap_segment_trakty.toggled.connect(self._handle_snap_segment_trakty)
 
         # PE tab
         self.checkBox_auto_fix_pe.toggled.connect(self._handle_auto_fix_pe_toggled)
@@ -143,12 +168,16 @@ class StycznoscWierzcholkowWidget(QWidget, FORM_CLASS):
         self.spinBox_max_dist_kable.setEnabled(False)
         self.checkBox_disable_range_kable.setEnabled(False)
         self.checkBox_disable_range_kable.setChecked(False)
+        self.checkBox_snap_segment_kable.setEnabled(False)
+        self.checkBox_insert_vertex_kable.setEnabled(False)
         
         # Trakty tab
         self.label_max_dist_trakty.setEnabled(False)
         self.spinBox_max_dist_trakty.setEnabled(False)
         self.checkBox_disable_range_trakty.setEnabled(False)
         self.checkBox_disable_range_trakty.setChecked(False)
+        self.checkBox_snap_segment_trakty.setEnabled(False)
+        self.checkBox_insert_vertex_trakty.setEnabled(False)
 
         # PE tab
         self.label_max_dist_pe.setEnabled(False)
@@ -160,6 +189,8 @@ class StycznoscWierzcholkowWidget(QWidget, FORM_CLASS):
         self.label_max_dist_kable.setEnabled(checked)
         self.spinBox_max_dist_kable.setEnabled(checked)
         self.checkBox_disable_range_kable.setEnabled(checked)
+        self.checkBox_snap_segment_kable.setEnabled(checked)
+        self.checkBox_insert_vertex_kable.setEnabled(checked and self.checkBox_snap_segment_kable.isChecked())
         if checked:
             self.spinBox_max_dist_kable.setEnabled(not self.checkBox_disable_range_kable.isChecked())
         
@@ -167,6 +198,8 @@ class StycznoscWierzcholkowWidget(QWidget, FORM_CLASS):
         self.label_max_dist_trakty.setEnabled(checked)
         self.spinBox_max_dist_trakty.setEnabled(checked)
         self.checkBox_disable_range_trakty.setEnabled(checked)
+        self.checkBox_snap_segment_trakty.setEnabled(checked)
+        self.checkBox_insert_vertex_trakty.setEnabled(checked and self.checkBox_snap_segment_trakty.isChecked())
         if checked:
             self.spinBox_max_dist_trakty.setEnabled(not self.checkBox_disable_range_trakty.isChecked())
 
@@ -186,6 +219,12 @@ class StycznoscWierzcholkowWidget(QWidget, FORM_CLASS):
     def _handle_disable_range_pe(self, checked):
         self.spinBox_max_dist_pe.setEnabled(not checked)
 
+    def _handle_snap_segment_kable(self, checked):
+        self.checkBox_insert_vertex_kable.setEnabled(checked and self.checkBox_auto_fix_kable.isChecked())
+
+    def _handle_snap_segment_trakty(self, checked):
+        self.checkBox_insert_vertex_trakty.setEnabled(checked and self.checkBox_auto_fix_trakty.isChecked())
+
     def run_main_action(self):
         self.output_widget.clear_log()
         current_tab_index = self.tabWidget.currentIndex()
@@ -218,8 +257,12 @@ class StycznoscWierzcholkowWidget(QWidget, FORM_CLASS):
         auto_fix = self.checkBox_auto_fix_kable.isChecked()
         limit_distance = not self.checkBox_disable_range_kable.isChecked()
         max_distance = self.spinBox_max_dist_kable.value()
+        snap_to_segment = auto_fix and self.checkBox_snap_segment_kable.isChecked()
+        insert_vertices = snap_to_segment and self.checkBox_insert_vertex_kable.isChecked()
+        incremental = self.checkBox_incremental_kable.isChecked()
+        output_layer = self.checkBox_output_layer_kable.isChecked()
         
-        self._run_check_logic(layer, scope_geom, auto_fix, limit_distance, max_distance, 'kable')
+        self._run_check_logic(layer, scope_geom, auto_fix, limit_distance, max_distance, 'kable', snap_to_segment, insert_vertices, incremental, output_layer)
 
     def run_trakty_check(self):
         self.output_widget.log_info("Rozpoczynam sprawdzanie styczności dla: Trakty...")
@@ -236,8 +279,12 @@ class StycznoscWierzcholkowWidget(QWidget, FORM_CLASS):
         auto_fix = self.checkBox_auto_fix_trakty.isChecked()
         limit_distance = not self.checkBox_disable_range_trakty.isChecked()
         max_distance = self.spinBox_max_dist_trakty.value()
+        snap_to_segment = auto_fix and self.checkBox_snap_segment_trakty.isChecked()
+        insert_vertices = snap_to_segment and self.checkBox_insert_vertex_trakty.isChecked()
+        incremental = self.checkBox_incremental_trakty.isChecked()
+        output_layer = self.checkBox_output_layer_trakty.isChecked()
 
-        self._run_check_logic(layer, scope_geom, auto_fix, limit_distance, max_distance, 'trakty')
+        self._run_check_logic(layer, scope_geom, auto_fix, limit_distance, max_distance, 'trakty', snap_to_segment, insert_vertices, incremental, output_layer)
 
     def run_pe_check(self):
         self.output_widget.log_info("Rozpoczynam sprawdzanie styczności dla: PE...")
@@ -254,10 +301,12 @@ class StycznoscWierzcholkowWidget(QWidget, FORM_CLASS):
         auto_fix = self.checkBox_auto_fix_pe.isChecked()
         limit_distance = not self.checkBox_disable_range_pe.isChecked()
         max_distance = self.spinBox_max_dist_pe.value()
+        incremental = self.checkBox_incremental_pe.isChecked()
+        output_layer = self.checkBox_output_layer_pe.isChecked()
 
-        self._run_check_logic(layer, scope_geom, auto_fix, limit_distance, max_distance, 'pe')
+        self._run_check_logic(layer, scope_geom, auto_fix, limit_distance, max_distance, 'pe', incremental=incremental, output_layer=output_layer)
 
-    def _run_check_logic(self, layer, scope_geom, auto_fix, limit_distance, max_distance, check_type):
+    def _run_check_logic(self, layer, scope_geom, auto_fix, limit_distance, max_distance, check_type, snap_to_segment=False, insert_vertices=False, incremental=False, output_layer=False):
         # --- CRS Handling Setup ---
         source_crs = layer.crs()
         target_crs = self.project.crs()
@@ -283,8 +332,33 @@ class StycznoscWierzcholkowWidget(QWidget, FORM_CLASS):
             scope_transformer = QgsCoordinateTransform(scope_crs, target_crs, self.project)
             scope_geom_metric.transform(scope_transformer)
 
+        infra_checkboxes = getattr(self, f"infra_checkboxes_{check_type}")
+        infra_layers = [self.project.mapLayersByName(cb.text())[0] for cb in infra_checkboxes if cb.isChecked() and self.project.mapLayersByName(cb.text())]
+
+        # Warstwy, których zmiana może zepsuć styczność wcześniej poprawnych obiektów
+        context_layers = list(infra_layers)
+        if check_type in ['kable', 'pe']:
+            context_layers.extend(self.project.mapLayersByName("lista_pa"))
+        if check_type == 'kable':
+            context_layers.extend(self.project.mapLayersByName("punkty_elastycznosci"))
+        if snap_to_segment:
+            for layer_name in self.trakt_layer_names:
+                context_layers.extend(self.project.mapLayersByName(layer_name))
+
+        baseline_key = (layer.id(), self.zakres_combo_box.currentText(), check_type)
+        baseline_settings = (tuple(sorted(l.id() for l in context_layers)), snap_to_segment)
+        baseline = self.check_baselines.get(baseline_key) if incremental else None
+        if incremental and (baseline is None or baseline['settings'] != baseline_settings):
+            self.output_widget.log_info("Brak wyników poprzedniego sprawdzenia dla tych ustawień. Zostaną sprawdzone wszystkie obiekty.")
+            baseline = None
+        dirty_index = self._build_dirty_index(baseline)
+
         # Etap 2: Skanowanie w celu identyfikacji obiektów do przetworzenia
         features_to_process = []
+        records = []
+        feature_hashes = {}
+        passed_hashes = {}
+        skipped_unchanged = 0
         metric_geometries_to_combine = [scope_geom_metric]
         
         # Przygotowanie transformacji dla geometrii z warstwy, jeśli jest potrzebna
@@ -300,11 +374,28 @@ class StycznoscWierzcholkowWidget(QWidget, FORM_CLASS):
                 feature_geom.transform(feature_transformer)
 
             if self._is_in_scope(feature_geom, scope_geom_metric):
+                group_name = self._get_group_name(feature, check_type)
+                feature_hash = self._feature_hash(feature, group_name)
+                feature_hashes[feature.id()] = feature_hash
+                if baseline is not None and self._is_unchanged(baseline, dirty_index, feature, feature_hash, feature_geom):
+                    passed_hashes[feature.id()] = feature_hash
+                    skipped_unchanged += 1
+                    continue
                 features_to_process.append(feature)
+                records.append((feature.id(), bytes(feature_geom.asWkb()), group_name))
                 metric_geometries_to_combine.append(feature_geom)
 
         # Etap 3: Budowa kontekstu - tworzenie rozszerzonego obszaru poszukiwań
         self.output_widget.log_info(f"Znaleziono {len(features_to_process)} obiektów do analizy. Budowanie kontekstu...")
+        if skipped_unchanged:
+            self.output_widget.log_info(f"Pominięto {skipped_unchanged} obiektów bez zmian od ostatniego sprawdzenia.")
+        if not features_to_process:
+            stats = self._init_stats()
+            stats['skipped_unchanged'] = skipped_unchanged
+            self._store_baseline(baseline_key, baseline_settings, layer, context_layers, passed_hashes)
+            self.output_widget.log_info("Zakończono sprawdzanie.")
+            self._log_stats(stats, check_type)
+            return
 
         # Combine geometries using a more robust method
         valid_geometries = []
@@ -322,8 +413,6 @@ class StycznoscWierzcholkowWidget(QWidget, FORM_CLASS):
         query_geom = combined_geom.buffer(5.0, 5)
 
         # Etap 3: Pobieranie punktów z rozszerzonego obszaru
-        infra_checkboxes = getattr(self, f"infra_checkboxes_{check_type}")
-        infra_layers = [self.project.mapLayersByName(cb.text())[0] for cb in infra_checkboxes if cb.isChecked() and self.project.mapLayersByName(cb.text())]
         infra_points = self._get_points_from_layers(infra_layers, query_geom, target_crs)
 
         pa_points, pe_points = set(), set()
@@ -338,59 +427,274 @@ class StycznoscWierzcholkowWidget(QWidget, FORM_CLASS):
         
         self.output_widget.log_info(f"Znaleziono {len(infra_points)} punktów infrastruktury, {len(pa_points)} punktów PA, {len(pe_points)} punktów PE w rozszerzonym zakresie.")
 
+        segment_index = None
+        if snap_to_segment:
+            segment_index = self._build_segment_index(query_geom, target_crs)
+
         # Etap 4: Analiza
         stats = self._init_stats()
-        layer.startEditing()
-        try:
-            for feature in features_to_process:
-                new_geom, stats_update = self._process_feature(feature, layer, infra_points, pa_points, pe_points, auto_fix, limit_distance, max_distance, check_type)
-                
-                if stats_update:
-                    self._update_stats(stats, stats_update)
-                    if stats_update.get('fixed', 0) > 0:
-                        # Transform geometry back to original CRS before saving
-                        if transform_needed:
-                            reverse_transformer = QgsCoordinateTransform(target_crs, source_crs, self.project)
-                            new_geom.transform(reverse_transformer)
-                        layer.changeGeometry(feature.id(), new_geom)
+        stats['skipped_unchanged'] = skipped_unchanged
+        vertex_insertions = defaultdict(list)
+        findings = []
+        results = self._check_vertices(records, layer, infra_points, pa_points, pe_points, auto_fix, limit_distance, max_distance, check_type, segment_index)
+        features_by_id = {feature.id(): feature for feature in features_to_process}
+        fixed_geometries = {}
+        for result in results:
+            feature = features_by_id[result['fid']]
+            new_geom, stats_update = self._apply_check_result(feature, result, check_type)
+            
+            if stats_update:
+                for hit in stats_update.pop('segment_hits', []):
+                    if insert_vertices:
+                        vertex_insertions[hit.layer].append(hit)
+                feature_findings = stats_update.pop('findings', [])
+                if output_layer and feature_findings:
+                    nazwa_val = feature.attribute('nazwa') if check_type in ['kable', 'pe'] else None
+                    feature_info = (feature.id(), feature.attribute('id'), nazwa_val, stats_update['group'])
+                    findings.extend(feature_info + finding for finding in feature_findings)
+                if not stats_update.get('fixed') and not stats_update.get('non_coincident') and not stats_update.get('skipped_other'):
+                    passed_hashes[feature.id()] = feature_hashes[feature.id()]
+                self._update_stats(stats, stats_update)
+                if stats_update.get('fixed', 0) > 0:
+                    fixed_geometries[feature.id()] = new_geom
+                    if not output_layer:
                         self._log_fixed_feature(feature, stats_update['fixed'], check_type)
-                    
-                    if stats_update.get('non_coincident', 0) > 0:
-                        self._log_non_coincident_feature(feature, stats_update['non_coincident'], check_type, stats_update.get('missing_endpoints'), stats_update.get('non_coincident_indices'))
-        finally:
-            layer.commitChanges()
+                
+                if stats_update.get('non_coincident', 0) > 0 and not output_layer:
+                    self._log_non_coincident_feature(feature, stats_update['non_coincident'], check_type, stats_update.get('missing_endpoints'), stats_update.get('non_coincident_indices'))
+
+        if fixed_geometries:
+            # Transform geometries back to original CRS before saving
+            if transform_needed:
+                reverse_transformer = QgsCoordinateTransform(target_crs, source_crs, self.project)
+                for new_geom in fixed_geometries.values():
+                    new_geom.transform(reverse_transformer)
+            self._write_geometries(layer, fixed_geometries)
+
+        for target_layer, hits in vertex_insertions.items():
+            if target_layer.isEditable():
+                self.output_widget.log_warning(f"Warstwa '{target_layer.name()}' jest w trybie edycji. Pominięto wstawianie wierzchołków do tej warstwy.")
+                continue
+            target_layer.startEditing()
+            try:
+                stats['inserted_vertices'] += self._insert_vertices(target_layer, hits, target_crs)
+            finally:
+                target_layer.commitChanges()
+
+        self._store_baseline(baseline_key, baseline_settings, layer, context_layers, passed_hashes)
+
+        if output_layer:
+            self._create_findings_layer(findings, check_type, target_crs)
         
         self.output_widget.log_info("Zakończono sprawdzanie.")
         self._log_stats(stats, check_type)
 
-    def _process_feature(self, feature, layer, infra_points, pa_points, pe_points, auto_fix, limit_distance, max_distance, check_type):
-        source_crs = layer.crs()
-        target_crs = self.project.crs()
+    def _feature_hash(self, feature, group_name):
+        # Grupa obiektu wpływa na zasady sprawdzania, dlatego wchodzi do skrótu razem z geometrią
+        data = bytes(feature.geometry().asWkb()) + str(group_name).encode('utf-8')
+        return hashlib.blake2b(data, digest_size=16).digest()
 
-        if source_crs != target_crs:
-            transformer = QgsCoordinateTransform(source_crs, target_crs, self.project)
-            geom = QgsGeometry(feature.geometry())
-            geom.transform(transformer)
-        else:
-            geom = feature.geometry()
+    def _is_unchanged(self, baseline, dirty_index, feature, feature_hash, feature_geom):
+        if baseline['passed'].get(feature.id()) != feature_hash or feature.id() in baseline['dirty_fids']:
+            return False
+        if dirty_index is not None and dirty_index.intersects(feature_geom.boundingBox().buffered(0.01)):
+            return False
+        return True
 
-        stats_update = defaultdict(int)
+    def _build_dirty_index(self, baseline):
+        if baseline is None or not baseline['dirty_areas']:
+            return None
+        dirty_index = QgsSpatialIndex()
+        for i, rect in enumerate(baseline['dirty_areas']):
+            dirty_index.addFeature(i, rect)
+        return dirty_index
+
+    def _store_baseline(self, baseline_key, baseline_settings, layer, context_layers, passed_hashes):
+        self.check_baselines[baseline_key] = {
+            'settings': baseline_settings,
+            'passed': passed_hashes,
+            'context_layer_ids': {l.id() for l in context_layers},
+            'dirty_fids': set(),
+            'dirty_areas': []
+        }
+        for tracked_layer in [layer] + context_layers:
+            self._track_layer_edits(tracked_layer)
 
-        group_name = "BRAK"
-        if check_type == 'kable':
-            group_name = feature.attribute('rodzaj') or "BRAK"
-        elif check_type == 'trakty':
-            group_name = feature.attribute('trakt') or "BRAK"
-        elif check_type == 'pe':
-            group_name = feature.attribute('typ') or "BRAK"
-        stats_update['group'] = group_name
+    def _track_layer_edits(self, layer):
+        if layer.id() in self._tracked_layer_ids:
+            return
+        self._tracked_layer_ids.add(layer.id())
+        layer.geometryChanged.connect(lambda fid, geom, l=layer: self._on_tracked_layer_edited(l, [fid], geometry_changed=True))
+        layer.featuresDeleted.connect(lambda fids, l=layer: self._on_tracked_layer_edited(l, fids, geometry_changed=True))
+        layer.attributeValueChanged.connect(lambda fid, idx, value, l=layer: self._on_tracked_layer_edited(l, [fid], geometry_changed=False))
+        layer.willBeDeleted.connect(lambda l=layer: self._tracked_layer_ids.discard(l.id()))
+
+    def _on_tracked_layer_edited(self, layer, fids, geometry_changed):
+        layer_id = layer.id()
+        needs_area = False
+        for (baseline_layer_id, _, _), baseline in self.check_baselines.items():
+            if baseline_layer_id == layer_id:
+                baseline['dirty_fids'].update(fids)
+            if geometry_changed and layer_id in baseline['context_layer_ids']:
+                needs_area = True
+        if not needs_area:
+            return
 
-        stats_update['processed_objects'] = 1
-        if geom.isEmpty():
-            stats_update['skipped_other'] = 1
-            return geom, stats_update
+        # Zapisany (sprzed edycji) stan geometrii wskazuje obszar, w którym styczność mogła zostać utracona
+        transformer = None
+        if layer.crs() != self.project.crs():
+            transformer = QgsCoordinateTransform(layer.crs(), self.project.crs(), self.project)
+        request = QgsFeatureRequest().setFilterFids(list(fids)).setNoAttributes()
+        areas = []
+        for feature in layer.dataProvider().getFeatures(request):
+            if not feature.hasGeometry():
+                continue
+            rect = feature.geometry().boundingBox()
+            if transformer:
+                rect = transformer.transformBoundingBox(rect)
+            areas.append(QgsRectangle(rect))
+        for baseline in self.check_baselines.values():
+            if layer_id in baseline['context_layer_ids']:
+                baseline['dirty_areas'].extend(areas)
+
+    def _create_findings_layer(self, findings, check_type, target_crs):
+        if not findings:
+            self.output_widget.log_success("Brak wierzchołków do zapisania w warstwie tymczasowej.")
+            return
 
-        if check_type != 'pe':
+        layer_name = f"stycznosc_{check_type}_{self.zakres_combo_box.currentText()}"
+        findings_layer = QgsVectorLayer(f"Point?crs={target_crs.authid()}", layer_name, "memory")
+        provider = findings_layer.dataProvider()
+        provider.addAttributes([
+            QgsField("fid_obiektu", QVariant.LongLong),
+            QgsField("id", QVariant.String),
+            QgsField("nazwa", QVariant.String),
+            QgsField("nr_wierzch", QVariant.Int),
+            QgsField("grupa", QVariant.String),
+            QgsField("status", QVariant.String),
+            QgsField("odl_napr", QVariant.Double)
+        ])
+        findings_layer.updateFields()
+
+        fields = findings_layer.fields()
+        new_features = []
+        for fid, id_val, nazwa_val, group, vertex_index, point, fix_distance in findings:
+            new_feat = QgsFeature(fields)
+            new_feat.setGeometry(QgsGeometry.fromPointXY(point))
+            new_feat.setAttributes([
+                fid,
+                str(id_val) if id_val not in [None, ''] else None,
+                str(nazwa_val) if nazwa_val else None,
+                vertex_index + 1,
+                str(group),
+                "naprawiony" if fix_distance is not None else "bez styczności",
+                round(fix_distance, 3) if fix_distance is not None else None
+            ])
+            new_features.append(new_feat)
+
+        provider.addFeatures(new_features)
+        findings_layer.updateExtents()
+        self.project.addMapLayer(findings_layer)
+        self.output_widget.log_success(f"Zapisano {len(new_features)} wierzchołków do warstwy tymczasowej '{layer_name}'.")
+
+    def _build_segment_index(self, query_geom, target_crs):
+        segment_index = SegmentIndex(target_crs, self.project)
+        for layer_name in self.trakt_layer_names:
+            for trakt_layer in self.project.mapLayersByName(layer_name):
+                segment_index.add_layer(trakt_layer, query_geom)
+        self.output_widget.log_info(f"Zbudowano indeks {len(segment_index)} segmentów traktów do dociągania.")
+        return segment_index
+
+    def _write_geometries(self, layer, geometries):
+        provider = layer.dataProvider()
+        if not provider.capabilities() & QgsVectorDataProvider.ChangeGeometries:
+            self.output_widget.log_error(f"Warstwa '{layer.name()}' nie pozwala na zmianę geometrii. Poprawki nie zostały zapisane.")
+            return
+
+        # Zapis przez bufor edycji - sygnały warstwy informują śledzenie zmian (sprawdzanie przyrostowe,
+        # czyszczenie, statystyka), a każda paczka jest osobnym krokiem cofania.
+        # Warstwy w trybie edycji są odrzucane przed sprawdzaniem, więc bufor zawiera tylko te poprawki.
+        if not layer.startEditing():
+            self.output_widget.log_error(f"Nie można włączyć trybu edycji warstwy '{layer.name()}'. Poprawki nie zostały zapisane.")
+            return
+        fids = list(geometries)
+        for start in range(0, len(fids), self.GEOMETRY_WRITE_CHUNK):
+            chunk = fids[start:start + self.GEOMETRY_WRITE_CHUNK]
+            layer.beginEditCommand(f"{self.FUNCTIONALITY_NAME}: poprawa wierzchołków ({start + 1}-{start + len(chunk)})")
+            for fid in chunk:
+                layer.changeGeometry(fid, geometries[fid])
+            layer.endEditCommand()
+
+        if not layer.commitChanges():
+            self.output_widget.log_error(f"Błąd zapisu geometrii do warstwy '{layer.name()}': {'; '.join(layer.commitErrors())}")
+            layer.rollBack()
+            return
+        layer.triggerRepaint()
+
+    def _insert_vertices(self, layer, hits, target_crs):
+        reverse_transformer = None
+        if layer.crs() != target_crs:
+            reverse_transformer = QgsCoordinateTransform(target_crs, layer.crs(), self.project)
+
+        # Wstawianie od końca obiektu, aby kolejne wstawienia nie przesuwały numeracji wierzchołków
+        inserted = 0
+        seen = set()
+        for hit in sorted(hits, key=lambda h: (h.fid, h.before_vertex, h.t), reverse=True):
+            key = (hit.fid, round(hit.point.x(), 3), round(hit.point.y(), 3))
+            if key in seen or hit.t in (0.0, 1.0):
+                continue
+            seen.add(key)
+            point = reverse_transformer.transform(hit.point) if reverse_transformer else hit.point
+            if layer.insertVertex(point.x(), point.y(), hit.fid, hit.before_vertex):
+                inserted += 1
+        return inserted
+
+    def _check_vertices(self, records, layer, infra_points, pa_points, pe_points, auto_fix, limit_distance, max_distance, check_type, segment_index=None):
+        ctx = {
+            'check_type': check_type,
+            'auto_fix': auto_fix,
+            'limit_distance': limit_distance,
+            'max_distance': float(max_distance),
+            'segments': segment_index is not None
+        }
+        point_sets = {'infra': infra_points, 'pa': pa_points, 'pe': pe_points}
+        if check_type == 'pe':
+            point_sets['infra_pa'] = infra_points | pa_points
+        cell_size = max(float(max_distance), 1.0) if limit_distance else 25.0
+
+        segment_lookup = None
+        if segment_index is not None:
+            def segment_lookup(fid, x, y, distance):
+                hit = segment_index.nearest(QgsPointXY(x, y), distance, (layer.id(), fid))
+                return (hit.point.x(), hit.point.y(), hit.distance, hit) if hit else None
+
+        results = None
+        if len(records) >= vertex_check.POOL_MIN_FEATURES and (os.cpu_count() or 1) > 1:
+            self.output_widget.log_info(f"Sprawdzanie {len(records)} obiektów w {os.cpu_count()} procesach...")
+            try:
+                results = vertex_check.check_records_parallel(records, ctx, point_sets, cell_size)
+            except Exception as e:
+                self.output_widget.log_warning(f"Nie udało się uruchomić procesów roboczych ({e}). Sprawdzanie zostanie wykonane w bieżącym procesie.")
+
+        indexes = None
+        if results is None:
+            indexes = vertex_check.build_indexes(point_sets, cell_size)
+            return vertex_check.check_records(records, ctx, indexes, segment_lookup)
+
+        # Obiekty wymagające dociągania do segmentów (indeks traktów istnieje tylko w tym procesie)
+        deferred_fids = {result['fid'] for result in results if result.get('deferred')}
+        if deferred_fids:
+            indexes = vertex_check.build_indexes(point_sets, cell_size)
+            deferred_records = [record for record in records if record[0] in deferred_fids]
+            results = [result for result in results if not result.get('deferred')]
+            results.extend(vertex_check.check_records(deferred_records, ctx, indexes, segment_lookup))
+        return results
+
+    def _apply_check_result(self, feature, result, check_type):
+        stats_update = result['stats']
+        stats_update['group'] = self._get_group_name(feature, check_type)
+
+        if check_type != 'pe' and not stats_update.get('skipped_other'):
             try:
                 dl_tras_val = feature.attribute('dl_tras')
                 if isinstance(dl_tras_val, (int, float)):
@@ -400,59 +704,24 @@ class StycznoscWierzcholkowWidget(QWidget, FORM_CLASS):
             except (KeyError, TypeError):
                 stats_update['total_length'] = 0.0
 
-        new_geom_points = list(geom.vertices())
-        stats_update['total_vertices'] = len(new_geom_points)
-        
-        vertices_to_check_indices = list(range(len(new_geom_points)))
-        doziemny_types = ["doziemny", "abonencki doziemny", "TOK ziemny"]
-        if check_type in ['kable', 'trakty'] and group_name in doziemny_types:
-            vertices_to_check_indices = [0, len(new_geom_points) - 1] if len(new_geom_points) > 1 else [0]
-
-        grupa_abonencka_def = ["abonencki napowietrzny", "abonencki doziemny", "abonencki planowany"]
-        if check_type == 'kable' and group_name in grupa_abonencka_def and auto_fix:
-            if self._check_coincidence_point(new_geom_points[0], pa_points) and self._check_coincidence_point(new_geom_points[-1], pe_points):
-                new_geom_points.reverse()
-
-        for i in vertices_to_check_indices:
-            point = new_geom_points[i]
-            target_points = infra_points
-            
-            if check_type == 'kable' and group_name in grupa_abonencka_def:
-                if i == 0: target_points = pe_points
-                elif i == len(new_geom_points) - 1: target_points = pa_points
-            elif check_type == 'pe':
-                target_points = infra_points.union(pa_points)
+        if 'findings' in stats_update:
+            stats_update['findings'] = [(i, QgsPointXY(x, y), fix_distance) for i, x, y, fix_distance in stats_update['findings']]
 
-            is_coincident = self._check_coincidence_point(point, target_points)
+        new_geom = None
+        if result['coords']:
+            points_xy = [QgsPointXY(x, y) for x, y in result['coords']]
+            new_geom = QgsGeometry.fromPointXY(points_xy[0]) if result['is_point'] else QgsGeometry.fromPolylineXY(points_xy)
+        return new_geom, stats_update
 
-            if is_coincident:
-                if check_type == 'pe' and self._check_coincidence_point(point, pa_points):
-                    stats_update['coincident_pa'] += 1
-                else:
-                    stats_update['coincident'] += 1
-            else:
-                stats_update['non_coincident'] += 1
-                stats_update.setdefault('non_coincident_indices', []).append(i)
-                if check_type == 'kable' and group_name in grupa_abonencka_def:
-                    if i == 0: stats_update.setdefault('missing_endpoints', []).append("PE")
-                    if i == len(new_geom_points) - 1: stats_update.setdefault('missing_endpoints', []).append("PA")
-                
-                if auto_fix:
-                    nearest_point = self._find_nearest_point(point, target_points, limit_distance, max_distance)
-                    if nearest_point:
-                        new_geom_points[i] = nearest_point
-                        stats_update['fixed'] += 1
-                        if check_type == 'pe' and self._check_coincidence_point(nearest_point, pa_points):
-                            stats_update['fixed_pa'] += 1
-                        else:
-                            stats_update['fixed_infra'] += 1
-                    else:
-                        stats_update['skipped_fix'] += 1
-        
-        # Convert all points to QgsPointXY before creating the new geometry
-        points_xy = [QgsPointXY(p) for p in new_geom_points]
-        final_geom = QgsGeometry.fromPointXY(points_xy[0]) if geom.type() == QgsWkbTypes.PointGeometry else QgsGeometry.fromPolylineXY(points_xy)
-        return final_geom, stats_update
+    def _get_group_name(self, feature, check_type):
+        group_name = "BRAK"
+        if check_type == 'kable':
+            group_name = feature.attribute('rodzaj') or "BRAK"
+        elif check_type == 'trakty':
+            group_name = feature.attribute('trakt') or "BRAK"
+        elif check_type == 'pe':
+            group_name = feature.attribute('typ') or "BRAK"
+        return group_name
 
     def _get_points_from_layers(self, layers, scope_geom, scope_crs, precision=3):
         points = set()
@@ -502,29 +771,6 @@ class StycznoscWierzcholkowWidget(QWidget, FORM_CLASS):
         
         return points
 
-    def _find_nearest_point(self, point, point_set, limit_distance, max_distance):
-        min_dist_sq, nearest_point_tuple = float('inf'), None
-        if not point_set:
-            return None
-
-        point_xy = QgsPointXY(point)
-
-        for p_tuple in point_set:
-            p_geom = QgsPointXY(p_tuple[0], p_tuple[1])
-            dist_sq = point_xy.sqrDist(p_geom)
-            if dist_sq < min_dist_sq:
-                min_dist_sq, nearest_point_tuple = dist_sq, p_tuple
-        
-        if limit_distance and math.sqrt(min_dist_sq) > max_distance:
-            return None
-        
-        if nearest_point_tuple:
-            return QgsPointXY(nearest_point_tuple[0], nearest_point_tuple[1])
-        return None
-
-    def _check_coincidence_point(self, point, point_set, precision=3):
-        return (round(point.x(), precision), round(point.y(), precision)) in point_set
-
     def _is_in_scope(self, geom, scope_geom):
         if not geom or not scope_geom or not geom.intersects(scope_geom):
             return False
@@ -548,12 +794,12 @@ class StycznoscWierzcholkowWidget(QWidget, FORM_CLASS):
         return {
             'groups': defaultdict(lambda: {
                 'processed_objects': 0, 'total_length': 0.0, 'total_vertices': 0,
-                'coincident': 0, 'coincident_pa': 0, 'non_coincident': 0,
-                'fixed': 0, 'fixed_infra': 0, 'fixed_pa': 0,
+                'coincident': 0, 'coincident_pa': 0, 'coincident_segment': 0, 'non_coincident': 0,
+                'fixed': 0, 'fixed_infra': 0, 'fixed_pa': 0, 'fixed_segment': 0,
                 'missing_endpoints': [],
                 'non_coincident_indices': []
             }),
-            'skipped_other': 0, 'skipped_fix': 0
+            'skipped_other': 0, 'skipped_fix': 0, 'inserted_vertices': 0, 'skipped_unchanged': 0
         }
 
     def _update_stats(self, stats, update):
@@ -583,6 +829,7 @@ class StycznoscWierzcholkowWidget(QWidget, FORM_CLASS):
         total_fixed = sum(data['fixed'] for data in stats['groups'].values())
 
         self.output_widget.log_info(f"Łącznie przetworzono obiektów: {total_processed}")
+        if stats['skipped_unchanged'] > 0: self.output_widget.log_info(f"Pominięte (bez zmian od ostatniego sprawdzenia): {stats['skipped_unchanged']}")
         self.output_widget.log_warning(f"Znaleziono wierzchołków bez styczności: {total_non_coincident}")
         self.output_widget.log_success(f"Naprawiono wierzchołków: {total_fixed}")
 
@@ -590,12 +837,14 @@ class StycznoscWierzcholkowWidget(QWidget, FORM_CLASS):
             self.output_widget.log_info(f"Grupa: {group}")
             self.output_widget.log_info(f"  Przetworzone obiekty: {data['processed_objects']}")
             
-            total_verts = data['coincident'] + data['coincident_pa'] + data['non_coincident']
+            total_verts = data['coincident'] + data['coincident_pa'] + data['coincident_segment'] + data['non_coincident']
             self.output_widget.log_info("  Wierzchołki:")
             self.output_widget.log_info(f"    - łącznie: {total_verts}")
-            self.output_widget.log_info(f"    - styczne: {data['coincident'] + data['coincident_pa']}")
+            self.output_widget.log_info(f"    - styczne: {data['coincident'] + data['coincident_pa'] + data['coincident_segment']}")
+            if data['coincident_segment'] > 0: self.output_widget.log_info(f"    - w tym leżące na segmencie traktu: {data['coincident_segment']}")
             self.output_widget.log_info(f"    - bez styczności: {data['non_coincident']}")
             self.output_widget.log_info(f"    - naprawione: {data['fixed']}")
+            if data['fixed_segment'] > 0: self.output_widget.log_success(f"    - w tym dociągnięte do segmentu traktu: {data['fixed_segment']}")
             
             if check_type == 'pe':
                 if data['coincident_pa'] > 0: self.output_widget.log_info(f"    - w tym styczne z PA: {data['coincident_pa']}")
@@ -604,6 +853,7 @@ class StycznoscWierzcholkowWidget(QWidget, FORM_CLASS):
 
         if stats['skipped_other'] > 0: self.output_widget.log_warning(f"Pominięte (błędna geometria): {stats['skipped_other']}")
         if stats['skipped_fix'] > 0: self.output_widget.log_warning(f"Pominięte (nie znaleziono obiektu do dociągnięcia w pobliżu): {stats['skipped_fix']}")
+        if stats['inserted_vertices'] > 0: self.output_widget.log_success(f"Wstawiono wierzchołków do traktów: {stats['inserted_vertices']}")
 
     def _log_non_coincident_feature(self, feature, count, feature_type, missing_endpoints=None, non_coincident_indices=None):
         id_val = feature.attribute('id')
@@ -2,7 +2,7 @@ import os
 import json
 import csv
 from qgis.PyQt import uic
-from qgis.PyQt.QtWidgets import (QWidget, QVBoxLayout, QTableWidgetItem, QApplication, 
+from qgis.PyQt.QtWidgets import (QWidget, QVBoxLayout, QApplication, 
                                 QFileDialog, QHBoxLayout, QFormLayout, QLabel, 
                                 QCheckBox, QPushButton, QFrame, QComboBox, QLineEdit,
                                 QSplitter, QSizePolicy)
@@ -16,6 +16,7 @@ from qgis.core import (
 
 from ..core.logger import logger
 from .base_widget import FormattedOutputWidget
+from .results_model import FeatureResultsModel, setup_results_view
 
 FORM_CLASS, _ = uic.loadUiType(os.path.join(
     os.path.dirname(__file__), '../ui/wyszukiwarka_widget.ui'))
@@ -44,7 +45,8 @@ class WyszukiwarkaWidget(QWidget, FORM_CLASS):
 
     def _setup_layouts_and_widgets(self):
         # --- Setup results table ---
-        self.results_table.setSortingEnabled(True)
+        self.results_model = FeatureResultsModel(self)
+        self.results_proxy = setup_results_view(self.results_table, self.results_model)
 
         # --- Add new buttons to results groupbox ---
         self.export_button = QPushButton("Eksportuj do .csv")
@@ -218,7 +220,7 @@ class WyszukiwarkaWidget(QWidget, FORM_CLASS):
 
     def run_main_action(self):
         self.output_widget.clear_log()
-        self.results_table.setRowCount(0)
+        self.results_model.clear()
         self.found_feature_ids = []
 
         layer = self.layer_combobox.currentData()
@@ -283,17 +285,19 @@ class WyszukiwarkaWidget(QWidget, FORM_CLASS):
         final_expression = " AND ".join(expression_parts)
         self.logger.log_dev(self.FUNCTIONALITY_NAME, 0, "FA", f"Wygenerowane zapytanie: {final_expression}")
 
+        # Wyszukiwanie zwraca tylko identyfikatory - atrybuty tabela wczytuje sama, gdy są wyświetlane
         request = QgsFeatureRequest().setFilterExpression(final_expression)
+        request.setFlags(QgsFeatureRequest.NoGeometry)
+        request.setNoAttributes()
         
-        found_features = list(layer.getFeatures(request))
-        self.found_feature_ids = [f.id() for f in found_features]
+        self.found_feature_ids = [f.id() for f in layer.getFeatures(request)]
 
-        if not found_features:
+        if not self.found_feature_ids:
             self.logger.log_user("Nie odnaleziono żadnego obiektu spełniającego ustawione kryteria.")
             return
 
-        self.logger.log_user(f"Znaleziono {len(found_features)} dopasowań. Generowanie listy...")
-        self._display_results(found_features, attribute_name, layer)
+        self.logger.log_user(f"Znaleziono {len(self.found_feature_ids)} dopasowań. Generowanie listy...")
+        self._display_results(self.found_feature_ids, attribute_name, layer)
 
     def _build_expression(self, attr, val, val_escaped, is_numeric, is_exact):
         attr_quoted = f'\"{attr}\"' # Corrected escaping for attribute name
@@ -314,9 +318,7 @@ class WyszukiwarkaWidget(QWidget, FORM_CLASS):
             else:
                 return f"{attr_quoted} LIKE '%{val_escaped}%'"
 
-    def _display_results(self, features, search_attribute, layer):
-        self.results_table.setRowCount(len(features))
-        
+    def _display_results(self, feature_ids, search_attribute, layer):
         all_attributes = [field.name() for field in layer.fields()]
         ordered_attributes = []
 
@@ -332,37 +334,25 @@ class WyszukiwarkaWidget(QWidget, FORM_CLASS):
             if attr not in ordered_attributes:
                 ordered_attributes.append(attr)
 
-        self.results_table.setColumnCount(len(ordered_attributes))
-        self.results_table.setHorizontalHeaderLabels(ordered_attributes)
-
-        for row, feature in enumerate(features):
-            for col, attr_name in enumerate(ordered_attributes):
-                value = feature[attr_name]
-                item = QTableWidgetItem(str(value) if value is not None else "")
-                if col == 0:
-                    item.setData(Qt.UserRole, feature.id())
-                self.results_table.setItem(row, col, item)
-        
+        self.results_model.set_columns([], ordered_attributes)
+        self.results_model.append_rows([(layer, fid) for fid in feature_ids])
         self.results_table.resizeColumnsToContents()
 
     def _on_copy_to_clipboard_clicked(self):
-        if self.results_table.rowCount() == 0:
+        if self.results_model.rowCount() == 0:
             self.logger.log_user("INFORMACJA: Brak wyników do skopiowania.")
             return
 
         clipboard = QApplication.clipboard()
-        header = [self.results_table.horizontalHeaderItem(c).text() for c in range(self.results_table.columnCount())]
-        csv_text = "\t".join(header) + "\n"
-
-        for row in range(self.results_table.rowCount()):
-            row_data = [self.results_table.item(row, col).text() for col in range(self.results_table.columnCount())]
-            csv_text += "\t".join(row_data) + "\n"
+        lines = ["\t".join(self.results_model.headers())]
+        for row in self.results_proxy.ordered_source_rows():
+            lines.append("\t".join(self.results_model.row_values(row)))
         
-        clipboard.setText(csv_text)
-        self.logger.log_user(f"Skopiowano {self.results_table.rowCount()} wierszy do schowka.")
+        clipboard.setText("\n".join(lines) + "\n")
+        self.logger.log_user(f"Skopiowano {self.results_model.rowCount()} wierszy do schowka.")
 
     def _on_export_to_csv_clicked(self):
-        if self.results_table.rowCount() == 0:
+        if self.results_model.rowCount() == 0:
             self.logger.log_user("INFORMACJA: Brak wyników do wyeksportowania.")
             return
 
@@ -375,31 +365,23 @@ class WyszukiwarkaWidget(QWidget, FORM_CLASS):
             with open(path, 'w', newline='', encoding='utf-8-sig') as csvfile:
                 writer = csv.writer(csvfile, delimiter=';')
 
-                headers = [self.results_table.horizontalHeaderItem(c).text() for c in range(self.results_table.columnCount())]
-                writer.writerow(headers)
+                writer.writerow(self.results_model.headers())
 
-                for row in range(self.results_table.rowCount()):
-                    row_data = [self.results_table.item(row, col).text() for col in range(self.results_table.columnCount())]
-                    writer.writerow(row_data)
+                for row in self.results_proxy.ordered_source_rows():
+                    writer.writerow(self.results_model.row_values(row))
             
-            self.logger.log_user(f"Pomyślnie wyeksportowano {self.results_table.rowCount()} wierszy do pliku: {path}")
+            self.logger.log_user(f"Pomyślnie wyeksportowano {self.results_model.rowCount()} wierszy do pliku: {path}")
 
         except Exception as e:
             self.logger.log_user(f"BŁĄD: Wystąpił nieoczekiwany błąd podczas eksportu do pliku .csv: {e}")
 
     def _on_zoom_to_feature_clicked(self):
-        selected_items = self.results_table.selectedItems()
-        if not selected_items:
+        selected_rows = self.results_proxy.source_rows(self.results_table.selectionModel().selectedRows())
+        if not selected_rows:
             self.logger.log_user("INFORMACJA: Nie zaznaczono żadnego obiektu na liście wyników.")
             return
 
-        selected_row = selected_items[0].row()
-        feature_id_item = self.results_table.item(selected_row, 0)
-        feature_id = feature_id_item.data(Qt.UserRole)
-
-        layer = self.layer_combobox.currentData()
-        if not layer:
-            return
+        layer, feature_id = self.results_model.row_member(selected_rows[0])
 
         feature = layer.getFeature(feature_id)
         if not feature.hasGeometry():
@@ -451,15 +433,12 @@ class WyszukiwarkaWidget(QWidget, FORM_CLASS):
             self.logger.log_user(f"Zaznaczono {len(self.found_feature_ids)} obiektów na warstwie '{layer.name()}'.")
 
     def _on_select_selected_clicked(self):
-        selected_items = self.results_table.selectedItems()
-        if not selected_items:
+        selected_rows = self.results_proxy.source_rows(self.results_table.selectionModel().selectedRows())
+        if not selected_rows:
             self.logger.log_user("INFORMACJA: Nie zaznaczono żadnego obiektu na liście wyników.")
             return
 
-        selected_ids = set()
-        for item in selected_items:
-            feature_id_item = self.results_table.item(item.row(), 0)
-            selected_ids.add(feature_id_item.data(Qt.UserRole))
+        selected_ids = {self.results_model.row_member(row)[1] for row in selected_rows}
 
         layer = self.layer_combobox.currentData()
         if layer:
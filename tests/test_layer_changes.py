@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core import layer_changes  # noqa: E402
+
+
+class FakeSignal:
+    def __init__(self):
+        self.slots = []
+
+    def connect(self, slot):
+        self.slots.append(slot)
+
+    def emit(self, *args):
+        for slot in list(self.slots):
+            slot(*args)
+
+
+class FakeLayer:
+    def __init__(self, layer_id):
+        self.layer_id = layer_id
+        self.layerModified = FakeSignal()
+        self.dataChanged = FakeSignal()
+        self.subsetStringChanged = FakeSignal()
+        self.willBeDeleted = FakeSignal()
+
+    def id(self):
+        return self.layer_id
+
+
+class LayerChangesTest(unittest.TestCase):
+    def test_signals_and_bump_change_revision(self):
+        layer = FakeLayer("test_signals")
+        self.assertIsNone(layer_changes.revision(layer))
+        layer_changes.watch(layer)
+        seen = [layer_changes.revision(layer)]
+        for signal in (layer.layerModified, layer.dataChanged, layer.subsetStringChanged):
+            signal.emit()
+            seen.append(layer_changes.revision(layer))
+        layer_changes.bump(layer)
+        seen.append(layer_changes.revision(layer))
+        self.assertEqual(len(set(seen)), len(seen))
+
+    def test_readded_layer_never_repeats_a_revision(self):
+        # Warstwa usunięta i dodana z tym samym id, zmieniona tyle samo razy, nie może dać tego samego stanu
+        first = FakeLayer("test_readded")
+        layer_changes.watch(first)
+        first.layerModified.emit()
+        before = layer_changes.revision(first)
+        first.willBeDeleted.emit()
+        self.assertIsNone(layer_changes.revision(first))
+
+        second = FakeLayer("test_readded")
+        layer_changes.watch(second)
+        second.layerModified.emit()
+        self.assertNotEqual(layer_changes.revision(second), before)
+
+
+if __name__ == "__main__":
+    unittest.main()
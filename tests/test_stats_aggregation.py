@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+import os
+import sqlite3
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.stats_aggregation import AGGREGATIONS, aggregate_features, group_by_sql, merge_group_rows, quote_identifier  # noqa: E402
+
+
+class FakeFeature:
+    def __init__(self, **attributes):
+        self.attributes = attributes
+
+    def attribute(self, name):
+        return self.attributes.get(name)
+
+
+def group_by_rows(features, aggregation):
+    """Runs the query of `group_by_sql` (the database path without the spatial predicate) in an in-memory SQLite table."""
+    field_names = list(aggregation.group_fields) + list(aggregation.sum_fields)
+    connection = sqlite3.connect(":memory:")
+    try:
+        connection.execute(f"CREATE TABLE warstwa ({', '.join(quote_identifier(name) for name in field_names)})")
+        connection.executemany(
+            f"INSERT INTO warstwa VALUES ({', '.join('?' for _ in field_names)})",
+            [tuple(f.attribute(name) for name in field_names) for f in features],
+        )
+        return connection.execute(group_by_sql(quote_identifier("warstwa"), field_names, aggregation, "1 = 1")).fetchall()
+    finally:
+        connection.close()
+
+
+class DatabaseAndPythonPathsTest(unittest.TestCase):
+    def test_punkty_elastycznosci(self):
+        aggregation = AGGREGATIONS["punkty_elastycznosci"]
+        features = [
+            FakeFeature(typ="PE", status="proj", rodzaj="A", l_spl=2),
+            FakeFeature(typ="PE", status="proj", rodzaj="A", l_spl=None),
+            FakeFeature(typ="PE", status=None, rodzaj="A", l_spl=1),
+            FakeFeature(typ="PE", status="", rodzaj="A", l_spl=3),
+            FakeFeature(typ=None, status="istn", rodzaj=None, l_spl=0),
+        ]
+        expected = aggregate_features(features, aggregation)
+        self.assertEqual(merge_group_rows(group_by_rows(features, aggregation), len(aggregation.group_fields)), expected)
+        self.assertEqual(expected[("PE", "BRAK", "A")], [2, 4])
+
+    def test_lista_pa(self):
+        aggregation = AGGREGATIONS["lista_pa"]
+        features = [
+            FakeFeature(**{"Rodzaj pun": "MDU", "Licz_lokal": 12, "Licz_przed": 1, "Licz_SED": None}),
+            FakeFeature(**{"Rodzaj pun": "SDU", "Licz_lokal": 1, "Licz_przed": None, "Licz_SED": 0}),
+            FakeFeature(**{"Rodzaj pun": None, "Licz_lokal": None, "Licz_przed": 2, "Licz_SED": 1}),
+            FakeFeature(**{"Rodzaj pun": "MDU", "Licz_lokal": 4, "Licz_przed": 0, "Licz_SED": 0}),
+        ]
+        expected = aggregate_features(features, aggregation)
+        self.assertEqual(merge_group_rows(group_by_rows(features, aggregation), len(aggregation.group_fields)), expected)
+        self.assertEqual(expected[("MDU",)], [2, 16, 1, 0])
+
+    def test_missing_fields(self):
+        # Brakujące pola: grupa NULL i suma 0, jak attribute() zwracający None
+        aggregation = AGGREGATIONS["kable"]
+        features = [FakeFeature(segment="S1", dl_tras=10.5), FakeFeature(segment="S1", dl_tras=2)]
+        connection = sqlite3.connect(":memory:")
+        try:
+            connection.execute('CREATE TABLE kable ("segment", "dl_tras")')
+            connection.executemany("INSERT INTO kable VALUES (?, ?)", [(f.attribute("segment"), f.attribute("dl_tras")) for f in features])
+            rows = connection.execute(group_by_sql('"kable"', ["segment", "dl_tras"], aggregation, "1 = 1")).fetchall()
+        finally:
+            connection.close()
+        self.assertEqual(merge_group_rows(rows, len(aggregation.group_fields)), aggregate_features(features, aggregation))
+
+    def test_null_sums_from_database(self):
+        # Sterowniki mogą zwrócić NULL jako sumę lub liczbę jako tekst
+        self.assertEqual(merge_group_rows([("A", "3", None, 2.5), (None, 1, 1, None)], 1), {("A",): [3, 0, 2.5], ("BRAK",): [1, 1, 0]})
+
+
+if __name__ == "__main__":
+    unittest.main()